@@ -1,6 +1,7 @@
 # Lucas Calderon
 # This file contains the data for the celestial bodies that will be simulated.
 # The data is taken mostly from the NASA fact sheets for the Earth and the Moon.
+# The gravitational parameters of the Sun and the planets are the ones of the DE440 ephemeris.
 
 from collections import namedtuple
 import spicepy as spice
@@ -9,9 +10,9 @@ import spicepy as spice
 
 # Define named tuples for Earth and Moon data
 Earth = namedtuple('Earth', ['name', 'mass', 'radius_mean', 'radius_equator', 'radius_polar', 'gravitational_parameter', 'J2',
-                            'atmos', 'day', 'SOI', 'body2'])
+                            'atmos', 'day', 'SOI', 'perturbers', 'gravity_file', 'gravity_degree', 'gravity_order'])
 Moon = namedtuple('Moon', ['name', 'mass', 'radius_mean', 'radius_equator', 'radius_polar', 'gravitational_parameter', 'J2',
-                            'atmos', 'day', 'SOI', 'body2'])
+                            'atmos', 'day', 'SOI', 'perturbers', 'gravity_file', 'gravity_degree', 'gravity_order'])
 
 # Earth data
 Earth = Earth(
@@ -25,7 +26,10 @@ Earth = Earth(
     atmos=True, # The Earth has an atmosphere
     day=86164.1,  # seconds
     SOI=0.929e6, # km, Sphere of Influence
-    body2='Moon', # The main perturbing body for the earth, the moon
+    perturbers=('Moon', 'Sun'), # Third bodies of the acceleration, 'Venus' and 'Jupiter' can be added
+    gravity_file='EGM96.txt', # Spherical harmonic coefficients in Data/Gravity
+    gravity_degree=8, # Degree and order of the gravity field of the compiled physics
+    gravity_order=8,
 )
 
 # Moon data
@@ -40,5 +44,29 @@ Moon = Moon(
     atmos=False, # The Moon doesn't have an atmosphere
     day=2360591.5,  # seconds
     SOI=0.0643e6, # km
-    body2='Earth', # The main perturbing body for the moon, the earth
+    perturbers=('Earth', 'Sun'), # Third bodies of the acceleration
+    gravity_file=None, # No coefficient file, zonal field of the J2
+    gravity_degree=2,
+    gravity_order=0,
+)
+
+# Bodies that only act as third bodies, spice_name is the SPICE target of their position
+ThirdBody = namedtuple('ThirdBody', ['name', 'gravitational_parameter', 'spice_name'])
+
+Sun = ThirdBody(
+    name="Sun",
+    gravitational_parameter=1.32712440041279e11,  # km^3/s^2
+    spice_name='SUN',
+)
+
+Venus = ThirdBody(
+    name="Venus",
+    gravitational_parameter=3.24858592e5,  # km^3/s^2
+    spice_name='VENUS BARYCENTER',
+)
+
+Jupiter = ThirdBody(
+    name="Jupiter",
+    gravitational_parameter=1.26712764e8,  # km^3/s^2, whole system, its position is the barycenter's
+    spice_name='JUPITER BARYCENTER',
 )
@@ -27,6 +27,11 @@ et = 0 # epoch time in seconds after J2000
 
 #--------- END ORBIT INPUTS ------------
 
+# Raw inputs as given above, used as the nominal case of the dispersion campaigns
+orbit_inputs = dict(body=body, Periapsis=Periapsis, Apoapsis=Apoapsis, Inclination=Inclination,
+                    Rigth_Ascension_node=Rigth_Ascension_node, Argument_periapsis=Argument_periapsis,
+                    Mean_anomaly_epoch=Mean_anomaly_epoch, et=et)
+
 # Check that inputs make sense
 if Apoapsis < Periapsis:
     raise ValueError("Apoapsis cannot be lower than the Periapsis")
@@ -70,14 +75,15 @@ initial_velocity = state[3:] # km/s
 # Feel free to add more parameters to the spacecraft, such as fuel consumption, thrust, etc.
 # Just make sure to name them in the namedtuple part and add them to the Spacecraft part as a value.
 
-Spacecraft = namedtuple('MARST', ['name', 'et0', 'mass0', 'C_D', 'A', 'A_intake', 'eff_in', 'initial_position', 'initial_velocity',
-                                   'M_propellant', 'thrust', 'mass_flow_rate'])
+Spacecraft = namedtuple('MARST', ['name', 'et0', 'mass0', 'C_D', 'C_R', 'A', 'A_intake', 'eff_in', 'initial_position', 'initial_velocity',
+                                   'M_propellant', 'thrust', 'mass_flow_rate', 'air_breathing'])
 
 spacecraft = Spacecraft(
                     name="MARST",
                     et0=et,  # Initial epoch time in seconds after J2000
                     mass0=5000,  # kg
                     C_D=4,  # Drag coefficient
+                    C_R=1.3,  # Reflectivity coefficient of the solar radiation pressure, 1 absorbs and 2 reflects everything
                     A=4,  # m^2
                     A_intake=4,  # m^2
                     eff_in=0.4,  # Efficiency of the intake
@@ -85,5 +91,6 @@ spacecraft = Spacecraft(
                     initial_velocity=initial_velocity,  # Initial velocity in km/s
                     M_propellant=1000,  # kg
                     thrust=1,  # N
-                    mass_flow_rate=0.001  # kg/s
+                    mass_flow_rate=0.001,  # kg/s
+                    air_breathing=False  # If True the thruster runs on the air captured by the intake, not on the propellant
 )
\ No newline at end of file
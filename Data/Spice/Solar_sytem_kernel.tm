@@ -4,7 +4,7 @@ KERNELS_TO_LOAD = (
    'Data/Spice/LSK/naif0012.tls.pc.txt',
    'Data/Spice/PCK/pck00011.tpc.txt',                  
    'Data/Spice/SPK/de440s.bsp',
-   'Data\Spice\PCK\gm_de440.tpc.txt',
+   'Data/Spice/PCK/gm_de440.tpc.txt',
 )
 
 \begintext
\ No newline at end of file
@@ -11,7 +11,8 @@ import numpy as np
 from numba import njit
 from Config.spacecraft import spacecraft
 from Config.bodies_data import Earth
-from Modules.helper import sc_heigth, linear_interp, norm
+from Modules.helper import sc_heigth, norm
+from Modules.atmos import AtmosTable, atmos_interp
 
 # Rotating atmosphere model
 
@@ -30,10 +31,10 @@ def atmos_rot(position):
 
 
 @njit
-def drag_acceleration(position:np.array, velocity:np.array, heights:np.array, air:np.array) -> np.array:
+def drag_acceleration(position:np.array, velocity:np.array, air_table:AtmosTable) -> np.array:
     
     # Density
-    rho = linear_interp(sc_heigth(position), heights, air) # in kg/m^3, interpolated from the data in h and air
+    rho = atmos_interp(sc_heigth(position), air_table) # in kg/m^3, interpolated in log space from the air density table
 
     # Substract atmos velocities
     atmos_velocity = atmos_rot(position)
@@ -42,4 +43,24 @@ def drag_acceleration(position:np.array, velocity:np.array, heights:np.array, ai
     # Calculate the drag acceleration
     drag_a = -0.5 * spacecraft.C_D * spacecraft.A * rho * norm(velocity_rel) * velocity_rel / spacecraft.mass0 * 1000 # in km/s^2 (remember that the density is in kg/m^3, A in m^2 and velocity in km/s)
 
+    return drag_a
+
+
+# Drag with every constant passed in, so it can be called from compiled code without touching the config
+@njit
+def drag_acceleration_bound(position:np.array, velocity:np.array, rho:float, C_D:float, A:float, mass:float, omega:float) -> np.array:
+
+    # Substract atmos velocities (rotating atmosphere, same as atmos_rot)
+    if np.sqrt(position[0]**2 + position[1]**2) <= 10:
+        velocity_rel = velocity.copy()
+    else:
+        velocity_rel = np.empty(3)
+        velocity_rel[0] = velocity[0] + omega * position[1]
+        velocity_rel[1] = velocity[1] - omega * position[0]
+        velocity_rel[2] = velocity[2]
+
+    # Calculate the drag acceleration
+    v_rel = np.sqrt(velocity_rel[0]**2 + velocity_rel[1]**2 + velocity_rel[2]**2)
+    drag_a = -0.5 * C_D * A * rho * v_rel * velocity_rel / mass * 1000 # in km/s^2
+
     return drag_a
\ No newline at end of file
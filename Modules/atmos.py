@@ -3,11 +3,40 @@
 # By default this models the atmosphere the day 01/01/2024 at N43.3, W3 (Somewhere around Bilbao)
 # , but a different file can be given to model a different atmoshpere
 
+import os
+import hashlib
+import tempfile
+import zipfile
+from collections import namedtuple
+from functools import lru_cache
 import numpy as np
-from scipy.interpolate import interp1d
-import pandas as pd
+from numba import njit
 
-def atmos_splines(filename: str=r'Modules\01-01-2025 N43.3W3 NRLMSIS-00.txt') -> dict:
+# Default data file, next to this module, and the folder for the binary caches
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '01-01-2025 N43.3W3 NRLMSIS-00.txt')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'Cache')
+
+# Columns of the MSIS text file that are loaded, with the factor to convert them to SI
+COLUMNS = {
+    'h': ('Heit(km)', 1),  # km
+    'O': ('Oden(cm-3)', 1e6),  # molecules/m3
+    'N2': ('N2den(cm-3)', 1e6),  # molecules/m3
+    'O2': ('O2den(cm-3)', 1e6),  # molecules/m3
+    'air': ('air(gm/cm3)', 1000),  # Kg/m3
+    'T': ('T(K)', 1),  # K
+    'He': ('Heden(cm-3)', 1e6),  # molecules/m3
+    'Ar': ('Arden(cm-3)', 1e6),  # molecules/m3
+    'H': ('Hden(cm-3)', 1e6),  # molecules/m3
+    'N': ('Nden(cm-3)', 1e6),  # molecules/m3
+}
+
+AtmosData = namedtuple('AtmosData', list(COLUMNS))
+
+# Species of the number densities, in the order of the species tables
+SPECIES = ('O', 'N2', 'O2', 'He', 'Ar', 'H', 'N')
+
+
+def atmos_splines(filename: str=DEFAULT_FILE) -> dict:
     """
     Load atmospheric data from a file and create interpolation splines.
     
@@ -17,53 +46,239 @@ def atmos_splines(filename: str=r'Modules\01-01-2025 N43.3W3 NRLMSIS-00.txt') ->
     Returns:
         dict: A dictionary of splines for different atmospheric parameters.
     """
-    # Load file
-    data = pd.read_csv(filename, sep='\s+')
-
-    # Get lists
-    h = np.array(data['Heit(km)'].tolist())
-    splines = {
-        'O': interp1d(h, np.array(data['Oden(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'N2': interp1d(h, np.array(data['N2den(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'O2': interp1d(h, np.array(data['O2den(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'air': interp1d(h, np.array(data['air(gm/cm3)'].tolist()), kind='linear'),  # g/cm3
-        'T': interp1d(h, np.array(data['T(K)'].tolist()), kind='linear'),  # K
-        'He': interp1d(h, np.array(data['Heden(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'Ar': interp1d(h, np.array(data['Arden(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'H': interp1d(h, np.array(data['Hden(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-        'N': interp1d(h, np.array(data['Nden(cm-3)'].tolist()), kind='linear'),  # molecules/ cm3
-    }
+    from scipy.interpolate import interp1d
+
+    # Load file, the splines keep the units of the file
+    data = load_atmos(filename)
+    scale = {key: factor for key, (_, factor) in COLUMNS.items()}
+
+    splines = {key: interp1d(data.h, getattr(data, key) / scale[key], kind='linear') for key in COLUMNS if key != 'h'}
     
     return splines
 
 
-# Return numpy arrays instead of pandas series
-def atmos_data(filename=r'C:\Users\lucas\Desktop\Code Adventures\MARST\MARST\Modules\01-01-2025 N43.3W3 NRLMSIS-00.txt'):
-    # Use pandas to read the space-separated file
-    df = pd.read_csv(filename, sep='\s+')
+# ------------LOADING WITH A BINARY CACHE----------------
+# Parse the MSIS text table, without pandas
+def parse_msis_text(filename:str) -> AtmosData:
+    with open(filename) as file:
+        header = file.readline().split()
+
+    usecols = [header.index(column) for column, _ in COLUMNS.values()]
+    table = np.loadtxt(filename, skiprows=1, usecols=usecols, ndmin=2)
+
+    return AtmosData(*(table[:, i] * factor for i, (_, factor) in enumerate(COLUMNS.values())))
+
+
+def _file_hash(filename:str) -> str:
+    with open(filename, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+# Write a .npz to a temporary file in the same folder and move it in place, so the processes reading the cache
+# at the same time see the old file or the new one, never a half written one
+def _write_cache(cache_file:str, **arrays):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    file = tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_file), suffix='.npz', delete=False)
+    try:
+        with file:
+            np.savez(file, **arrays)
+        os.replace(file.name, cache_file)
+    except BaseException:
+        os.remove(file.name)
+        raise
+
+
+def load_atmos(filename:str=DEFAULT_FILE, cache_dir:str=CACHE_DIR) -> AtmosData:
+
+    """
+    Loads the atmosphere table, from the binary cache if it is up to date.
+    The text file is parsed only when there is no cache or when the file changed: the mtime and size
+    are checked first, and if they differ the hash decides whether the content really changed.
+
+    Inputs:
+        filename: The MSIS text file
+        cache_dir: The folder of the .npz caches, None to always parse the text file
+
+    Returns:
+        data: The atmosphere table with h, O, N2, O2, air, T, He, Ar, H, N in SI units (heights in km)
+    """
+
+    if cache_dir is None:
+        return parse_msis_text(filename)
+
+    stat = os.stat(filename)
+    cache_file = os.path.join(cache_dir, os.path.basename(filename) + '.npz')
+
+    # Try the cache, a cache that can't be read (half written by another process, corrupt) is a miss
+    file_hash = None
+    data = None
+    try:
+        with np.load(cache_file) as cache:
+            if float(cache['mtime']) == stat.st_mtime and int(cache['size']) == stat.st_size:
+                return AtmosData(*(cache[key] for key in COLUMNS))
 
-    # Extract columns and convert units
-    h = df['Heit(km)'].to_numpy()
-    O = df['Oden(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    N2 = df['N2den(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    O2 = df['O2den(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    air = df['air(gm/cm3)'].to_numpy() * 1000  # in Kg/m3
-    T = df['T(K)'].to_numpy()
-    He = df['Heden(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    Ar = df['Arden(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    H = df['Hden(cm-3)'].to_numpy() * 1e6  # in molecules/m3
-    N = df['Nden(cm-3)'].to_numpy() * 1e6  # in molecules/m3
+            file_hash = _file_hash(filename)
+            data = AtmosData(*(cache[key] for key in COLUMNS)) if str(cache['sha1']) == file_hash else None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass
 
-    return h, O, N2, O2, air, T, He, Ar, H, N
+    # Parse the text file if the content changed
+    if data is None:
+        data = parse_msis_text(filename)
+    if file_hash is None:
+        file_hash = _file_hash(filename)
 
+    # Write the cache, the simulation can run without it if the folder is not writable
+    try:
+        _write_cache(cache_file, mtime=stat.st_mtime, size=stat.st_size, sha1=file_hash, **data._asdict())
+    except OSError:
+        pass
 
-# Load data
-h, O, N2, O2, air, T, He, Ar, H, N = atmos_data()
+    return data
+
+
+# Return numpy arrays
+def atmos_data(filename=DEFAULT_FILE):
+    return tuple(load_atmos(filename))
+
+
+# ------------FAST TABLE LOOKUP----------------
+# Sorted height table with the values stored in log space, numba friendly.
+# If the heights are evenly spaced the interval is found by direct indexing, otherwise by binary search.
+AtmosTable = namedtuple('AtmosTable', ['h', 'log_f', 'h0', 'dh', 'uniform'])
+
+
+def make_atmos_table(heights:np.ndarray, values:np.ndarray, floor:float=1e-300) -> AtmosTable:
+
+    """
+    Builds a lookup table for a quantity that depends on the height.
+
+    Inputs:
+        heights: The heights of the table in km, sorted in increasing order
+        values: The values of the quantity at each height, they must be non negative
+        floor: Zero values are replaced by this, so their logarithm is finite
+
+    Returns:
+        table: The table to be used with atmos_interp and atmos_interp_batch
+    """
+
+    heights = np.ascontiguousarray(heights, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if np.any(np.diff(heights) <= 0):
+        raise ValueError("The heights of the table must be strictly increasing")
+
+    dh = (heights[-1] - heights[0]) / (len(heights) - 1)
+    uniform = bool(np.allclose(np.diff(heights), dh, rtol=1e-9, atol=0))
+
+    return AtmosTable(h=heights, log_f=np.log(np.maximum(values, floor)), h0=float(heights[0]), dh=float(dh), uniform=uniform)
+
+
+# Interpolate the table at one height, exponential (log-linear) between the nodes, 0 out of range
+@njit
+def atmos_interp(x:float, table:AtmosTable) -> float:
+    n = len(table.h)
+    if not (table.h[0] <= x <= table.h[n - 1]):
+        return 0.0
+
+    if table.uniform:
+        i = int((x - table.h0) / table.dh)
+    else:
+        i = np.searchsorted(table.h, x, side='right') - 1
+    if i > n - 2:
+        i = n - 2
+
+    s = (x - table.h[i]) / (table.h[i + 1] - table.h[i])
+    return np.exp(table.log_f[i] + s * (table.log_f[i + 1] - table.log_f[i]))
+
+
+# Value and derivative with the height of the interpolation of atmos_interp, the derivative of a node is the one
+# of the interval above it. 0, 0 out of range
+@njit
+def atmos_interp_slope(x:float, table:AtmosTable) -> tuple:
+    n = len(table.h)
+    if not (table.h[0] <= x <= table.h[n - 1]):
+        return 0.0, 0.0
+
+    if table.uniform:
+        i = int((x - table.h0) / table.dh)
+    else:
+        i = np.searchsorted(table.h, x, side='right') - 1
+    if i > n - 2:
+        i = n - 2
+
+    dh = table.h[i + 1] - table.h[i]
+    slope = (table.log_f[i + 1] - table.log_f[i]) / dh
+    f = np.exp(table.log_f[i] + (x - table.h[i]) * slope)
+    return f, f * slope
+
+
+# Interpolate the table at an array of heights
+@njit
+def atmos_interp_batch(x:np.ndarray, table:AtmosTable) -> np.ndarray:
+    out = np.empty(len(x))
+    for i in range(len(x)):
+        out[i] = atmos_interp(x[i], table)
+
+    return out
+
+
+# Number densities of several species at one height, on the heights of table with the logarithms in log_n
+# (one column per species). They are multiplied by scale and written in out[offset:], 0 out of range
+@njit
+def species_interp(x:float, table:AtmosTable, log_n:np.ndarray, scale:float, out:np.ndarray, offset:int):
+    n = len(table.h)
+    if not (table.h[0] <= x <= table.h[n - 1]):
+        for j in range(log_n.shape[1]):
+            out[offset + j] = 0.0
+        return
+
+    if table.uniform:
+        i = int((x - table.h0) / table.dh)
+    else:
+        i = np.searchsorted(table.h, x, side='right') - 1
+    if i > n - 2:
+        i = n - 2
+
+    s = (x - table.h[i]) / (table.h[i + 1] - table.h[i])
+    for j in range(log_n.shape[1]):
+        out[offset + j] = scale * np.exp(log_n[i, j] + s * (log_n[i + 1, j] - log_n[i, j]))
+
+
+# ------------LAZY LOADING----------------
+# The default table is loaded on first use, not at import
+@lru_cache(maxsize=None)
+def get_atmos() -> AtmosData:
+    return load_atmos()
+
+
+@lru_cache(maxsize=None)
+def get_air_table() -> AtmosTable:
+    data = get_atmos()
+    return make_atmos_table(data.h, data.air)
+
+
+# Logarithms of the number densities of SPECIES on the heights of the air table, one column per species
+@lru_cache(maxsize=None)
+def get_species_log() -> np.ndarray:
+    data = get_atmos()
+    densities = np.column_stack([getattr(data, species) for species in SPECIES])
+    return np.ascontiguousarray(np.log(np.maximum(densities, 1e-300)))
+
+
+# Module attributes h, O, N2, ..., air_table are loaded the first time they are accessed
+def __getattr__(name):
+    if name in COLUMNS:
+        return getattr(get_atmos(), name)
+    if name == 'air_table':
+        return get_air_table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Plot data
 if __name__ == '__main__':
     import matplotlib.pyplot as plt
 
+    h, O, N2, O2, air, T, He, Ar, H, N = atmos_data()
+
     # Plot data
     plt.figure(figsize=(10, 8))
 
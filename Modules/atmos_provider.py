@@ -0,0 +1,246 @@
+# Lucas Calderon
+# This file contains the atmosphere providers used by the drag model.
+# A provider gives the air density at an epoch and a position. The static table of Modules/atmos is the
+# default, the MSIS provider evaluates NRLMSIS live (latitude, longitude, local time and solar activity),
+# and the cached provider wraps any of them with a quantised LRU cache so the slow model is called rarely.
+
+import sys
+import os
+from collections import OrderedDict
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Modules.atmos import get_air_table, atmos_interp_batch
+
+# J2000 epoch (et = 0) as a numpy datetime, the few seconds between TDB and UTC don't matter for the atmosphere
+J2000 = np.datetime64('2000-01-01T12:00:00', 'ms')
+
+
+# ------------COORDINATES----------------
+# Rotation angle of the Earth (IERS Earth Rotation Angle), in radians
+def earth_rotation_angle(et):
+    days = np.asarray(et, dtype=np.float64) / 86400
+    return np.mod(2 * np.pi * (0.7790572732640 + 1.00273781191135448 * days), 2 * np.pi)
+
+
+# Altitude, latitude and longitude of J2000 positions, in km and degrees
+def position_to_geodetic(et, positions, body='Earth'):
+
+    """
+    Converts J2000 positions to altitude, latitude and east longitude over the rotating body.
+    The altitude uses the same oblate model as helper.sc_heigth, the latitude is geocentric.
+
+    Inputs:
+        et: The epochs, a scalar or N elements
+        positions: The positions as a 3 or N*3 element numpy array, in km
+        body: The body the positions are relative to
+
+    Returns:
+        alt, lat, lon: N element arrays, in km, degrees and degrees in [-180, 180)
+    """
+
+    body_data = getattr(bd, body)
+    positions = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+    x, y, z = positions[:, 0], positions[:, 1], positions[:, 2]
+
+    rho_xy = np.sqrt(x**2 + y**2)
+    theta = np.arctan(z / np.sqrt(rho_xy**2 + 1e-10))
+    r_local = body_data.radius_equator - np.abs(theta) / (2*np.pi) * (body_data.radius_equator - body_data.radius_polar)
+    alt = np.sqrt(x**2 + y**2 + z**2) - r_local
+
+    lat = np.degrees(np.arctan2(z, rho_xy))
+    lon = np.degrees(np.arctan2(y, x) - earth_rotation_angle(et))
+    lon = np.mod(lon + 180, 360) - 180
+
+    return alt, lat, lon
+
+
+# ------------PROVIDERS----------------
+class AtmosphereProvider:
+
+    """
+    Interface of the atmosphere providers. Subclasses implement density_geodetic,
+    density and densities convert J2000 positions and call it.
+    """
+
+    def density_geodetic(self, et:np.ndarray, alt:np.ndarray, lat:np.ndarray, lon:np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    # Density in kg/m^3 at one epoch and J2000 position
+    def density(self, et:float, position:np.ndarray) -> float:
+        return float(self.densities(np.array([et]), np.atleast_2d(position))[0])
+
+    # Densities in kg/m^3 along a trajectory
+    def densities(self, ets:np.ndarray, positions:np.ndarray) -> np.ndarray:
+        alt, lat, lon = position_to_geodetic(ets, positions)
+        return self.density_geodetic(np.broadcast_to(ets, alt.shape), alt, lat, lon)
+
+
+# Static single location profile of Modules/atmos, what drag_acceleration uses by default
+class TableProvider(AtmosphereProvider):
+
+    def __init__(self, table=None):
+        self.table = get_air_table() if table is None else table
+
+    def density_geodetic(self, et, alt, lat, lon):
+        return atmos_interp_batch(np.ascontiguousarray(alt, dtype=np.float64), self.table)
+
+
+# Live NRLMSIS through pymsis
+class MSISProvider(AtmosphereProvider):
+
+    """
+    Evaluates NRLMSIS at every point, taking into account latitude, longitude, local time and solar activity.
+
+    Inputs:
+        f107: The daily F10.7 solar flux
+        f107a: The 81 day average of F10.7
+        ap: The geomagnetic Ap index
+        version: The MSIS version used by pymsis
+    """
+
+    def __init__(self, f107:float=150, f107a:float=150, ap:float=4, version:float=2.1):
+        try:
+            import pymsis
+        except ImportError as error:
+            raise ImportError("The MSIS atmosphere provider needs pymsis, install it with 'pip install pymsis'") from error
+
+        self._msis = pymsis
+        self.f107 = f107
+        self.f107a = f107a
+        self.ap = ap
+        self.version = version
+        self.calls = 0
+
+    def density_geodetic(self, et, alt, lat, lon):
+        et = np.atleast_1d(np.asarray(et, dtype=np.float64))
+        n = len(et)
+        dates = J2000 + (et * 1000).astype('timedelta64[ms]')
+
+        output = self._msis.calculate(dates, np.atleast_1d(lon), np.atleast_1d(lat), np.atleast_1d(alt),
+                                      f107s=np.full(n, self.f107), f107as=np.full(n, self.f107a),
+                                      aps=np.full((n, 7), self.ap), version=self.version)
+        self.calls += 1
+
+        # Total mass density is the first variable, in kg/m^3
+        return np.nan_to_num(np.reshape(output, (n, -1))[:, 0])
+
+
+# Offsets of the 16 corners of a cell from its lower corner, 16*4: [alt, lat, lon, time]
+CORNERS = np.array([[(corner >> axis) & 1 for axis in range(4)] for corner in range(16)], dtype=np.int64)
+
+
+# Quantised LRU cache in front of another provider
+class CachedProvider(AtmosphereProvider):
+
+    """
+    Caches the densities of a provider on a grid of altitude, latitude, longitude and time nodes.
+    Every node is evaluated once, and the logarithm of the density is interpolated linearly between the 16 nodes
+    at the corners of the cell of a query. The result is continuous and doesn't depend on the order of the queries.
+    The least recently used nodes are evicted when the cache is full.
+    Each node a query needs is counted as a hit, or as a miss the first time it is evaluated.
+
+    Inputs:
+        provider: The provider to wrap, normally an MSISProvider
+        alt_step: The altitude spacing of the nodes, in km
+        angle_step: The latitude and longitude spacing of the nodes, in degrees
+        time_step: The time spacing of the nodes, in seconds
+        max_size: The maximum number of nodes kept
+        floor: Zero densities are replaced by this, so their logarithm is finite
+    """
+
+    def __init__(self, provider:AtmosphereProvider, alt_step:float=1.0, angle_step:float=2.0,
+                 time_step:float=3600.0, max_size:int=200000, floor:float=1e-300):
+        self.provider = provider
+        self.steps = np.array([alt_step, angle_step, angle_step, time_step])
+        self.max_size = max_size
+        self.floor = floor
+        self._nodes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Integer indices of the lower corner of the cells of the queries and the position inside them, N*4: [alt, lat, lon, time]
+    def _cells(self, et, alt, lat, lon):
+        scaled = np.stack((alt, lat, lon, et), axis=-1) / self.steps
+        lower = np.floor(scaled)
+        return lower.astype(np.int64), scaled - lower
+
+    # Integer indices of the 16 corners of the cells, N*16*4
+    def _corners(self, lower):
+        return lower[:, None, :] + CORNERS[None, :, :]
+
+    # Evaluate the provider at the nodes and store the logarithm of the densities
+    def _fill(self, keys):
+        nodes = keys * self.steps
+        values = self.provider.density_geodetic(nodes[:, 3], nodes[:, 0], nodes[:, 1], nodes[:, 2])
+        for key, value in zip(map(tuple, keys), np.log(np.maximum(values, self.floor))):
+            self._nodes[key] = float(value)
+            self._nodes.move_to_end(key)
+
+    # Drop the least recently used nodes, only once the nodes of a query are read
+    def _evict(self):
+        while len(self._nodes) > self.max_size:
+            self._nodes.popitem(last=False)
+            self.evictions += 1
+
+    def density_geodetic(self, et, alt, lat, lon):
+        lower, frac = self._cells(np.atleast_1d(et), np.atleast_1d(alt), np.atleast_1d(lat), np.atleast_1d(lon))
+        keys = [tuple(key) for key in self._corners(lower).reshape(-1, 4)]
+        missing = {key for key in keys if key not in self._nodes}
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            self._fill(np.array(sorted(missing)))
+
+        log_values = np.empty(len(keys))
+        for i, key in enumerate(keys):
+            log_values[i] = self._nodes[key]
+            self._nodes.move_to_end(key)
+        self._evict()
+
+        # Multilinear weights of the corners, the product over the axes of frac or 1 - frac
+        weights = np.prod(np.where(CORNERS[None, :, :] == 1, frac[:, None, :], 1 - frac[:, None, :]), axis=2)
+        return np.exp(np.sum(weights * log_values.reshape(-1, 16), axis=1))
+
+    # Fill the cache along a predicted trajectory with a single batched call to the provider
+    def prefill(self, ets:np.ndarray, positions:np.ndarray, h_max:float=745):
+        alt, lat, lon = position_to_geodetic(ets, positions)
+        inside = alt < h_max
+        lower = self._cells(np.broadcast_to(ets, alt.shape)[inside], alt[inside], lat[inside], lon[inside])[0]
+        keys = np.unique(self._corners(lower).reshape(-1, 4), axis=0)
+        keys = np.array([key for key in keys if tuple(key) not in self._nodes])
+        if len(keys):
+            self._fill(keys)
+            self._evict()
+
+        return len(keys)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._nodes),
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+# Fill a cached provider along the two body orbit of the initial state
+def prefill_along_orbit(provider:CachedProvider, state0:np.ndarray, t_span:np.ndarray, mu:float, n_points:int=20000) -> int:
+
+    """
+    Predicts the trajectory with a Keplerian orbit and prefills the cache along it.
+    Drag makes the real orbit decay, so the prediction only covers the first part of long phases,
+    the rest of the nodes are filled on demand.
+
+    Returns:
+        n_nodes: The number of nodes that were evaluated
+    """
+
+    from Modules.elements import states_to_coes_batch, coes_to_states_batch
+
+    ets = np.linspace(t_span[0], t_span[-1], n_points)
+    coes = states_to_coes_batch(state0[:6], t_span[0], mu)
+    states = coes_to_states_batch(np.repeat(coes, n_points, axis=0), ets)
+
+    return provider.prefill(ets, states[:, :3])
@@ -0,0 +1,135 @@
+# Lucas Calderon
+# This file contains the propagation of the uncertainty of the state with the unscented transform: a few sigma
+# points of the initial distribution are propagated as one ensemble (ensemble.py) and the mean and the covariance
+# are rebuilt from them at the requested epochs. The density can be uncertain too, as a lognormal factor on the drag
+# of every sigma point, that augments the state:
+#   [x, y, z, vx, vy, vz, m, log(drag_scale)]
+# The unscented transform uses 2n + 1 points (15 for the state, 17 with the density), the fifth degree cubature
+# 2n^2 + 1, exact for the moments of degree 4 of the distribution.
+
+import sys
+import os
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config.spacecraft import spacecraft
+from Modules.ensemble import propagate_ensemble
+
+
+# ------------SIGMA POINTS----------------
+# Square root of a covariance, S S^T = cov. It also works for the singular ones (an exact mass, for example)
+def _matrix_sqrt(cov:np.ndarray) -> np.ndarray:
+    w, v = np.linalg.eigh((cov + cov.T) / 2)
+    return v * np.sqrt(np.maximum(w, 0.0))
+
+
+def sigma_points(mean:np.ndarray, cov:np.ndarray, method:str='ut', alpha:float=1.0, beta:float=2.0, kappa:float=0.0) -> tuple:
+
+    """
+    Sigma points of a distribution and their weights.
+
+    Inputs:
+        mean: The mean, n elements
+        cov: The covariance, n*n
+        method: 'ut' for the scaled unscented transform (2n + 1 points) or 'cubature5' for the fifth degree
+            cubature rule (2n^2 + 1 points)
+        alpha, beta, kappa: The spread, the prior knowledge (2 for gaussians) and the secondary scaling of the
+            unscented transform, lambda = alpha^2 (n + kappa) - n
+
+    Returns:
+        points: The sigma points, as a M*n numpy array
+        w_m: The weights of the mean, M elements
+        w_c: The weights of the covariance, M elements
+    """
+
+    mean = np.asarray(mean, dtype=np.float64)
+    n = mean.size
+    S = _matrix_sqrt(np.asarray(cov, dtype=np.float64))
+
+    if method == 'ut':
+        lam = alpha**2 * (n + kappa) - n
+        offsets = np.sqrt(n + lam) * np.concatenate((np.zeros((1, n)), S.T, -S.T))
+        w_m = np.full(2 * n + 1, 0.5 / (n + lam))
+        w_m[0] = lam / (n + lam)
+        w_c = w_m.copy()
+        w_c[0] += 1 - alpha**2 + beta
+    elif method == 'cubature5':
+        # Center, the axes and the diagonals of every plane of two axes, at radius sqrt(n + 2)
+        units = [np.zeros(n)]
+        weights = [2.0 / (n + 2)]
+        for i in range(n):
+            for sign in (1.0, -1.0):
+                units.append(sign * np.eye(n)[i])
+                weights.append((4.0 - n) / (2 * (n + 2)**2))
+        for i in range(n):
+            for j in range(i + 1, n):
+                for s_i, s_j in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                    units.append((s_i * np.eye(n)[i] + s_j * np.eye(n)[j]) / np.sqrt(2))
+                    weights.append(1.0 / (n + 2)**2)
+        offsets = np.sqrt(n + 2) * np.array(units) @ S.T
+        w_m = np.array(weights)
+        w_c = w_m
+    else:
+        raise ValueError(f"Unknown sigma point method '{method}'")
+
+    return mean + offsets, w_m, w_c
+
+
+# Mean and covariance of weighted points, points is ...*M*n
+def sigma_statistics(points:np.ndarray, w_m:np.ndarray, w_c:np.ndarray) -> tuple:
+    mean = np.einsum('m,...mi->...i', w_m, points)
+    dev = points - mean[..., None, :]
+    cov = np.einsum('m,...mi,...mj->...ij', w_c, dev, dev)
+
+    return mean, cov
+
+
+# ------------PROPAGATION----------------
+def propagate_covariance(t_span:np.ndarray, state0:np.ndarray, cov0:np.ndarray, t_eval:np.ndarray=None,
+                         sigma_density:float=0.0, method:str='ut', dt:float=10, body:str='Earth', sc=spacecraft,
+                         threads:int=None, **kwargs) -> tuple:
+
+    """
+    Propagates the mean and the covariance of the state with the sigma points of an unscented transform, all of them
+    in one ensemble so they share the ephemerides, the rotation of the body and the threads.
+
+    Inputs:
+        t_span: The time span of the simulation, in et seconds
+        state0: The mean initial state, [x, y, z, vx, vy, vz, m]
+        cov0: The covariance of the initial state, 7*7 in km, km/s and kg
+        t_eval: (Optional) The epochs of the outputs, by default the end of the span
+        sigma_density: The standard deviation of the logarithm of the density (0.2 is about 20 %), 0 for an exact
+            density. It scales the drag of every sigma point
+        method: 'ut' or 'cubature5', see sigma_points
+        dt: The time step of the ensemble in seconds
+        body, sc, threads: As in ensemble.propagate_ensemble
+        kwargs: alpha, beta and kappa of the unscented transform
+
+    Returns:
+        t_out: The output epochs, the start of the span and t_eval
+        mean_hist: The mean state at t_out, as a N*7 numpy array
+        cov_hist: The covariance of the state at t_out, as a N*7*7 numpy array
+        term_reason: The termination reason of every sigma point (ensemble.RUNNING, CRASHED or MASS_DEPLETED), if
+            some of them stopped the statistics after it are not reliable
+    """
+
+    state0 = np.asarray(state0, dtype=np.float64)[:7]
+    mean0 = np.append(state0, 0.0)
+    cov = np.zeros((8, 8))
+    cov[:7, :7] = cov0
+    cov[7, 7] = sigma_density**2
+    if sigma_density == 0:
+        mean0 = mean0[:7]
+        cov = cov[:7, :7]
+
+    points, w_m, w_c = sigma_points(mean0, cov, method, **kwargs)
+    drag_scale = np.exp(points[:, 7]) if sigma_density != 0 else None
+    t_eval = np.array([t_span[1]]) if t_eval is None else np.asarray(t_eval, dtype=np.float64)
+
+    t_out, states_out, _, term_reason = propagate_ensemble(t_span, points[:, :7], dt=dt, body=body, sc=sc, drag_scale=drag_scale,
+                                                           threads=threads, t_eval=t_eval)
+    mean_hist, cov_hist = sigma_statistics(states_out, w_m, w_c)
+
+    return t_out, mean_hist, cov_hist, term_reason
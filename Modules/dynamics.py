@@ -3,6 +3,7 @@
 
 import sys
 import os
+from collections import namedtuple
 import numpy as np
 from numba import njit
 import spiceypy as spice
@@ -10,28 +11,36 @@ import spiceypy as spice
 # Add the project root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from Modules.helper import sc_heigth, norm
+from Modules.helper import sc_heigth, sc_heigth_radii, norm
 from Config import bodies_data as bd
 from Config.spacecraft import spacecraft
-from Modules.aero import drag_acceleration
-from Modules.atmos import h, air
-
-heights = h
-rho = air
+from Modules.aero import drag_acceleration, drag_acceleration_bound
+from Modules.atmos import AtmosTable, get_air_table, get_species_log, atmos_interp
+from Modules.ephemeris import get_ephemeris, ephemeris_position
+from Modules.gravity import build_gravity_field, body_rotation, gravity_acceleration
+from Modules.srp import shadow_fraction, srp_acceleration
+from Modules.intake import INTAKE_IDX, INTAKE_SIZE, intake_flux, intake_rates
+from Modules.steering import SteeringLaw, steering_law, steering_control
 
 
 # Current acceleration function
-def acceleration(et:float, state:np.ndarray, body='Earth') -> np.array:
+def acceleration(et:float, state:np.ndarray, body='Earth', atmos_provider=None, srp:bool=True, perturbers:tuple=None) -> np.array:
 
     """
     This function calculates the acceleration of the spacecraft.
     It can take into account the gravitational pull of the celestial bodies up to the second order.
-    It can also take into account the drag of the atmosphere.
+    It can also take into account the drag of the atmosphere and the solar radiation pressure.
+    The positions of the third bodies and of the Sun come from one cached Chebyshev table (ephemeris.get_ephemeris)
+    that is fitted once per window of a few days, so the calls don't go through SPICE.
 
     Inputs:
         t: The time of the simulation
         state: The state of the spacecraft as a 7 element numpy array: [x, y, z, vx, vy, vz, m]
         body: The celestial body that the spacecraft is orbiting
+        atmos_provider: (Optional) An AtmosphereProvider from Modules/atmos_provider for the density,
+            by default the static table of Modules/atmos is used
+        srp: Include the solar radiation pressure, the same switch as build_force_model
+        perturbers: The third bodies, by default the ones of bodies_data, as in build_force_model
 
     Returns:
         state_dot: The derivative of the state as a 7 element numpy array: [vx, vy, vz, ax, ay, az, m_dot]
@@ -50,41 +59,54 @@ def acceleration(et:float, state:np.ndarray, body='Earth') -> np.array:
     J2 = body_data.J2
     atmos = body_data.atmos
     R_e = body_data.radius_equator
-    body2 = body_data.body2
-    mu2 = getattr(bd, body2).gravitational_parameter
-    pos_body2 = spice.spkezr(body2, et, 'J2000', 'NONE', body)[0][:3] # Position of the second body, wrt to the first body
 
     # From the spacecraft data
-    a_T = spacecraft.thrust / state[6] / 1000 * velocity / np.linalg.norm(velocity) # Thrust acceleration in km/s^2
     if spacecraft.thrust is not None:
+        a_T = spacecraft.thrust / state[6] / 1000 * velocity / np.linalg.norm(velocity) # Thrust acceleration in km/s^2
         m_dot = spacecraft.mass_flow_rate
     else:
+        a_T = np.zeros(3)
         m_dot = 0
 
     #--------------------------------
 
-    # Calculate radius, position2 and height
+    # Calculate radius and height
     r = np.linalg.norm(position) 
     h = sc_heigth(position)
-    position2 = pos_body2 - position
-    r2 = np.linalg.norm(pos_body2)
 
     # Acceleration due to gravity of the first body
     a_total = - mu / r**3 * position
 
     # Acceleration due to second order perturbations
-    a_total += -3 * mu * J2 * R_e**2 / r**5 * np.array([
+    a_total += 1.5 * mu * J2 * R_e**2 / r**5 * np.array([
         position[0] * (5 * position[2]**2 / r**2 - 1), 
         position[1] * (5 * position[2]**2 / r**2 - 1), 
         position[2] * (5 * position[2]**2 / r**2 - 3)
     ])
 
-    # Acceleration due to gravity of the second body
-    a_total += - mu2 / r2**3 * position2
+    # Positions of the third bodies and of the Sun wrt to the first body, from one shared ephemeris table
+    perturbers = body_data.perturbers if perturbers is None else tuple(perturbers)
+    targets, sun_index = _python_targets(perturbers, srp)
+    if targets:
+        pos_bodies = ephemeris_position(et, get_ephemeris(targets, body, np.array([et, et])))
+
+    # Acceleration due to gravity of the third bodies
+    for k, name in enumerate(perturbers):
+        a_total += np.array(third_body_acceleration(*position, *pos_bodies[3 * k:3 * k + 3], perturber_data(name)[1]))
+
+    # Acceleration due to solar radiation pressure, in the shadow of the body
+    if srp:
+        pos_sun = pos_bodies[3 * sun_index:3 * sun_index + 3]
+        nu = shadow_fraction(*position, *pos_sun, R_e)
+        a_total += np.array(srp_acceleration(*position, *pos_sun, nu, spacecraft.C_R, spacecraft.A, state[6]))
 
     # Acceleration due to drag
     if h < 745 and atmos is True:
-        a_drag = drag_acceleration(position, velocity, heights, rho)
+        if atmos_provider is None:
+            a_drag = drag_acceleration(position, velocity, get_air_table())
+        else:
+            rho = atmos_provider.density(et, position)
+            a_drag = drag_acceleration_bound(position, velocity, rho, spacecraft.C_D, spacecraft.A, spacecraft.mass0, 2 * np.pi / body_data.day)
         a_total += a_drag 
 
     # Acceleration due to thrust, assumed to be perfectly aligned with the velocity vector
@@ -96,6 +118,15 @@ def acceleration(et:float, state:np.ndarray, body='Earth') -> np.array:
     return state_dot
 
 
+# Targets of the ephemeris table of acceleration: the third bodies, then the Sun for the SRP if it isn't one of them
+def _python_targets(perturbers:tuple, srp:bool=True) -> tuple:
+    targets = tuple(perturber_data(name)[0] for name in perturbers)
+    if srp and 'SUN' not in targets:
+        targets += ('SUN',)
+
+    return targets, targets.index('SUN') if srp else -1
+
+
 # New acceleration function (WORK IN PROGRESS)
 def acceleration_new(et:float, state:np.ndarray, body='Earth', perts=None) -> np.array:
 
@@ -127,24 +158,21 @@ def acceleration_new(et:float, state:np.ndarray, body='Earth', perts=None) -> np
     J2 = body_data.J2
     atmos = body_data.atmos
     R_e = body_data.radius_equator
-    body2 = body_data.body2
-    mu2 = getattr(bd, body2).gravitational_parameter
-    pos_body2 = spice.spkezr(body2, et, 'J2000', 'NONE', body)[0][:3] # Position of the second body, wrt to the first body
+    perturbers = body_data.perturbers
 
     # From the spacecraft data
-    a_T = spacecraft.thrust / state[6] / 1000 * velocity / np.linalg.norm(velocity) # Thrust acceleration in km/s^2
     if spacecraft.thrust is not None:
+        a_T = spacecraft.thrust / state[6] / 1000 * velocity / np.linalg.norm(velocity) # Thrust acceleration in km/s^2
         m_dot = spacecraft.mass_flow_rate
     else:
+        a_T = np.zeros(3)
         m_dot = 0
 
     #--------------------------------
 
-    # Calculate radius, position2 and height
+    # Calculate radius and height
     r = np.linalg.norm(position)
     h = sc_heigth(position)
-    position2 = pos_body2 - position
-    r2 = np.linalg.norm(pos_body2)
 
     # Acceleration due to central body
     a_total = - mu / r**3 * position
@@ -158,7 +186,7 @@ def acceleration_new(et:float, state:np.ndarray, body='Earth', perts=None) -> np
 
 # Numba version of the acceleration function
 @njit()
-def acceleration_numba(position:np.array, velocity:np.array, body:str='Earth') -> np.array:
+def acceleration_numba(position:np.array, velocity:np.array, air_table:AtmosTable, body:str='Earth') -> np.array:
 
     """
     This function calculates the acceleration of the spacecraft.
@@ -188,16 +216,323 @@ def acceleration_numba(position:np.array, velocity:np.array, body:str='Earth') -
 
     # Acceleration due to perturbations
     if body == 'Earth':
-        a_total += -1.5 * mu * J2 * R_e**2 / r**5 * np.array([position[0] * (5 * position[2]**2 / r**2 - 1), position[1] * (5 * position[2]**2 / r**2 - 1), position[2] * (5 * position[2]**2 / r**2 - 3)])
+        a_total += 1.5 * mu * J2 * R_e**2 / r**5 * np.array([position[0] * (5 * position[2]**2 / r**2 - 1), position[1] * (5 * position[2]**2 / r**2 - 1), position[2] * (5 * position[2]**2 / r**2 - 3)])
 
     # Acceleration due to drag
     if h < 745 and atmos is True:
-        a_drag = drag_acceleration(position, velocity, heights, rho)
+        a_drag = drag_acceleration(position, velocity, air_table)
         a_total += a_drag 
 
     return a_total
 
 
+# ------------THIRD BODIES----------------
+# SPICE target and gravitational parameter of a third body of bodies_data
+def perturber_data(name:str) -> tuple:
+    body_data = getattr(bd, name)
+    return getattr(body_data, 'spice_name', body_data.name.upper()), float(body_data.gravitational_parameter)
+
+
+# Largest radius of the osculating orbit of a state, inf if the orbit is not bound.
+# dv is a speed in km/s added along the velocity, the propellant of a phase that thrusts along it
+def apoapsis_radius(state:np.ndarray, mu:float, dv:float=0.0) -> float:
+    r = np.linalg.norm(state[:3])
+    v = np.linalg.norm(state[3:6])
+    velocity = state[3:6] * (1 + dv / v) if v > 0 else state[3:6]
+    energy = 0.5 * np.dot(velocity, velocity) - mu / r
+    if energy >= 0:
+        return np.inf
+    a = -mu / (2 * energy)
+    h = np.linalg.norm(np.cross(state[:3], velocity))
+    e = np.sqrt(max(1 - h**2 / (mu * a), 0.0))
+
+    return a * (1 + e)
+
+
+def select_perturbers(t_span:np.ndarray, body:str='Earth', perturbers:tuple=None, r_max:float=None,
+                      tol:float=1e-10, n_samples:int=50) -> tuple:
+
+    """
+    Drops the third bodies whose contribution is negligible during a phase. The tidal acceleration of a body
+    of parameter mu_k at a distance d is about 2 mu_k r / d^3 for a spacecraft at a radius r, a body is kept
+    if this stays above tol times the point mass acceleration mu / r^2 at the largest radius of the phase.
+
+    Inputs:
+        t_span: The time span of the phase, in et seconds
+        body: The celestial body that the spacecraft is orbiting
+        perturbers: The candidate third bodies, by default the ones of bodies_data
+        r_max: The largest radius of the spacecraft during the phase, in km, by default the SOI of the body
+        tol: The threshold relative to the point mass acceleration, 0 keeps every body
+        n_samples: The number of epochs at which the distance of the bodies is sampled
+
+    Returns:
+        perturbers: The names of the bodies that are kept
+    """
+
+    body_data = getattr(bd, body)
+    perturbers = tuple(body_data.perturbers if perturbers is None else perturbers)
+    if tol <= 0:
+        return perturbers
+
+    r = body_data.SOI if r_max is None else min(r_max, body_data.SOI)
+    ets = np.linspace(t_span[0], t_span[-1], n_samples)
+    kept = []
+    for name in perturbers:
+        spice_name, mu_k = perturber_data(name)
+        d = np.min(np.linalg.norm(np.array(spice.spkezr(spice_name, ets.tolist(), 'J2000', 'NONE', body)[0])[:, :3], axis=1))
+        if 2 * mu_k * r**3 / (body_data.gravitational_parameter * d**3) >= tol:
+            kept.append(name)
+
+    return tuple(kept)
+
+
+# Acceleration of a third body on the spacecraft relative to the first body: mu_k ((s - r) / |s - r|^3 - s / |s|^3).
+# The direct and indirect terms nearly cancel far from the body, so they are combined with Battin's F(q):
+# a = -mu_k / |r - s|^3 (r + F(q) s), with q = r . (r - 2 s) / s . s and F(q) = (1 + q)^(3/2) - 1 without cancellation
+# The coordinates are scalars so the compiled kernel doesn't slice the table of positions
+@njit
+def third_body_acceleration(x:float, y:float, z:float, s_x:float, s_y:float, s_z:float, mu_body:float) -> tuple:
+    d2 = (x - s_x)**2 + (y - s_y)**2 + (z - s_z)**2
+    q = (x * (x - 2 * s_x) + y * (y - 2 * s_y) + z * (z - 2 * s_z)) / (s_x**2 + s_y**2 + s_z**2)
+    F = q * (3 + 3 * q + q**2) / (1 + (1 + q)**1.5)
+    k = - mu_body / (d2 * np.sqrt(d2))
+
+    return k * (x + F * s_x), k * (y + F * s_y), k * (z + F * s_z)
+
+
+# ------------COMPILED ACCELERATION----------------
+# Everything the compiled acceleration needs is bound once per phase in this named tuple,
+# so the hot loop never touches the config modules or SPICE.
+# The third bodies share one ephemeris table eph, mu_bodies has their gravitational parameters in the same order.
+# The Sun is in the table at sun_index for the solar radiation pressure (after the third bodies if it isn't one),
+# sun_index is -1 without it.
+# A_eff is the effective area of the intake (eff_in * A_intake) and species the logarithms of the number densities
+# of the captured species on the heights of air_table. With air_breathing the thruster runs on the captured air.
+# steering is the SteeringLaw that points and throttles the thrust (steering.py).
+# counters are the call counters of the profiled runs (profiling.py), indexed by COUNTERS. They are empty otherwise
+# and the kernel only checks their size
+ForceModel = namedtuple('ForceModel', ['mu', 'gravity', 'R_e', 'R_p', 'atmos', 'h_atmos', 'omega', 'mu_bodies',
+                                       'C_D', 'C_R', 'A', 'mass0', 'thrust', 'm_dot', 'air_table',
+                                       'eph', 'sun_index', 'A_eff', 'air_breathing', 'species', 'steering', 'counters'])
+
+# Counters of the kernel: its calls and the lookups of the atmosphere table
+RHS_CALLS = 0
+ATMOS_LOOKUPS = 1
+COUNTERS = ('rhs_calls', 'atmos_lookups')
+
+
+# Build the force model for a phase
+def build_force_model(t_span:np.ndarray, body:str='Earth', sc=spacecraft, eph_tol:float=1e-3,
+                      degree:int=None, order:int=None, gravity_tol:float=0.0, perturbers:tuple=None,
+                      states0:np.ndarray=None, perturbation_tol:float=1e-10, srp:bool=True,
+                      steering:SteeringLaw=None, profile:bool=False) -> ForceModel:
+
+    """
+    Binds the body constants, the gravity field, the spacecraft parameters, the atmosphere tables and
+    the ephemerides of the third bodies and of the Sun for one phase.
+
+    Inputs:
+        t_span: The time span of the phase, in et seconds
+        body: The celestial body that the spacecraft is orbiting
+        sc: The spacecraft named tuple, defaults to the one in Config.spacecraft
+        eph_tol: The maximum position error of the cached ephemerides of the third bodies, in km
+        degree, order: The degree and order of the gravity field, by default the ones of bodies_data
+        gravity_tol: The adaptive truncation of the gravity field with the altitude, see gravity.build_gravity_field
+        perturbers: The third bodies, by default the ones of bodies_data
+        states0: (Optional) The initial state or states of the phase, the apoapsis of their orbits (after spending
+            the propellant along the velocity) bounds the radius used to drop negligible third bodies.
+            Without it the SOI is used
+        perturbation_tol: The threshold of select_perturbers, 0 keeps every third body
+        srp: Include the solar radiation pressure, with the conical shadow of the body
+        steering: (Optional) The SteeringLaw of the thrust, by default along the velocity and always on
+        profile: Count the calls of the kernel and the lookups of the atmosphere in fm.counters
+
+    Returns:
+        fm: The force model named tuple, to be passed to acceleration_compiled
+    """
+
+    body_data = getattr(bd, body)
+
+    r_max = None
+    if states0 is not None:
+        dv = 0.0
+        if sc.thrust is not None:
+            dv = sc.thrust / sc.mass_flow_rate * np.log(sc.mass0 / (sc.mass0 - sc.M_propellant)) / 1000 # Rocket equation, km/s
+        r_max = max(apoapsis_radius(state, body_data.gravitational_parameter, dv) for state in np.atleast_2d(states0))
+    perturbers = select_perturbers(t_span, body, perturbers, r_max, perturbation_tol)
+    targets = tuple(perturber_data(name)[0] for name in perturbers)
+
+    # The Sun of the radiation pressure shares the table of the third bodies
+    sun_index = -1
+    if srp:
+        if 'SUN' not in targets:
+            targets += ('SUN',)
+        sun_index = targets.index('SUN')
+    eph = get_ephemeris(targets, body, t_span, tol=eph_tol)
+
+    fm = ForceModel(
+        mu=float(body_data.gravitational_parameter),
+        gravity=build_gravity_field(body, float(t_span[0]), degree, order, gravity_tol),
+        R_e=float(body_data.radius_equator),
+        R_p=float(body_data.radius_polar),
+        atmos=bool(body_data.atmos),
+        h_atmos=745.0,
+        omega=2 * np.pi / body_data.day,
+        mu_bodies=np.array([perturber_data(name)[1] for name in perturbers], dtype=np.float64),
+        C_D=float(sc.C_D),
+        C_R=float(sc.C_R),
+        A=float(sc.A),
+        mass0=float(sc.mass0),
+        thrust=float(sc.thrust) if sc.thrust is not None else 0.0,
+        m_dot=float(sc.mass_flow_rate) if sc.thrust is not None else 0.0,
+        air_table=get_air_table(),
+        eph=eph,
+        sun_index=int(sun_index),
+        A_eff=float(sc.eff_in * sc.A_intake),
+        air_breathing=bool(sc.air_breathing),
+        species=get_species_log(),
+        steering=steering_law(body=body) if steering is None else steering,
+        counters=np.zeros(len(COUNTERS) if profile else 0, dtype=np.int64),
+    )
+
+    return fm
+
+
+# Compiled version of acceleration, same physics
+@njit
+def acceleration_compiled(et:float, state:np.ndarray, fm:ForceModel) -> np.array:
+
+    """
+    Compiled version of acceleration. It has the same terms (point mass, third bodies, solar radiation
+    pressure, rotating atmosphere drag and thrust) but takes every constant from
+    the force model built by build_force_model instead of looking them up on every call.
+    The positions of the third bodies and of the Sun come from the shared Chebyshev ephemeris table.
+    With the same switches (perturbers, srp) the two differ in:
+        - Gravity: acceleration has the J2 of bodies_data about the J2000 z axis, this is the spherical harmonic
+          field of the force model in the body fixed frame, with the pole of the PCK and the coefficients of the
+          gravity file. With degree 2 and order 0 they agree to the drift of the pole from J2000 and the
+          difference of the coefficients
+        - Drag and thrust: acceleration takes the spacecraft of Config/spacecraft and the height and rotation
+          of the Earth whatever the body, this takes the spacecraft, the body and the steering law of the force model
+        - Third bodies: build_force_model drops the ones below perturbation_tol along the phase (select_perturbers)
+
+    Inputs:
+        et: The time of the simulation
+        state: The state of the spacecraft as a 7 element numpy array: [x, y, z, vx, vy, vz, m], or with the
+            intake components of intake.intake_state after them
+        fm: The force model of the phase
+
+    Returns:
+        state_dot: The derivative of the state, same size as state: [vx, vy, vz, ax, ay, az, m_dot, ...]
+    """
+
+    state_dot = np.empty(state.size)
+    acceleration_kernel(et, state, ephemeris_position(et, fm.eph), body_rotation(et, fm.gravity), fm, 1.0, state_dot)
+
+    return state_dot
+
+
+# Body of acceleration_compiled, writes the derivative into state_dot instead of allocating it.
+# The positions of the third bodies (ephemeris.ephemeris_position of fm.eph) and the rotation to the body fixed frame (gravity.body_rotation) are inputs
+# so they can be shared by many states at the same epoch, drag_scale multiplies the drag (for dispersions of the
+# density or of C_D * A). If state_dot has the intake components, the captured air and species are written in them.
+# The epoch et is the one of the throttle schedule of the steering law.
+@njit
+def acceleration_kernel(et:float, state:np.ndarray, pos_bodies:np.ndarray, rot:np.ndarray, fm:ForceModel, drag_scale:float, state_dot:np.ndarray):
+
+    position = state[:3]
+    velocity = state[3:6]
+    x = state[0]
+    y = state[1]
+    z = state[2]
+
+    # Calculate radius and height
+    r = np.sqrt(x**2 + y**2 + z**2)
+    h = sc_heigth_radii(position, fm.R_e, fm.R_p)
+    counting = fm.counters.size > 0
+    if counting:
+        fm.counters[RHS_CALLS] += 1
+
+    # Acceleration due to gravity of the first body
+    k_mu = - fm.mu / r**3
+    ax = k_mu * x
+    ay = k_mu * y
+    az = k_mu * z
+
+    # Acceleration due to the non spherical gravity field
+    g_x, g_y, g_z = gravity_acceleration(position, rot, fm.gravity)
+    ax += g_x
+    ay += g_y
+    az += g_z
+
+    # Acceleration due to gravity of the third bodies
+    mu_bodies = fm.mu_bodies
+    for k in range(mu_bodies.size):
+        b_x, b_y, b_z = third_body_acceleration(x, y, z, pos_bodies[3 * k], pos_bodies[3 * k + 1], pos_bodies[3 * k + 2], mu_bodies[k])
+        ax += b_x
+        ay += b_y
+        az += b_z
+
+    # Acceleration due to solar radiation pressure, in the shadow of the body
+    if fm.sun_index >= 0:
+        i = 3 * fm.sun_index
+        nu = shadow_fraction(x, y, z, pos_bodies[i], pos_bodies[i + 1], pos_bodies[i + 2], fm.R_e)
+        if nu > 0.0:
+            p_x, p_y, p_z = srp_acceleration(x, y, z, pos_bodies[i], pos_bodies[i + 1], pos_bodies[i + 2], nu, fm.C_R, fm.A, state[6])
+            ax += p_x
+            ay += p_y
+            az += p_z
+
+    # Acceleration due to drag, and the air captured by the intake
+    capture = state_dot.size >= INTAKE_IDX + INTAKE_SIZE
+    m_in = 0.0
+    if h < fm.h_atmos and fm.atmos:
+        rho = drag_scale * atmos_interp(h, fm.air_table)
+        if counting:
+            fm.counters[ATMOS_LOOKUPS] += 1
+        a_drag = drag_acceleration_bound(position, velocity, rho, fm.C_D, fm.A, fm.mass0, fm.omega)
+        ax += a_drag[0]
+        ay += a_drag[1]
+        az += a_drag[2]
+
+        if capture or fm.air_breathing:
+            flux = intake_flux(position, velocity, fm.omega, fm.A_eff)
+            m_in = rho * flux
+            if capture:
+                intake_rates(h, m_in, drag_scale * flux, fm.air_table, fm.species, state_dot)
+    elif capture:
+        for j in range(INTAKE_IDX, INTAKE_IDX + INTAKE_SIZE):
+            state_dot[j] = 0.0
+
+    # Thrust and mass flow, throttled and pointed by the steering law. An air-breathing thruster takes the captured
+    # air up to its nominal mass flow, at the same exhaust speed, and the rest is let out: the mass of the spacecraft
+    # doesn't change
+    throttle, u_x, u_y, u_z = 0.0, 0.0, 0.0, 0.0
+    if fm.thrust != 0.0:
+        throttle, u_x, u_y, u_z = steering_control(et, state, fm.steering, fm.mu)
+    thrust = fm.thrust * throttle
+    m_dot = fm.m_dot * throttle
+    if fm.air_breathing:
+        thrust = thrust * min(m_in / fm.m_dot, 1.0) if fm.m_dot > 0.0 else 0.0
+        m_dot = 0.0
+
+    # Acceleration due to thrust
+    if thrust != 0.0:
+        k_T = thrust / state[6] / 1000 # Thrust acceleration in km/s^2
+        ax += k_T * u_x
+        ay += k_T * u_y
+        az += k_T * u_z
+
+    # Fill state_dot
+    state_dot[0] = velocity[0]
+    state_dot[1] = velocity[1]
+    state_dot[2] = velocity[2]
+    state_dot[3] = ax
+    state_dot[4] = ay
+    state_dot[5] = az
+    state_dot[6] = -m_dot
+
+
 # Test the function
 if __name__ == "__main__":
     position = np.array([6471, 0, 0])
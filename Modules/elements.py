@@ -0,0 +1,191 @@
+# Lucas Calderon
+# This file contains vectorised conversions between cartesian states and classical orbital elements.
+# They follow the same conventions and the same 11 column layout as spice.oscltx and spice.conics,
+# but convert a whole history in one call and don't need SPICE at all, so they can run in worker processes.
+
+import numpy as np
+
+
+# ------------HELPERS----------------
+# Angle between the rows of two arrays of vectors, same stable formula as spice.vsep
+def _vsep(u, v):
+    u_hat = u / np.linalg.norm(u, axis=1)[:, None]
+    v_hat = v / np.linalg.norm(v, axis=1)[:, None]
+    dot = np.sum(u_hat * v_hat, axis=1)
+    diff = np.linalg.norm(u_hat - v_hat, axis=1)
+    summ = np.linalg.norm(u_hat + v_hat, axis=1)
+    return np.where(dot > 0, 2 * np.arcsin(np.minimum(diff / 2, 1)), np.pi - 2 * np.arcsin(np.minimum(summ / 2, 1)))
+
+
+# Solve Kepler's equation M = E - e sin(E) (elliptic) or M = e sinh(F) - F (hyperbolic) for every row
+def _solve_kepler(M, e, hyperbolic, tol=1e-15, max_iter=50):
+    E = np.where(hyperbolic, np.arcsinh(M / np.maximum(e, 1)), np.where(e < 0.8, M, np.pi * np.sign(M)))
+
+    for _ in range(max_iter):
+        f = np.where(hyperbolic, e * np.sinh(E) - E - M, E - e * np.sin(E) - M)
+        df = np.where(hyperbolic, e * np.cosh(E) - 1, 1 - e * np.cos(E))
+        dE = f / df
+        E = E - dE
+        if np.all(np.abs(dE) <= tol * np.maximum(1, np.abs(E))):
+            break
+
+    return E
+
+
+# ------------FUNCTIONS TO CONVERT BETWEEN COES AND STATE----------------
+# Batched version of helper.states_to_coes
+def states_to_coes_batch(state:np.ndarray, et:np.ndarray, mu:float) -> np.ndarray:
+
+    """
+    Converts cartesian coordinates to orbital elements for a whole history at once.
+    The output matches spice.oscltx row by row.
+
+    Inputs:
+        state: A 2D array with the state of the spacecraft as a 6*N element numpy array over time: [x, y, z, vx, vy, vz] * N
+        et: The time ephimeral time of the simulation, a list of N elements
+        mu: The gravitational parameter of the central body (km^3/s^2)
+
+    Returns:
+        coes: The classical orbital elements of the spacecraft as a 11 element numpy array:
+            [peri, e, i, longitude_ascending_node, arg_periapsis, mean_anomaly_atepoch, epoch, mu, true_anomaly_atepoch, a, orbital_period] * N
+    """
+
+    state = np.atleast_2d(np.asarray(state, dtype=np.float64))
+    et = np.broadcast_to(np.asarray(et, dtype=np.float64), (len(state),))
+    r = state[:, :3]
+    v = state[:, 3:6]
+    n_rows = len(state)
+
+    z_vec = np.broadcast_to(np.array([0.0, 0.0, 1.0]), (n_rows, 3))
+    x_vec = np.broadcast_to(np.array([1.0, 0.0, 0.0]), (n_rows, 3))
+
+    r_mag = np.linalg.norm(r, axis=1)
+    h = np.cross(r, v)
+    if np.any(np.linalg.norm(h, axis=1) == 0):
+        raise ValueError("The position and velocity are parallel, the orbit is degenerate")
+
+    # Node and eccentricity vectors
+    n = np.cross(z_vec, h)
+    e_vec = np.cross(v, h) / mu - r / r_mag[:, None]
+    ecc = np.linalg.norm(e_vec, axis=1)
+    ecc = np.where(np.abs(ecc - 1) < 1e-10, 1.0, ecc)
+
+    # Periapsis and inclination
+    p = np.sum(h * h, axis=1) / mu
+    rp = p / (1 + ecc)
+    inc = _vsep(h, z_vec)
+
+    # Longitude of the ascending node, along x for equatorial orbits
+    equatorial = (inc == 0) | (inc == np.pi)
+    n = np.where(equatorial[:, None], x_vec, n)
+    lnode = np.where(equatorial, 0.0, np.arctan2(n[:, 1], n[:, 0]))
+    lnode = np.where(lnode < 0, lnode + 2 * np.pi, lnode)
+
+    # Argument of periapsis, measured from the node to the eccentricity vector
+    # The eccentricity vector is projected on the orbit plane, for nearly circular orbits it is round-off noise
+    h_hat = h / np.linalg.norm(h, axis=1)[:, None]
+    circular = ecc == 0
+    perix = np.where(circular[:, None], n, e_vec - np.sum(e_vec * h_hat, axis=1)[:, None] * h_hat)
+    argp = np.where(circular, 0.0, _vsep(n, perix))
+    retro_quadrant = np.where(equatorial, np.sum(np.cross(n, perix) * h, axis=1) < 0, perix[:, 2] < 0)
+    argp = np.where((argp != 0) & retro_quadrant, 2 * np.pi - argp, argp)
+
+    # True anomaly, measured from periapsis to the position
+    nu = _vsep(perix, r)
+    nu = np.where((nu != 0) & (np.sum(np.cross(perix, r) * h, axis=1) < 0), 2 * np.pi - nu, nu)
+
+    # Mean anomaly
+    elliptic = ecc < 1
+    hyperbolic = ecc > 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos_nu = np.cos(nu)
+        sin_nu = np.sin(nu)
+        E = np.arctan2(np.sqrt(np.abs(1 - ecc**2)) * sin_nu, ecc + cos_nu)
+        F = 2 * np.arctanh(np.sqrt(np.abs(ecc - 1) / (ecc + 1)) * np.tan(nu / 2))
+        D = np.tan(nu / 2)
+        m0 = np.where(elliptic, E - ecc * np.sin(E), np.where(hyperbolic, ecc * np.sinh(F) - F, D + D**3 / 3))
+    m0 = np.where(elliptic & (m0 < 0), m0 + 2 * np.pi, m0)
+
+    # Semi-major axis and period
+    with np.errstate(divide='ignore'):
+        a = np.where(ecc != 1, rp / (1 - ecc), 0.0)
+    tau = np.where(elliptic, 2 * np.pi * np.sqrt(np.abs(a)**3 / mu), 0.0)
+
+    coes = np.empty((n_rows, 11))
+    coes[:, 0] = rp
+    coes[:, 1] = ecc
+    coes[:, 2] = inc
+    coes[:, 3] = lnode
+    coes[:, 4] = argp
+    coes[:, 5] = m0
+    coes[:, 6] = et
+    coes[:, 7] = mu
+    coes[:, 8] = nu
+    coes[:, 9] = a
+    coes[:, 10] = tau
+
+    return coes
+
+
+# Batched version of helper.coes_to_states
+def coes_to_states_batch(elts:np.ndarray, et:np.ndarray) -> np.ndarray:
+
+    """
+    Converts orbital elements to cartesian coordinates for a whole history at once.
+    The output matches spice.conics row by row, and only the first 8 columns of elts are used,
+    so the output of states_to_coes_batch can be passed back directly.
+
+    Inputs:
+        elts: The orbital elements of the spacecraft as a 8*N element numpy array:
+            [Periapsis, e, i, raan, arg_periapsis, mean_anomaly_atepoch, et, mu] * N
+        et: The epochs at which the states are wanted, N elements
+
+    Returns:
+        state: The state of the spacecraft as a 6*N element numpy array: [x, y, z, vx, vy, vz] * N
+    """
+
+    elts = np.atleast_2d(np.asarray(elts, dtype=np.float64))
+    et = np.broadcast_to(np.asarray(et, dtype=np.float64), (len(elts),))
+    rp, ecc, inc, lnode, argp, m0, t0, mu = elts[:, :8].T
+
+    if np.any(rp <= 0) or np.any(ecc < 0) or np.any(mu <= 0):
+        raise ValueError("The periapsis and mu must be positive and the eccentricity non negative")
+
+    # Perifocal basis: P towards periapsis, Q 90 deg ahead in the orbit plane
+    cos_i, sin_i = np.cos(inc), np.sin(inc)
+    cos_n, sin_n = np.cos(lnode), np.sin(lnode)
+    cos_w, sin_w = np.cos(argp), np.sin(argp)
+    P = np.stack((cos_n * cos_w - sin_n * cos_i * sin_w, sin_n * cos_w + cos_n * cos_i * sin_w, sin_i * sin_w), axis=1)
+    Q = np.stack((-cos_n * sin_w - sin_n * cos_i * cos_w, -sin_n * sin_w + cos_n * cos_i * cos_w, sin_i * cos_w), axis=1)
+
+    elliptic = ecc < 1
+    hyperbolic = ecc > 1
+    parabolic = ~(elliptic | hyperbolic)
+    p = rp * (1 + ecc)
+
+    # Mean anomaly at the requested epochs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(parabolic, 1.0, rp / (1 - ecc))
+        mean_motion = np.where(parabolic, np.sqrt(mu / (2 * rp**3)), np.sqrt(mu / np.abs(a)**3))
+    M = m0 + mean_motion * (et - t0)
+    M = np.where(elliptic, np.mod(M + np.pi, 2 * np.pi) - np.pi, M)
+
+    # Anomaly from Kepler's equation, or from Barker's equation for parabolas
+    E = _solve_kepler(np.where(parabolic, 0.0, M), np.where(parabolic, 0.5, ecc), hyperbolic)
+    B = 1.5 * M
+    D = np.cbrt(B + np.sqrt(B**2 + 1)) + np.cbrt(B - np.sqrt(B**2 + 1)) # tan(nu / 2) for parabolas
+
+    with np.errstate(invalid='ignore'):
+        cos_nu = np.where(elliptic, (np.cos(E) - ecc) / (1 - ecc * np.cos(E)),
+                          np.where(hyperbolic, (ecc - np.cosh(E)) / (ecc * np.cosh(E) - 1), (1 - D**2) / (1 + D**2)))
+        sin_nu = np.where(elliptic, np.sqrt(np.abs(1 - ecc**2)) * np.sin(E) / (1 - ecc * np.cos(E)),
+                          np.where(hyperbolic, np.sqrt(np.abs(ecc**2 - 1)) * np.sinh(E) / (ecc * np.cosh(E) - 1), 2 * D / (1 + D**2)))
+
+    # Position and velocity in the perifocal frame, then rotated to the inertial frame
+    r = p / (1 + ecc * cos_nu)
+    v_factor = np.sqrt(mu / p)
+    states = np.empty((len(elts), 6))
+    states[:, :3] = (r * cos_nu)[:, None] * P + (r * sin_nu)[:, None] * Q
+    states[:, 3:] = (-v_factor * sin_nu)[:, None] * P + (v_factor * (ecc + cos_nu))[:, None] * Q
+
+    return states
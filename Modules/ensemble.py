@@ -0,0 +1,198 @@
+# Lucas Calderon
+# This file contains the ensemble propagator: many spacecraft states advanced together by one fixed step
+# RK4 integrator, with every right-hand side evaluated for all the members in compiled code.
+# The ensemble is split in chunks that are integrated on separate threads, the compiled loop releases the GIL.
+
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config.spacecraft import spacecraft
+from Modules.dynamics import ForceModel, build_force_model, acceleration_kernel
+from Modules.ephemeris import ephemeris_position
+from Modules.gravity import body_rotation, gravity_workspace
+from Modules.helper import sc_heigth_radii
+
+# Termination reasons of the members
+RUNNING = 0
+CRASHED = 1
+MASS_DEPLETED = 2
+
+
+# Derivatives of all the active members at one epoch
+@njit
+def acceleration_ensemble(et:float, states:np.ndarray, fm:ForceModel, drag_scale:np.ndarray, active:np.ndarray, out:np.ndarray):
+
+    """
+    Evaluates acceleration_compiled for every active member and writes the derivatives in out.
+    The positions of the third bodies and the rotation of the central body are computed once for the whole ensemble.
+
+    Inputs:
+        et: The epoch of the evaluation
+        states: The states of the members as a M*7 numpy array
+        fm: The force model of the phase
+        drag_scale: Factor on the drag of every member, M elements
+        active: Boolean mask of the members still propagating, M elements
+        out: M*7 array where the derivatives are written, inactive rows are set to zero
+    """
+
+    pos_bodies = ephemeris_position(et, fm.eph)
+    rot = body_rotation(et, fm.gravity)
+    for i in range(states.shape[0]):
+        if active[i]:
+            acceleration_kernel(et, states[i], pos_bodies, rot, fm, drag_scale[i], out[i])
+        else:
+            out[i, :] = 0.0
+
+
+# Fixed step RK4 over the whole ensemble, on the epochs t_steps. The states are stored after the steps where output is True
+@njit(nogil=True)
+def _rk4_ensemble(t_steps:np.ndarray, output:np.ndarray, states0:np.ndarray, fm:ForceModel,
+                  drag_scale:np.ndarray, h_crash:float, m_dry:float):
+
+    M = states0.shape[0]
+    n_steps = t_steps.size - 1
+    n_out = np.sum(output) + 1
+
+    # Preallocated buffers
+    y = states0.copy()
+    y_tmp = np.empty_like(y)
+    k1 = np.empty_like(y)
+    k2 = np.empty_like(y)
+    k3 = np.empty_like(y)
+    k4 = np.empty_like(y)
+    active = np.ones(M, dtype=np.bool_)
+    term_time = np.full(M, np.nan)
+    term_reason = np.zeros(M, dtype=np.int64)
+
+    t_out = np.empty(n_out)
+    states_out = np.empty((n_out, M, 7))
+    t_out[0] = t_steps[0]
+    states_out[0] = y
+    j = 1
+
+    for step in range(1, n_steps + 1):
+        t = t_steps[step - 1]
+        dt = t_steps[step] - t
+
+        acceleration_ensemble(t, y, fm, drag_scale, active, k1)
+        for i in range(M):
+            y_tmp[i] = y[i] + 0.5 * dt * k1[i]
+        acceleration_ensemble(t + 0.5 * dt, y_tmp, fm, drag_scale, active, k2)
+        for i in range(M):
+            y_tmp[i] = y[i] + 0.5 * dt * k2[i]
+        acceleration_ensemble(t + 0.5 * dt, y_tmp, fm, drag_scale, active, k3)
+        for i in range(M):
+            y_tmp[i] = y[i] + dt * k3[i]
+        acceleration_ensemble(t + dt, y_tmp, fm, drag_scale, active, k4)
+
+        # Update the active members and check their termination, the others keep their last state
+        n_active = 0
+        for i in range(M):
+            if not active[i]:
+                continue
+
+            y[i] += dt / 6 * (k1[i] + 2 * k2[i] + 2 * k3[i] + k4[i])
+
+            if sc_heigth_radii(y[i, :3], fm.R_e, fm.R_p) < h_crash:
+                active[i] = False
+                term_time[i] = t + dt
+                term_reason[i] = CRASHED
+            elif y[i, 6] <= m_dry:
+                active[i] = False
+                term_time[i] = t + dt
+                term_reason[i] = MASS_DEPLETED
+            else:
+                n_active += 1
+
+        if output[step - 1] or n_active == 0:
+            t_out[j] = t + dt
+            states_out[j] = y
+            j += 1
+
+        if n_active == 0:
+            break
+
+    return t_out[:j], states_out[:j], term_time, term_reason
+
+
+def propagate_ensemble(t_span:np.ndarray, states0:np.ndarray, dt:float=10, output_every:int=10, body:str='Earth',
+                       sc=spacecraft, drag_scale:np.ndarray=None, h_crash:float=69, m_dry:float=None, threads:int=None,
+                       t_eval:np.ndarray=None, force_model:dict=None) -> tuple:
+
+    """
+    Propagates an ensemble of spacecraft with a shared fixed step RK4 integrator.
+    The physics are the ones of acceleration_compiled. A member stops when it crashes or runs out of
+    propellant, the others keep going. Terminations are detected at the end of the step.
+
+    Inputs:
+        t_span: The time span of the simulation, in et seconds
+        states0: The initial states as a M*7 numpy array: [x, y, z, vx, vy, vz, m] * M
+        dt: The time step in seconds, adjusted down so the span is an integer number of steps
+        output_every: Store the states every this many steps
+        body: The body that the spacecraft orbit
+        sc: The spacecraft named tuple used to build the force model
+        drag_scale: (Optional) Factor on the drag of every member, M elements
+        h_crash: The height in km below which a member has crashed
+        m_dry: The mass in kg at which the propellant is depleted, by default mass0 - M_propellant
+        threads: The number of threads, by default the number of cores
+        t_eval: (Optional) The output epochs inside t_span, instead of output_every. The steps between them are
+            shortened so they land on every epoch, the end of the span is always an output
+        force_model: (Optional) Options of dynamics.build_force_model, e.g. {'perturbers': (), 'srp': False}
+
+    Returns:
+        t_out: The output epochs
+        states_out: The states of every member at the output epochs, as a n_out*M*7 numpy array
+        term_time: The epoch at which every member stopped, nan if it reached the end of the span
+        term_reason: RUNNING, CRASHED or MASS_DEPLETED for every member
+    """
+
+    states0 = np.ascontiguousarray(np.atleast_2d(states0), dtype=np.float64)
+    M = states0.shape[0]
+    drag_scale = np.ones(M) if drag_scale is None else np.ascontiguousarray(drag_scale, dtype=np.float64)
+    m_dry = sc.mass0 - sc.M_propellant if m_dry is None else m_dry
+
+    # Epochs of the steps, with the outputs every output_every steps or at the epochs of t_eval
+    if t_eval is None:
+        n_steps = max(int(np.ceil((t_span[1] - t_span[0]) / dt)), 1)
+        t_steps = np.linspace(t_span[0], t_span[1], n_steps + 1)
+        output = np.arange(1, n_steps + 1) % max(int(output_every), 1) == 0
+    else:
+        bounds = np.unique(np.concatenate((np.clip(t_eval, t_span[0], t_span[1]), t_span)))
+        segments = [np.linspace(t_a, t_b, max(int(np.ceil((t_b - t_a) / dt)), 1) + 1)[1:] for t_a, t_b in zip(bounds[:-1], bounds[1:])]
+        t_steps = np.concatenate([bounds[:1]] + segments)
+        output = np.isin(t_steps[1:], bounds)
+    output[-1] = True
+
+    fm = build_force_model(t_span, body, sc, states0=states0, **(force_model or {}))
+
+    # Split the members in chunks, one per thread, each with its own gravity work buffers
+    threads = min(threads or os.cpu_count() or 1, M)
+    chunks = np.array_split(np.arange(M), threads)
+    run_chunk = lambda idx: _rk4_ensemble(t_steps, output, states0[idx], fm._replace(gravity=gravity_workspace(fm.gravity)),
+                                          drag_scale[idx], float(h_crash), float(m_dry))
+
+    if threads == 1:
+        results = [run_chunk(chunks[0])]
+    else:
+        # Compile before starting the threads, with a single step of one member
+        _rk4_ensemble(t_steps[:2], output[:1], states0[:1], fm._replace(gravity=gravity_workspace(fm.gravity)), drag_scale[:1],
+                      float(h_crash), float(m_dry))
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(run_chunk, chunks))
+
+    # A chunk stops early if all its members terminated, its last states are repeated up to the longest output
+    t_out = max((result[0] for result in results), key=len)
+    states_out = np.empty((len(t_out), M, 7))
+    for idx, (t_chunk, states_chunk, _, _) in zip(chunks, results):
+        states_out[:len(t_chunk), idx] = states_chunk
+        states_out[len(t_chunk):, idx] = states_chunk[-1]
+    term_time = np.concatenate([result[2] for result in results])
+    term_reason = np.concatenate([result[3] for result in results])
+
+    return t_out, states_out, term_time, term_reason
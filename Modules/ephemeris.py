@@ -0,0 +1,220 @@
+# Lucas Calderon
+# This file contains the ephemeris cache for the perturbing bodies.
+# SPICE is sampled once over a time window and the positions are fitted with piecewise Chebyshev
+# polynomials, so the compiled code can evaluate them without calling CSPICE on every step.
+# Several bodies can share one table: they are fitted on the same segments and evaluated together.
+
+import sys
+import os
+from collections import namedtuple, OrderedDict
+import numpy as np
+from numba import njit
+import spiceypy as spice
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+# Named tuple with the fitted segments, numba friendly
+# coeffs has shape (n_seg, 3 * n_targets, degree + 1), segment k covers [t0 + k * seg_len, t0 + (k + 1) * seg_len]
+# and rows 3 * i to 3 * i + 2 are the position of the i-th target
+ChebEphemeris = namedtuple('ChebEphemeris', ['t0', 't1', 'seg_len', 'coeffs', 'max_error'])
+
+# Ephemerides already built in this process, reused by every phase whose window they cover, and the lookups of
+# get_ephemeris that found one (hits) or had to fit a new one (misses). At most CACHE_SIZE are kept, the least
+# recently used is dropped first, so long Monte Carlo campaigns over many epochs don't grow it without limit
+CACHE_SIZE = 32
+_cache = OrderedDict() # (targets, observer, frame, t0, t1, requested tol) -> ChebEphemeris
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+# ------------FITTING----------------
+# Targets of a table, a single body can be given as a string
+def _targets(target) -> tuple:
+    return (target,) if isinstance(target, str) else tuple(target)
+
+
+# Positions of the targets at an array of epochs, as a N*(3 * n_targets) array
+def _spice_positions(targets:tuple, observer:str, ets:np.ndarray, frame:str) -> np.ndarray:
+    return np.hstack([np.array(spice.spkezr(target, ets.tolist(), frame, 'NONE', observer)[0])[:, :3] for target in targets])
+
+
+# Fit the Chebyshev coefficients of one segment
+def _fit_segment(targets:tuple, observer:str, a:float, b:float, degree:int, frame:str) -> np.ndarray:
+
+    # Chebyshev-Gauss nodes in [-1, 1] and their epochs
+    n = degree + 1
+    k = np.arange(n)
+    x = np.cos(np.pi * (k + 0.5) / n)
+    ets = 0.5 * (b - a) * (x + 1) + a
+
+    pos = _spice_positions(targets, observer, ets, frame)
+
+    # Discrete Chebyshev transform
+    T = np.cos(np.outer(np.arange(n), np.pi * (k + 0.5) / n)) # T[j, k] = T_j(x_k)
+    coeffs = 2 / n * T @ pos # (degree + 1, 3)
+    coeffs[0] /= 2
+
+    return coeffs.T
+
+
+# Build the ephemeris of a body over a window
+def build_ephemeris(target, observer:str, t_span:np.ndarray, tol:float=1e-3, degree:int=12,
+                    seg_len:float=4 * 86400, frame:str='J2000') -> ChebEphemeris:
+
+    """
+    Samples SPICE over the time window and fits piecewise Chebyshev polynomials to the position of the target.
+    The segment length is halved until the error against direct SPICE queries is below the tolerance.
+    Below 60 s segments the halving stops, and the best fit is returned with an error above the tolerance.
+
+    Inputs:
+        target: The body whose position is fitted, or a tuple of bodies fitted in one table
+        observer: The body the position is given with respect to
+        t_span: The time window to cover, in et seconds
+        tol: The maximum allowed position error, in km
+        degree: The degree of the polynomial of each segment
+        seg_len: The initial length of the segments, in seconds
+        frame: The reference frame of the positions
+
+    Returns:
+        eph: The fitted ephemeris, with the error bound measured against SPICE in max_error (km)
+    """
+
+    targets = _targets(target)
+    t_start = min(t_span[0], t_span[-1])
+    t_end = max(t_span[0], t_span[-1])
+
+    # Empty table, for force models without third bodies
+    if not targets:
+        return ChebEphemeris(t0=float(t_start), t1=float(t_end), seg_len=float(max(t_end - t_start, 1.0)),
+                             coeffs=np.zeros((1, 0, degree + 1)), max_error=0.0)
+
+    while True:
+        n_seg = max(int(np.ceil((t_end - t_start) / seg_len)), 1)
+        coeffs = np.empty((n_seg, 3 * len(targets), degree + 1))
+        for k in range(n_seg):
+            a = t_start + k * seg_len
+            coeffs[k] = _fit_segment(targets, observer, a, a + seg_len, degree, frame)
+
+        eph = ChebEphemeris(t0=float(t_start), t1=float(t_start + n_seg * seg_len),
+                            seg_len=float(seg_len), coeffs=coeffs, max_error=0.0)
+
+        # Check against SPICE between the fitting nodes
+        ets = t_start + seg_len * (np.arange(n_seg * 2 * (degree + 1)) + 0.5) / (2 * (degree + 1))
+        error = ephemeris_error(eph, targets, observer, ets, frame)
+
+        if error <= tol or seg_len < 60:
+            return eph._replace(max_error=error)
+
+        seg_len /= 2
+
+
+# Compare the ephemeris against direct SPICE queries
+def ephemeris_error(eph:ChebEphemeris, target, observer:str, ets:np.ndarray, frame:str='J2000') -> float:
+
+    """
+    Returns the maximum position error of the ephemeris against SPICE over the given epochs, in km,
+    for the worst of its targets.
+    """
+
+    ets = np.asarray(ets, dtype=np.float64)
+    diff = ephemeris_positions(ets, eph) - _spice_positions(_targets(target), observer, ets, frame)
+    return float(np.max(np.linalg.norm(diff.reshape(len(ets), -1, 3), axis=2)))
+
+
+# Get an ephemeris covering the window, reusing one already built if possible
+def get_ephemeris(target, observer:str, t_span:np.ndarray, tol:float=1e-3, frame:str='J2000',
+                  pad:float=86400) -> ChebEphemeris:
+
+    """
+    Returns an ephemeris that covers t_span with an error below tol, or the best fit build_ephemeris
+    reaches when tol can't be reached. Such a fit is reused for any tol at least as loose as the one it
+    was built for, since fitting again would give the same table.
+    The last CACHE_SIZE ephemerides used are kept, so phases and runs that share the epoch window
+    fit SPICE only once. New windows are padded and aligned to whole days so neighbouring
+    phases fall inside the same fit.
+
+    Inputs:
+        target: The body whose position is needed, or a tuple of bodies that share one table
+        observer: The body the position is given with respect to
+        t_span: The time window to cover, in et seconds
+        tol: The maximum allowed position error, in km
+        frame: The reference frame of the positions
+        pad: The window is extended by this many seconds on each side when a new fit is needed
+
+    Returns:
+        eph: The cached or newly fitted ephemeris
+    """
+
+    t_start = min(t_span[0], t_span[-1])
+    t_end = max(t_span[0], t_span[-1])
+
+    key = (tuple(name.upper() for name in _targets(target)), observer.upper(), frame)
+    for entry, eph in _cache.items():
+        if entry[:3] == key and eph.t0 <= t_start and t_end <= eph.t1 and (eph.max_error <= tol or entry[5] <= tol):
+            _cache.move_to_end(entry)
+            _cache_stats['hits'] += 1
+            return eph
+
+    _cache_stats['misses'] += 1
+    window = np.array([np.floor((t_start - pad) / 86400) * 86400, np.ceil((t_end + pad) / 86400) * 86400])
+    eph = build_ephemeris(target, observer, window, tol=tol, frame=frame)
+    _cache[key + (eph.t0, eph.t1, tol)] = eph
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return eph
+
+
+# Hits and misses of the cache of get_ephemeris and the number of ephemerides kept
+def cache_stats() -> dict:
+    return {'hits': _cache_stats['hits'], 'misses': _cache_stats['misses'], 'size': len(_cache)}
+
+
+# Save and load fitted ephemerides, so separate runs don't fit them again
+def save_ephemeris(path:str, eph:ChebEphemeris):
+    np.savez(path, t0=eph.t0, t1=eph.t1, seg_len=eph.seg_len, coeffs=eph.coeffs, max_error=eph.max_error)
+
+
+def load_ephemeris(path:str) -> ChebEphemeris:
+    data = np.load(path)
+    return ChebEphemeris(t0=float(data['t0']), t1=float(data['t1']), seg_len=float(data['seg_len']),
+                         coeffs=data['coeffs'], max_error=float(data['max_error']))
+
+
+# ------------EVALUATION (NUMBA COMPATIBLE)----------------
+# Position of the bodies at one epoch, Clenshaw recurrence on the segment that contains it.
+# Returns 3 * n_targets elements, the positions of the targets one after the other
+@njit
+def ephemeris_position(et:float, eph:ChebEphemeris) -> np.array:
+    n_seg = eph.coeffs.shape[0]
+    n_rows = eph.coeffs.shape[1]
+    n = eph.coeffs.shape[2]
+
+    k = int((et - eph.t0) / eph.seg_len)
+    if k < 0:
+        k = 0
+    elif k > n_seg - 1:
+        k = n_seg - 1
+
+    x = 2 * (et - eph.t0 - k * eph.seg_len) / eph.seg_len - 1
+
+    pos = np.empty(n_rows)
+    for j in range(n_rows):
+        b1 = 0.0
+        b2 = 0.0
+        for i in range(n - 1, 0, -1):
+            b1, b2 = 2 * x * b1 - b2 + eph.coeffs[k, j, i], b1
+        pos[j] = x * b1 - b2 + eph.coeffs[k, j, 0]
+
+    return pos
+
+
+# Positions at an array of epochs
+@njit
+def ephemeris_positions(ets:np.ndarray, eph:ChebEphemeris) -> np.ndarray:
+    pos = np.empty((len(ets), eph.coeffs.shape[1]))
+    for i in range(len(ets)):
+        pos[i] = ephemeris_position(ets[i], eph)
+
+    return pos
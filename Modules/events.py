@@ -0,0 +1,199 @@
+# Lucas Calderon
+# This file contains the event library of the compiled engines: crash, apsis passages, atmosphere entry and exit,
+# SOI exit, altitude thresholds, mass depletion, eclipses and the switches of the thrust of the steering laws. An event set lists the event functions of a phase, they are
+# evaluated together inside the engines, which bracket their sign changes every step and polish the roots on the
+# interpolant of the step. The events found are returned as a numpy structured array.
+
+import sys
+import os
+from collections import namedtuple
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Config.spacecraft import spacecraft
+from Modules.helper import sc_heigth_radii
+from Modules.ephemeris import ChebEphemeris, get_ephemeris, ephemeris_position
+from Modules.srp import shadow_angles
+from Modules.steering import SteeringLaw, ALWAYS, cos_true_anomaly
+
+# Kinds of events
+CRASH = 0
+PERIAPSIS = 1
+APOAPSIS = 2
+ATMOS_ENTRY = 3
+ATMOS_EXIT = 4
+SOI_EXIT = 5
+ALTITUDE = 6
+MASS_DEPLETED = 7
+ECLIPSE_ENTRY = 8
+ECLIPSE_EXIT = 9
+UMBRA_ENTRY = 10
+UMBRA_EXIT = 11
+THROTTLE_SWITCH = 12
+DUTY_SWITCH = 13
+EVENT_NAMES = {CRASH: 'crash', PERIAPSIS: 'periapsis', APOAPSIS: 'apoapsis', ATMOS_ENTRY: 'atmosphere entry',
+               ATMOS_EXIT: 'atmosphere exit', SOI_EXIT: 'SOI exit', ALTITUDE: 'altitude', MASS_DEPLETED: 'mass depleted',
+               ECLIPSE_ENTRY: 'eclipse entry', ECLIPSE_EXIT: 'eclipse exit', UMBRA_ENTRY: 'umbra entry', UMBRA_EXIT: 'umbra exit',
+               THROTTLE_SWITCH: 'throttle switch', DUTY_SWITCH: 'duty switch'}
+
+# Event functions of a phase, one element per event:
+#   kind: The kind of event, it sets the function: height - value, r . v (apsides), |r| - value (SOI), m - value,
+#       the apparent separation of the Sun and the body minus the one at the edge of the penumbra or of the umbra,
+#       t - value (throttle schedule) or cos(true anomaly) - value (duty cycle)
+#   value: The threshold of the event
+#   terminal: True if the event stops the propagation
+#   direction: 1 if the function must increase through zero, -1 if it must decrease, 0 for both
+#   restart: True if the adaptive engine must end its step at the event, for the kinks and the jumps of the
+#       acceleration (eclipses, switches of the thrust)
+#   R_e, R_p: Equatorial and polar radii of the body, for the heights
+#   mu: Gravitational parameter of the body, for the true anomaly
+#   sun: Ephemeris of the Sun wrt the body for the eclipses, an empty table without them
+EventSet = namedtuple('EventSet', ['kind', 'value', 'terminal', 'direction', 'restart', 'R_e', 'R_p', 'mu', 'sun'])
+
+# Events found by the engines
+EVENT_DTYPE = np.dtype([('t', 'f8'), ('kind', 'i8'), ('value', 'f8'), ('state', 'f8', (7,))])
+
+
+# ------------EVENT SETS----------------
+def phase_event_set(body:str='Earth', sc=spacecraft, h_crash:float=69.0, h_atmos:float=745.0,
+                    altitudes:tuple=(), m_dry:float=None, t_span:np.ndarray=None, eph_tol:float=1e-3,
+                    steering:SteeringLaw=None) -> EventSet:
+
+    """
+    Builds the events of a phase: crash, periapsis, apoapsis, atmosphere entry and exit (if the body has an atmosphere),
+    SOI exit, mass depletion (if the spacecraft thrusts), crossings of the given altitudes and, if the time span is
+    given, the entries and exits of the penumbra and the umbra, and the switches of the thrust of a steering law.
+    The crash, the SOI exit and the mass depletion are terminal, the adaptive engines end their steps at the eclipse
+    boundaries and at the switches.
+
+    Inputs:
+        body: The body that the spacecraft is orbiting
+        sc: The spacecraft named tuple, for the dry mass
+        h_crash: The height in km at which the spacecraft has crashed
+        h_atmos: The height in km of the top of the atmosphere
+        altitudes: Heights in km whose crossings are reported, in both directions
+        m_dry: The mass in kg at which the propellant is depleted, by default mass0 - M_propellant
+        t_span: (Optional) The time span of the phase, needed for the ephemeris of the Sun of the eclipse events
+        eph_tol: The maximum position error of the ephemeris of the Sun, in km
+        steering: (Optional) The SteeringLaw of the phase, its throttle schedule and duty cycle switch the thrust
+
+    Returns:
+        event_set: The EventSet named tuple
+    """
+
+    body_data = getattr(bd, body)
+    events = [(CRASH, h_crash, True, -1.0), (PERIAPSIS, 0.0, False, 1.0), (APOAPSIS, 0.0, False, -1.0)]
+    if body_data.atmos:
+        events += [(ATMOS_ENTRY, h_atmos, False, -1.0), (ATMOS_EXIT, h_atmos, False, 1.0)]
+    events.append((SOI_EXIT, body_data.SOI, True, 1.0))
+    if sc.thrust is not None:
+        events.append((MASS_DEPLETED, sc.mass0 - sc.M_propellant if m_dry is None else m_dry, True, -1.0))
+    events += [(ALTITUDE, h, False, 0.0) for h in altitudes]
+    if steering is not None:
+        events += [(THROTTLE_SWITCH, t, False, 0.0) for t in steering.times]
+        if steering.duty != ALWAYS:
+            events.append((DUTY_SWITCH, steering.duty * steering.duty_cos, False, 0.0))
+
+    # The Sun is fitted over the phase only if the eclipses are needed
+    if t_span is not None:
+        events += [(ECLIPSE_ENTRY, 0.0, False, -1.0), (ECLIPSE_EXIT, 0.0, False, 1.0),
+                   (UMBRA_ENTRY, 0.0, False, -1.0), (UMBRA_EXIT, 0.0, False, 1.0)]
+        sun = get_ephemeris('SUN', body, t_span, tol=eph_tol)
+    else:
+        sun = get_ephemeris((), body, np.zeros(2))
+
+    kind, value, terminal, direction = zip(*events)
+    kind = np.array(kind, dtype=np.int64)
+
+    return EventSet(kind=kind, value=np.array(value, dtype=np.float64),
+                    terminal=np.array(terminal, dtype=np.bool_), direction=np.array(direction, dtype=np.float64),
+                    restart=kind >= ECLIPSE_ENTRY, R_e=float(body_data.radius_equator), R_p=float(body_data.radius_polar),
+                    mu=float(body_data.gravitational_parameter), sun=sun)
+
+
+# ------------EVALUATION (NUMBA COMPATIBLE)----------------
+# Values of all the event functions at the epoch t and state [x, y, z, vx, vy, vz, m]
+@njit
+def evaluate_events(t:float, state:np.ndarray, event_set:EventSet, out:np.ndarray):
+    h = sc_heigth_radii(state[:3], event_set.R_e, event_set.R_p)
+
+    # Apparent radii of the Sun and the body and their separation, for the eclipses
+    a = 0.0
+    b = 0.0
+    c = 0.0
+    if event_set.sun.coeffs.shape[1] > 0:
+        sun = ephemeris_position(t, event_set.sun)
+        a, b, c = shadow_angles(state[0], state[1], state[2], sun[0], sun[1], sun[2], event_set.R_e)
+
+    for i in range(event_set.kind.size):
+        kind = event_set.kind[i]
+        if kind == PERIAPSIS or kind == APOAPSIS:
+            out[i] = state[0] * state[3] + state[1] * state[4] + state[2] * state[5]
+        elif kind == SOI_EXIT:
+            out[i] = np.sqrt(state[0]**2 + state[1]**2 + state[2]**2) - event_set.value[i]
+        elif kind == MASS_DEPLETED:
+            out[i] = state[6] - event_set.value[i]
+        elif kind == ECLIPSE_ENTRY or kind == ECLIPSE_EXIT:
+            out[i] = c - (a + b)
+        elif kind == UMBRA_ENTRY or kind == UMBRA_EXIT:
+            out[i] = c - (b - a)
+        elif kind == THROTTLE_SWITCH:
+            out[i] = t - event_set.value[i]
+        elif kind == DUTY_SWITCH:
+            out[i] = cos_true_anomaly(state, event_set.mu) - event_set.value[i]
+        else:
+            out[i] = h - event_set.value[i]
+
+
+# Events function of the engines, args = (fm, event_set)
+@njit
+def phase_events(t:float, y:np.ndarray, args, out:np.ndarray):
+    evaluate_events(t, y, args[1], out)
+
+
+# ------------RESULTS----------------
+def make_event_array(event_t:np.ndarray, event_idx:np.ndarray, event_states:np.ndarray, event_set:EventSet) -> np.ndarray:
+
+    """
+    Packs the events found by an engine in a structured array with the fields t, kind, value and state.
+    """
+
+    events = np.empty(len(event_t), dtype=EVENT_DTYPE)
+    events['t'] = event_t
+    events['kind'] = event_set.kind[event_idx]
+    events['value'] = event_set.value[event_idx]
+    events['state'] = event_states[:, :7] # Without the intake components
+
+    return events
+
+
+# States at the events of some kinds, e.g. the apsides for Results.visualization.plot_matplotlib
+def event_states(events:np.ndarray, kinds=(PERIAPSIS, APOAPSIS)) -> np.ndarray:
+    return events['state'][np.isin(events['kind'], kinds)]
+
+
+# Event functions for solve_ivp, one python callable per event. solve_ivp calls them all at the same (t, y),
+# so the set is evaluated once and the values are kept for the other events
+def scipy_events(event_set:EventSet) -> list:
+    out = np.empty(event_set.kind.size)
+    last = {'t': None, 'y': None}
+
+    def values(t, y):
+        if t != last['t'] or not np.array_equal(y, last['y']):
+            evaluate_events(t, y, event_set, out)
+            last['t'], last['y'] = t, np.array(y)
+        return out
+
+    funcs = []
+    for i in range(event_set.kind.size):
+        def func(t, y, i=i):
+            return values(t, y)[i]
+        func.terminal = bool(event_set.terminal[i])
+        func.direction = float(event_set.direction[i])
+        funcs.append(func)
+
+    return funcs
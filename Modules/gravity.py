@@ -0,0 +1,267 @@
+# Lucas Calderon
+# This file contains the spherical harmonic gravity field of the bodies, up to any degree and order.
+# The acceleration uses the normalised Pines formulation, which has no singularity at the poles. The Legendre
+# recursion coefficients are computed once when the field is built and the recursion runs in work buffers stored
+# in the field, so an evaluation doesn't allocate. The coefficients are read from EGM style files in Data/Gravity.
+
+import sys
+import os
+from collections import namedtuple
+import numpy as np
+from numba import njit
+import spiceypy as spice
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+
+# Directory of the coefficient files
+GRAVITY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Data', 'Gravity'))
+
+# Gravity field of a body, built once per phase by build_gravity_field
+#   mu, R: Gravitational parameter and reference radius
+#   n_max, m_max: Degree and order of the field
+#   coef: 6*(n_max + 2)*(n_max + 2) array with the fully normalised coefficients C and S, the coefficients xi and eta
+#       of the normalised Legendre recursion (with the diagonal and subdiagonal ones in xi) and the normalisation
+#       factors f3 and f4 of the derived functions
+#   r_cut: Degree n is only evaluated below the radius r_cut[n], inf for all of them without adaptive truncation
+#   rot0, omega, et0: Rotation from J2000 to the body fixed frame at et0 and rotation rate of the body
+#   work: (n_max + 4)*(n_max + 2) work buffer, the Legendre functions and the powers of s + i t in its last two rows
+# The arrays are packed in a few blocks because numba counts the references of every array of a named tuple on each call
+GravityField = namedtuple('GravityField', ['mu', 'R', 'n_max', 'm_max', 'coef', 'r_cut', 'rot0', 'omega', 'et0', 'work'])
+
+# Blocks of coef
+C_IDX = 0
+S_IDX = 1
+XI_IDX = 2
+ETA_IDX = 3
+F3_IDX = 4
+F4_IDX = 5
+
+
+# ------------COEFFICIENTS----------------
+def load_coefficients(path:str, n_max:int, m_max:int) -> tuple:
+
+    """
+    Reads the normalised coefficients of an EGM style file, one row per coefficient: n m C S [sigma_C sigma_S].
+    Lines starting with # are comments and Fortran D exponents are accepted.
+
+    Inputs:
+        path: The coefficient file
+        n_max, m_max: The degree and order to read
+
+    Returns:
+        C, S: The coefficients as (n_max + 1)*(n_max + 1) numpy arrays, zero above the order m_max
+    """
+
+    with open(path) as file:
+        rows = [line.replace('D', 'E').replace('d', 'e').split() for line in file if line.strip() and not line.startswith('#')]
+
+    C = np.zeros((n_max + 1, n_max + 1))
+    S = np.zeros((n_max + 1, n_max + 1))
+    found = 0
+    for row in rows:
+        n, m = int(row[0]), int(row[1])
+        if n <= n_max and m <= m_max:
+            C[n, m] = float(row[2])
+            S[n, m] = float(row[3])
+            found = max(found, n)
+
+    if found < n_max:
+        raise ValueError(f"{os.path.basename(path)} only goes up to degree {found}, not {n_max}")
+
+    return C, S
+
+
+# Coefficients of the recursion of the normalised derived Legendre functions A_nm(u) = N_nm d^m P_n(u) / du^m,
+# written in the blocks of coef
+def _recursion_coefficients(n_max:int, coef:np.ndarray):
+    for n in range(2, n_max + 2):
+        coef[XI_IDX, n, n] = np.sqrt((2 * n + 1) / (2 * n)) # Diagonal, from A_n-1,n-1
+        coef[XI_IDX, n, n - 1] = np.sqrt(2 * n) # Subdiagonal, from u A_nn
+        for m in range(n - 1):
+            coef[XI_IDX, n, m] = np.sqrt((2 * n - 1) * (2 * n + 1) / ((n - m) * (n + m)))
+            coef[ETA_IDX, n, m] = np.sqrt((2 * n + 1) * (n + m - 1) * (n - m - 1) / ((2 * n - 3) * (n + m) * (n - m)))
+
+    # A_n,m+1 and A_n+1,m+1 against the normalisation of C_nm
+    for n in range(n_max + 1):
+        for m in range(n + 1):
+            k = 0.5 if m == 0 else 1.0
+            coef[F3_IDX, n, m] = np.sqrt(k * (n - m) * (n + m + 1))
+            coef[F4_IDX, n, m] = np.sqrt(k * (2 * n + 1) / (2 * n + 3) * (n + m + 1) * (n + m + 2))
+
+
+def build_gravity_field(body:str, et0:float, degree:int=None, order:int=None, tol:float=0.0) -> GravityField:
+
+    """
+    Builds the gravity field of a body for a phase. Bodies without a coefficient file get the zonal field of their J2.
+
+    Inputs:
+        body: The celestial body
+        et0: The epoch at which the body fixed frame is read from the SPICE PCK, the body then rotates at a
+            constant rate about its pole
+        degree, order: The degree and order of the field, by default the ones of bodies_data
+        tol: Adaptive truncation, a degree is skipped where its acceleration is estimated below tol times the
+            point mass acceleration. 0 always evaluates the full degree
+
+    Returns:
+        field: The GravityField named tuple
+    """
+
+    body_data = getattr(bd, body)
+    n_max = body_data.gravity_degree if degree is None else degree
+    m_max = min(body_data.gravity_order if order is None else order, n_max)
+
+    if body_data.gravity_file is not None:
+        C, S = load_coefficients(os.path.join(GRAVITY_DIR, body_data.gravity_file), n_max, m_max)
+    else:
+        C = np.zeros((n_max + 1, n_max + 1))
+        S = np.zeros((n_max + 1, n_max + 1))
+        if n_max >= 2:
+            C[2, 0] = -body_data.J2 / np.sqrt(5)
+
+    # Radius below which every degree is needed, from the size of the degree's acceleration (n + 1) (R / r)^n |C_n|
+    r_cut = np.full(n_max + 1, np.inf)
+    if tol > 0:
+        for n in range(2, n_max + 1):
+            amplitude = (n + 1) * np.sqrt(np.sum(C[n]**2 + S[n]**2))
+            r_cut[n] = body_data.radius_equator * (amplitude / tol)**(1 / n)
+
+    coef = np.zeros((6, n_max + 2, n_max + 2))
+    coef[C_IDX, :n_max + 1, :n_max + 1] = C
+    coef[S_IDX, :n_max + 1, :n_max + 1] = S
+    _recursion_coefficients(n_max, coef)
+
+    field = GravityField(
+        mu=float(body_data.gravitational_parameter),
+        R=float(body_data.radius_equator),
+        n_max=int(n_max),
+        m_max=int(m_max),
+        coef=coef,
+        r_cut=r_cut,
+        rot0=np.ascontiguousarray(spice.pxform('J2000', 'IAU_' + body.upper(), et0)),
+        omega=2 * np.pi / body_data.day,
+        et0=float(et0),
+        work=np.zeros((n_max + 4, n_max + 2)),
+    )
+
+    return field
+
+
+# Same field with its own work buffers, for evaluations on several threads
+def gravity_workspace(field:GravityField) -> GravityField:
+    return field._replace(work=np.zeros_like(field.work))
+
+
+# ------------ACCELERATION (NUMBA COMPATIBLE)----------------
+# Rotation from J2000 to the body fixed frame, computed once per epoch and shared by all the states at that epoch.
+# A zonal field is symmetric about the pole, so it only needs the frame at et0
+@njit
+def body_rotation(et:float, field:GravityField) -> np.ndarray:
+    if field.m_max == 0:
+        return field.rot0
+    theta = field.omega * (et - field.et0)
+    c = np.cos(theta)
+    s = np.sin(theta)
+    rot = np.empty((3, 3))
+    for j in range(3):
+        rot[0, j] = c * field.rot0[0, j] + s * field.rot0[1, j]
+        rot[1, j] = -s * field.rot0[0, j] + c * field.rot0[1, j]
+        rot[2, j] = field.rot0[2, j]
+
+    return rot
+
+
+@njit
+def gravity_acceleration(position:np.ndarray, rot:np.ndarray, field:GravityField) -> tuple:
+
+    """
+    Acceleration of the field without its point mass term, with the normalised Pines recursion.
+
+    Inputs:
+        position: The position in J2000 wrt the body, in km
+        rot: The rotation from J2000 to the body fixed frame, from body_rotation
+        field: The gravity field
+
+    Returns:
+        ax, ay, az: The acceleration in J2000, in km/s^2
+    """
+
+    # Body fixed position and direction cosines
+    x = rot[0, 0] * position[0] + rot[0, 1] * position[1] + rot[0, 2] * position[2]
+    y = rot[1, 0] * position[0] + rot[1, 1] * position[1] + rot[1, 2] * position[2]
+    z = rot[2, 0] * position[0] + rot[2, 1] * position[1] + rot[2, 2] * position[2]
+    r = np.sqrt(x**2 + y**2 + z**2)
+    inv_r = 1 / r
+    s = x * inv_r
+    t = y * inv_r
+    u = z * inv_r
+
+    # Degree and order evaluated at this radius
+    N = field.n_max
+    while N >= 2 and r > field.r_cut[N]:
+        N -= 1
+    if N < 2:
+        return 0.0, 0.0, 0.0
+    M = min(field.m_max, N)
+
+    # Blocks of the field, indexed directly since slicing them would count references too
+    coef = field.coef
+    A = field.work
+    RM = N + 2 # Rows of the powers of s + i t
+    IM = N + 3
+
+    # Normalised derived Legendre functions, up to degree N + 1 and order M + 1
+    A[0, 0] = 1.0
+    A[1, 0] = np.sqrt(3.0) * u
+    A[1, 1] = np.sqrt(3.0)
+    for n in range(2, N + 2):
+        A[n, n] = coef[XI_IDX, n, n] * A[n - 1, n - 1]
+        A[n, n - 1] = coef[XI_IDX, n, n - 1] * u * A[n, n]
+        for m in range(min(n - 2, M + 1) + 1):
+            A[n, m] = coef[XI_IDX, n, m] * u * A[n - 1, m] - coef[ETA_IDX, n, m] * A[n - 2, m]
+
+    # Real and imaginary parts of (s + i t)^m
+    A[RM, 0] = 1.0
+    A[IM, 0] = 0.0
+    for m in range(1, M + 1):
+        A[RM, m] = s * A[RM, m - 1] - t * A[IM, m - 1]
+        A[IM, m] = s * A[IM, m - 1] + t * A[RM, m - 1]
+
+    # Sums over the degrees, rho = mu / r^2 (R / r)^n
+    ratio = field.R * inv_r
+    rho = field.mu * inv_r**2 * ratio
+    a1 = 0.0
+    a2 = 0.0
+    a3 = 0.0
+    a4 = 0.0
+    for n in range(2, N + 1):
+        rho *= ratio
+        s1 = 0.0
+        s2 = 0.0
+        s3 = 0.0
+        s4 = 0.0
+        for m in range(min(n, M) + 1):
+            C = coef[C_IDX, n, m]
+            S = coef[S_IDX, n, m]
+            D = C * A[RM, m] + S * A[IM, m]
+            if m > 0:
+                s1 += m * A[n, m] * (C * A[RM, m - 1] + S * A[IM, m - 1])
+                s2 += m * A[n, m] * (S * A[RM, m - 1] - C * A[IM, m - 1])
+            s3 += coef[F3_IDX, n, m] * A[n, m + 1] * D
+            s4 += coef[F4_IDX, n, m] * A[n + 1, m + 1] * D
+        a1 += rho * s1
+        a2 += rho * s2
+        a3 += rho * s3
+        a4 -= rho * s4
+
+    # Back to J2000
+    gx = a1 + s * a4
+    gy = a2 + t * a4
+    gz = a3 + u * a4
+    ax = rot[0, 0] * gx + rot[1, 0] * gy + rot[2, 0] * gz
+    ay = rot[0, 1] * gx + rot[1, 1] * gy + rot[2, 1] * gz
+    az = rot[0, 2] * gx + rot[1, 2] * gy + rot[2, 2] * gz
+
+    return ax, ay, az
@@ -12,6 +12,26 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from Config import bodies_data as bd
 
+# Project root and default SPICE meta kernel, whose paths are relative to the root
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+META_KERNEL = os.path.join(ROOT, 'Data', 'Spice', 'Solar_sytem_kernel.tm')
+
+
+# ------------FUNCTION TO LOAD THE SPICE KERNELS----------------
+def load_kernels(meta_kernel:str=META_KERNEL):
+
+    """
+    Furnishes the SPICE meta kernel from any working directory.
+    The kernel paths inside the meta kernel are relative to the project root.
+    """
+
+    cwd = os.getcwd()
+    try:
+        os.chdir(ROOT)
+        spice.furnsh(meta_kernel)
+    finally:
+        os.chdir(cwd)
+
 
 # ------------FUNCTION TO CALCULATE THE HEIGHT OF THE SPACECRAFT----------------
 @njit
@@ -41,6 +61,7 @@ def sc_heigth(pos, body='Earth'):
 
 
 # ------------FUNCTIONS TO CONVERT BETWEEN COES AND STATE----------------
+# These call SPICE one row at a time, Modules/elements.py has batched versions that don't need SPICE
 # Function to obtain the spacecraft's state the classical orbital elements
 def coes_to_states(elts, et):
 
@@ -101,6 +122,14 @@ def linear_interp(x, xp, fp):
     return 0.0  # Out of range
 
 
+# Height over an oblate body with the radii given explicitly, same model as sc_heigth
+@njit
+def sc_heigth_radii(pos, r_equator, r_polar):
+    theta = np.arctan(pos[2] / np.sqrt(pos[0] **2 + pos[1] **2 + 1e-10))
+    r_local = r_equator - abs(theta) / (2*np.pi) * (r_equator - r_polar)
+    return np.sqrt(pos[0]**2 + pos[1]**2 + pos[2]**2) - r_local
+
+
 # Function to calculate the norm of a vector
 @njit
 def norm(vector):
@@ -0,0 +1,84 @@
+# Lucas Calderon
+# This file contains the intake of an air-breathing spacecraft: the mass of air and the number of particles of
+# every species that it captures. They are extra components of the state after the 7 of the spacecraft, so the
+# compiled engines integrate them with the trajectory, at its accuracy and without storing anything per step:
+#   [x, y, z, vx, vy, vz, m, m_air, n_O, n_N2, n_O2, n_He, n_Ar, n_H, n_N]
+# The captured mass in kg and the particles as numbers of molecules.
+
+import sys
+import os
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Modules.atmos import AtmosTable, SPECIES, species_interp
+
+# Index of the captured mass in the state, the species follow it
+INTAKE_IDX = 7
+INTAKE_SIZE = 1 + len(SPECIES)
+
+
+# ------------CAPTURE (NUMBA COMPATIBLE)----------------
+# Volume of air swept by the intake every second in m^3/s, A_eff = eff_in * A_intake in m^2.
+# The air moves with the rotating atmosphere, as in the drag
+@njit
+def intake_flux(position:np.ndarray, velocity:np.ndarray, omega:float, A_eff:float) -> float:
+    if np.sqrt(position[0]**2 + position[1]**2) <= 10:
+        v_x = velocity[0]
+        v_y = velocity[1]
+    else:
+        v_x = velocity[0] + omega * position[1]
+        v_y = velocity[1] - omega * position[0]
+
+    return A_eff * np.sqrt(v_x**2 + v_y**2 + velocity[2]**2) * 1000 # The velocity is in km/s
+
+
+@njit
+def intake_rates(h:float, m_in:float, flux:float, table:AtmosTable, log_n:np.ndarray, state_dot:np.ndarray):
+
+    """
+    Writes the captured mass flow and the captured particles per second in the intake components of state_dot.
+
+    Inputs:
+        h: The height of the spacecraft, in km
+        m_in: The captured mass flow, the density times the flux, in kg/s
+        flux: The volume swept by the intake, from intake_flux, in m^3/s. It is multiplied by the same density
+            scale as m_in
+        table: The air table, whose heights are the ones of log_n
+        log_n: The logarithms of the number densities of SPECIES, from atmos.get_species_log
+        state_dot: The derivative of the state, with at least INTAKE_IDX + INTAKE_SIZE components
+    """
+
+    state_dot[INTAKE_IDX] = m_in
+    species_interp(h, table, log_n, flux, state_dot, INTAKE_IDX + 1)
+
+
+# ------------STATES AND RESULTS----------------
+# State or states with the intake components, which start at 0
+def intake_state(state0:np.ndarray) -> np.ndarray:
+    state0 = np.asarray(state0, dtype=np.float64)
+    return np.concatenate((state0[..., :INTAKE_IDX], np.zeros(state0.shape[:-1] + (INTAKE_SIZE,))), axis=-1)
+
+
+def flows_hist(state_hist:np.ndarray, name:str='') -> dict:
+
+    """
+    Flows captured along a propagation, in the format of Results.visualization.plot_atmos_data.
+
+    Inputs:
+        state_hist: The history of the states with the intake components, as a N*(7 + INTAKE_SIZE) numpy array
+        name: The name of the spacecraft
+
+    Returns:
+        flows: Dictionary with the name, the air mass captured during every step in kg ('air_mass') and the
+            particles of every species captured during every step, so their sums are the totals
+    """
+
+    captured = np.diff(state_hist[:, INTAKE_IDX:INTAKE_IDX + INTAKE_SIZE], axis=0, prepend=state_hist[:1, INTAKE_IDX:INTAKE_IDX + INTAKE_SIZE])
+    flows = {'name': name, 'air_mass': captured[:, 0]}
+    for j, species in enumerate(SPECIES):
+        flows[species] = captured[:, 1 + j]
+
+    return flows
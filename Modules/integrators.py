@@ -0,0 +1,437 @@
+# Lucas Calderon
+# This file contains the adaptive integrators that run entirely in compiled code.
+# The right-hand side and the events are compiled functions passed as arguments, rhs(t, y, args, out) and
+# events(t, y, args, out), so the same engine propagates the spacecraft state or any augmented state.
+
+import sys
+import os
+import numpy as np
+from numba import njit
+from scipy.integrate._ivp import dop853_coefficients as DOP853
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# ------------DOP853 COEFFICIENTS----------------
+# Dormand-Prince 8(5,3) tableau, the same one scipy uses, with the 3 extra stages of the dense output
+N_STAGES = DOP853.N_STAGES
+A = np.ascontiguousarray(DOP853.A)
+B = np.ascontiguousarray(DOP853.B)
+C = np.ascontiguousarray(DOP853.C)
+E3 = np.ascontiguousarray(DOP853.E3)
+E5 = np.ascontiguousarray(DOP853.E5)
+D = np.ascontiguousarray(DOP853.D)
+
+# Step size control, same constants as scipy
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+ERROR_EXPONENT = -1 / 8
+
+# Status of the integration
+FINISHED = 0
+TERMINATED = 1
+STEP_TOO_SMALL = -1
+
+
+# Raise if the step size collapsed, the history then stops short of t1 at t
+def check_status(status:int, t:float):
+    if status == STEP_TOO_SMALL:
+        raise ValueError(f"The step size of DOP853 fell below the round-off of t at t = {t:.6f}, the history is incomplete")
+
+
+# Default events function when there are no events
+@njit
+def no_events(t, y, args, out):
+    pass
+
+
+# ------------HELPERS----------------
+# Root mean square norm used by the error control
+@njit
+def _rms_norm(x):
+    return np.sqrt(np.sum(x**2) / x.size)
+
+
+# Double the rows of a history buffer when it is full
+@njit
+def _grow(arr, n):
+    if n < arr.shape[0]:
+        return arr
+    new = np.empty((2 * arr.shape[0],) + arr.shape[1:])
+    new[:n] = arr[:n]
+    return new
+
+
+# Initial step, same algorithm as scipy's select_initial_step, on the first m components
+@njit
+def _initial_step(rhs, t0, y0, f0, args, direction, rtol, atol, t_bound, buffer, m):
+    scale = atol + np.abs(y0[:m]) * rtol
+    d0 = _rms_norm(y0[:m] / scale)
+    d1 = _rms_norm(f0[:m] / scale)
+    h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+    h0 = min(h0, abs(t_bound - t0))
+
+    rhs(t0 + direction * h0, y0 + direction * h0 * f0, args, buffer)
+    d2 = _rms_norm((buffer[:m] - f0[:m]) / scale) / h0
+    if d1 <= 1e-15 and d2 <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / 8)
+
+    return min(100 * h0, h1, abs(t_bound - t0))
+
+
+# One DOP853 step from t, y with K[0] = f(t, y). Writes the new state in y_new and f(t + h, y_new) in K[N_STAGES]
+@njit
+def _dop853_step(rhs, t, y, h, args, K, y_tmp, y_new):
+    for s in range(1, N_STAGES):
+        y_tmp[:] = y
+        for j in range(s):
+            y_tmp += h * A[s, j] * K[j]
+        rhs(t + C[s] * h, y_tmp, args, K[s])
+
+    y_new[:] = y
+    for j in range(N_STAGES):
+        y_new += h * B[j] * K[j]
+    rhs(t + h, y_new, args, K[N_STAGES])
+
+
+# Error norm of the embedded 5th and 3rd order estimates, on the components of scale
+@njit
+def _error_norm(K, h, scale):
+    m = scale.size
+    err5 = np.zeros(m)
+    err3 = np.zeros(m)
+    for j in range(N_STAGES + 1):
+        err5 += E5[j] * K[j, :m]
+        err3 += E3[j] * K[j, :m]
+    err5_2 = np.sum((err5 / scale)**2)
+    err3_2 = np.sum((err3 / scale)**2)
+    if err5_2 == 0 and err3_2 == 0:
+        return 0.0
+
+    return abs(h) * err5_2 / np.sqrt((err5_2 + 0.01 * err3_2) * scale.size)
+
+
+# Coefficients of the 7th order interpolant of the last step, uses 3 extra evaluations of the rhs
+@njit
+def _dense_coefficients(rhs, t_old, y_old, y_new, h, args, K, y_tmp, F):
+    for s in range(N_STAGES + 1, K.shape[0]):
+        y_tmp[:] = y_old
+        for j in range(s):
+            y_tmp += h * A[s, j] * K[j]
+        rhs(t_old + C[s] * h, y_tmp, args, K[s])
+
+    F[0] = y_new - y_old
+    F[1] = h * K[0] - F[0]
+    F[2] = 2 * F[0] - h * (K[N_STAGES] + K[0])
+    for i in range(D.shape[0]):
+        F[3 + i] = 0.0
+        for j in range(K.shape[0]):
+            F[3 + i] += h * D[i, j] * K[j]
+
+
+# Cubic Hermite interpolant of a step in the same form, for the fixed step engines
+@njit
+def hermite_coefficients(y_old, f_old, y_new, f_new, h, F):
+    F[:] = 0.0
+    F[0] = y_new - y_old
+    F[1] = h * f_old - F[0]
+    F[2] = 2 * F[0] - h * (f_new + f_old)
+
+
+# Evaluate the interpolant of the last step at t
+@njit
+def dense_eval(t, t_old, h, y_old, F, out):
+    x = (t - t_old) / h
+    out[:] = 0.0
+    for i in range(F.shape[0]):
+        out += F[F.shape[0] - 1 - i]
+        if i % 2 == 0:
+            out *= x
+        else:
+            out *= 1 - x
+    out += y_old
+
+
+# Locate the root of one event inside the last step with the Illinois method on the interpolant
+@njit
+def locate_event(events, i, t_a, g_a, t_b, g_b, t_old, h, y_old, F, args, y_tmp, g_tmp):
+    side = 0
+    t_root = t_b
+    for _ in range(100):
+        if abs(t_b - t_a) <= 4 * np.finfo(np.float64).eps * max(abs(t_a), abs(t_b)) + 1e-9:
+            break
+        t_root = (t_a * g_b - t_b * g_a) / (g_b - g_a)
+        dense_eval(t_root, t_old, h, y_old, F, y_tmp)
+        events(t_root, y_tmp, args, g_tmp)
+        g_root = g_tmp[i]
+
+        if g_root == 0:
+            break
+        elif (g_root > 0) == (g_b > 0):
+            t_b, g_b = t_root, g_root
+            if side == -1:
+                g_a /= 2
+            side = -1
+        else:
+            t_a, g_a = t_root, g_root
+            if side == 1:
+                g_b /= 2
+            side = 1
+
+    return t_root
+
+
+# ------------DOP853 ENGINE----------------
+@njit
+def dop853(rhs, events, t0:float, t1:float, y0:np.ndarray, args, terminal:np.ndarray, direction:np.ndarray,
+           rtol:float = 1e-9, atol:float = 1e-9, dt_out:float = 0.0, max_step:float = np.inf, first_step:float = 0.0,
+           restart:np.ndarray = None, n_err:int = 0):
+
+    """
+    Adaptive Dormand-Prince 8(5,3) integrator with dense output and events, the compiled counterpart of
+    solve_ivp(method='DOP853'). It integrates forwards or backwards in time.
+
+    Inputs:
+        rhs: Compiled function rhs(t, y, args, out) that writes dy/dt in out
+        events: Compiled function events(t, y, args, out) that writes the value of every event in out
+        t0, t1: The initial and final time
+        y0: The initial state
+        args: Passed to rhs and events, normally the ForceModel of the phase
+        terminal: Boolean array, True for the events that stop the integration
+        direction: Array with the crossing direction of every event: 1 increasing, -1 decreasing, 0 both
+        rtol, atol: The relative and absolute tolerances
+        dt_out: If positive, the history is interpolated every dt_out seconds, otherwise every accepted step is stored
+        max_step: The maximum step size
+        first_step: The initial step size, chosen automatically if zero
+        restart: (Optional) Boolean array, True for the events that a step must not go over. A step that crosses
+            one is taken again up to its root, so no step spans a kink of the rhs (e.g. an eclipse boundary)
+        n_err: If positive, the error is only controlled on the first n_err components of y. The others follow
+            the steps of these, for quadratures that don't act on the rest of the state
+    Returns:
+        t_hist: The output times, the last one is t1 or the time of the terminal event
+        y_hist: The states at t_hist, as a N*len(y0) numpy array
+        event_t: The times of the events found, in chronological order
+        event_idx: The index of the event of every time in event_t
+        event_y: The states at event_t
+        n_steps: The number of accepted steps
+        n_rejected: The number of rejected steps
+        n_rhs: The number of evaluations of rhs
+        status: FINISHED, TERMINATED or STEP_TOO_SMALL
+    """
+
+    n = y0.size
+    m = n if n_err <= 0 else min(n_err, n)
+    n_events = terminal.size
+    sign = 1.0 if t1 >= t0 else -1.0
+    eps = np.finfo(np.float64).eps
+
+    # Buffers
+    K = np.empty((A.shape[0], n))
+    F = np.empty((7, n))
+    y = y0.astype(np.float64).copy()
+    y_new = np.empty(n)
+    y_tmp = np.empty(n)
+    g_old = np.empty(n_events)
+    g_new = np.empty(n_events)
+    g_tmp = np.empty(n_events)
+    roots = np.empty(n_events)
+
+    # Histories
+    t_hist = np.empty((256, 1))
+    y_hist = np.empty((256, n))
+    event_t = np.empty((16, 1))
+    event_idx = np.empty((16, 1))
+    event_y = np.empty((16, n))
+    t_hist[0, 0] = t0
+    y_hist[0] = y
+    n_out = 1
+    n_found = 0
+    t_next_out = t0 + sign * dt_out
+
+    t = t0
+    rhs(t, y, args, K[0])
+    n_rhs = 1
+    if n_events > 0:
+        events(t, y, args, g_old)
+
+    if first_step > 0:
+        h_abs = min(first_step, abs(t1 - t0))
+    else:
+        h_abs = min(_initial_step(rhs, t0, y, K[0], args, sign, rtol, atol, t1, y_tmp, m), max_step)
+        n_rhs += 1
+
+    n_steps = 0
+    n_rejected = 0
+    status = FINISHED
+
+    # A step that goes over a restart event is taken again up to t_stop, the root of the event restart_idx
+    if restart is None:
+        restart_events = np.zeros(n_events, dtype=np.bool_)
+    else:
+        restart_events = restart
+    t_stop = t1
+    restart_idx = -1
+
+    while sign * (t1 - t) > 0:
+
+        # Attempt steps until the error is within the tolerances
+        min_step = 10 * eps * abs(t)
+        h_abs = min(h_abs, max_step)
+        rejected = False
+        while True:
+            if h_abs < min_step:
+                status = STEP_TOO_SMALL
+                break
+
+            h = sign * h_abs
+            t_new = t + h
+            if sign * (t_new - t_stop) > 0:
+                t_new = t_stop
+            h = t_new - t
+            h_abs = abs(h)
+
+            _dop853_step(rhs, t, y, h, args, K, y_tmp, y_new)
+            n_rhs += N_STAGES
+
+            scale = atol + np.maximum(np.abs(y[:m]), np.abs(y_new[:m])) * rtol
+            error_norm = _error_norm(K, h, scale)
+
+            if error_norm < 1:
+                if error_norm == 0:
+                    factor = MAX_FACTOR
+                else:
+                    factor = min(MAX_FACTOR, SAFETY * error_norm ** ERROR_EXPONENT)
+                if rejected:
+                    factor = min(1.0, factor)
+                h_next = h_abs * factor
+                break
+
+            h_abs *= max(MIN_FACTOR, SAFETY * error_norm ** ERROR_EXPONENT)
+            rejected = True
+            n_rejected += 1
+
+        if status == STEP_TOO_SMALL:
+            break
+        dense_ready = False
+
+        # Events crossed in the step, in chronological order
+        t_end = t_new
+        repeat = False
+        if n_events > 0:
+            events(t_new, y_new, args, g_new)
+
+            # The step ends at the root of the restart event, it is recorded after the other events of the step
+            # and its function is taken as zero there, so it isn't found again by the next step
+            at_stop = restart_idx >= 0 and t_new == t_stop
+            if at_stop:
+                g_new[restart_idx] = 0.0
+
+            n_roots = 0
+            for i in range(n_events):
+                if at_stop and i == restart_idx:
+                    roots[i] = np.nan
+                    continue
+                up = g_old[i] < 0 and g_new[i] >= 0
+                down = g_old[i] > 0 and g_new[i] <= 0
+                if (up and direction[i] >= 0) or (down and direction[i] <= 0):
+                    if not dense_ready:
+                        _dense_coefficients(rhs, t, y, y_new, h, args, K, y_tmp, F)
+                        n_rhs += K.shape[0] - N_STAGES - 1
+                        dense_ready = True
+                    roots[i] = locate_event(events, i, t, g_old[i], t_new, g_new[i], t, h, y, F, args, y_tmp, g_tmp)
+                    n_roots += 1
+                else:
+                    roots[i] = np.nan
+
+            n_found_step = n_found
+            while n_roots > 0:
+                first = -1
+                for i in range(n_events):
+                    if not np.isnan(roots[i]) and (first < 0 or sign * (roots[i] - roots[first]) < 0):
+                        first = i
+
+                # Take the step again up to a restart event, dropping the events recorded in it
+                if restart_events[first] and sign * (roots[first] - t) > min_step and roots[first] != t_new:
+                    t_stop = roots[first]
+                    restart_idx = first
+                    h_abs = abs(t_stop - t)
+                    n_found = n_found_step
+                    repeat = True
+                    break
+
+                event_t = _grow(event_t, n_found)
+                event_idx = _grow(event_idx, n_found)
+                event_y = _grow(event_y, n_found)
+                event_t[n_found, 0] = roots[first]
+                event_idx[n_found, 0] = first
+                dense_eval(roots[first], t, h, y, F, event_y[n_found])
+                n_found += 1
+                roots[first] = np.nan
+                n_roots -= 1
+
+                if terminal[first]:
+                    t_end = event_t[n_found - 1, 0]
+                    status = TERMINATED
+                    break
+
+            if repeat:
+                n_rejected += 1
+                continue
+
+            if at_stop and status != TERMINATED:
+                event_t = _grow(event_t, n_found)
+                event_idx = _grow(event_idx, n_found)
+                event_y = _grow(event_y, n_found)
+                event_t[n_found, 0] = t_new
+                event_idx[n_found, 0] = restart_idx
+                event_y[n_found] = y_new
+                n_found += 1
+            if at_stop or status == TERMINATED:
+                t_stop = t1
+                restart_idx = -1
+
+        n_steps += 1
+
+        # Output
+        if dt_out > 0:
+            while sign * (t_end - t_next_out) >= 0:
+                if not dense_ready:
+                    _dense_coefficients(rhs, t, y, y_new, h, args, K, y_tmp, F)
+                    n_rhs += K.shape[0] - N_STAGES - 1
+                    dense_ready = True
+                t_hist = _grow(t_hist, n_out)
+                y_hist = _grow(y_hist, n_out)
+                t_hist[n_out, 0] = t_next_out
+                dense_eval(t_next_out, t, h, y, F, y_hist[n_out])
+                n_out += 1
+                t_next_out = t0 + sign * dt_out * n_out
+
+        if status == TERMINATED:
+            if dt_out <= 0 or t_hist[n_out - 1, 0] != t_end:
+                t_hist = _grow(t_hist, n_out)
+                y_hist = _grow(y_hist, n_out)
+                t_hist[n_out, 0] = t_end
+                y_hist[n_out] = event_y[n_found - 1]
+                n_out += 1
+            break
+
+        if dt_out <= 0 or (t_new == t1 and t_hist[n_out - 1, 0] != t1):
+            t_hist = _grow(t_hist, n_out)
+            y_hist = _grow(y_hist, n_out)
+            t_hist[n_out, 0] = t_new
+            y_hist[n_out] = y_new
+            n_out += 1
+
+        # Advance, the last stage is f(t_new, y_new)
+        t = t_new
+        y[:] = y_new
+        K[0] = K[N_STAGES]
+        if n_events > 0:
+            g_old[:] = g_new
+        h_abs = h_next
+
+    return (t_hist[:n_out, 0].copy(), y_hist[:n_out].copy(), event_t[:n_found, 0].copy(), event_idx[:n_found, 0].astype(np.int64),
+            event_y[:n_found].copy(), n_steps, n_rejected, n_rhs, status)
@@ -0,0 +1,219 @@
+# Lucas Calderon
+# This file contains the orbit averaged (mean element) propagation, for lifetime studies of weeks to months.
+# The perturbing accelerations of acceleration_kernel (J2, third body, drag and thrust) are averaged around
+# the orbit by quadrature and the averaged rates are integrated with the compiled DOP853 engine, so one step
+# covers several revolutions. The mean state is y = [h_vec (3), e_vec (3), M, m]: the angular momentum and
+# eccentricity vectors don't have the singularities of the classical elements for equatorial or circular orbits.
+
+import sys
+import os
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config.spacecraft import spacecraft
+from Modules.dynamics import acceleration_kernel, build_force_model
+from Modules.ephemeris import ephemeris_position
+from Modules.gravity import body_rotation
+from Modules.elements import states_to_coes_batch
+from Modules.integrators import dop853, check_status, TERMINATED
+
+
+# ------------MEAN STATE----------------
+# Unit vectors of the perifocal frame, P towards periapsis and Q 90 deg ahead.
+# For circular orbits P is along the node, or along x for equatorial orbits, like states_to_coes_batch
+@njit
+def _perifocal(h_vec, e_vec):
+    h_hat = h_vec / np.sqrt(np.sum(h_vec**2))
+    e = np.sqrt(np.sum(e_vec**2))
+    if e > 1e-12:
+        P = e_vec - np.sum(e_vec * h_hat) * h_hat
+    else:
+        P = np.array([-h_hat[1], h_hat[0], 0.0])
+        if np.sum(P**2) < 1e-24:
+            P = np.array([1.0, 0.0, 0.0])
+    P = P / np.sqrt(np.sum(P**2))
+    Q = np.cross(h_hat, P)
+
+    return h_hat, P, Q
+
+
+# Cartesian states of mean states, the mean elements are used as osculating (no short period terms)
+@njit
+def mean_to_states(y:np.ndarray, mu:float) -> np.ndarray:
+
+    """
+    Inputs:
+        y: The mean states as a N*8 numpy array: [h_vec, e_vec, M, m] * N
+        mu: The gravitational parameter of the central body (km^3/s^2)
+
+    Returns:
+        states: The states as a N*7 numpy array: [x, y, z, vx, vy, vz, m] * N
+    """
+
+    states = np.empty((y.shape[0], 7))
+    for k in range(y.shape[0]):
+        h = np.sqrt(np.sum(y[k, :3]**2))
+        e = np.sqrt(np.sum(y[k, 3:6]**2))
+        a = h**2 / mu / (1 - e**2)
+        _, P, Q = _perifocal(y[k, :3], y[k, 3:6])
+
+        # Kepler's equation
+        M = np.mod(y[k, 6], 2 * np.pi)
+        E = M if e < 0.8 else np.pi
+        for _ in range(50):
+            dE = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+            E -= dE
+            if abs(dE) < 1e-15:
+                break
+
+        r = a * (1 - e * np.cos(E))
+        states[k, :3] = a * (np.cos(E) - e) * P + a * np.sqrt(1 - e**2) * np.sin(E) * Q
+        states[k, 3:6] = np.sqrt(mu * a) / r * (-np.sin(E) * P + np.sqrt(1 - e**2) * np.cos(E) * Q)
+        states[k, 6] = y[k, 7]
+
+    return states
+
+
+# Mean state of a cartesian state, the osculating elements are taken as mean elements
+def state_to_mean(state:np.ndarray, et:float, mu:float) -> np.ndarray:
+    r = state[:3]
+    v = state[3:6]
+    h_vec = np.cross(r, v)
+    e_vec = np.cross(v, h_vec) / mu - r / np.linalg.norm(r)
+    M = states_to_coes_batch(state[:6], et, mu)[0, 5]
+
+    return np.concatenate((h_vec, e_vec, [M, state[6]]))
+
+
+# ------------AVERAGED RATES----------------
+@njit
+def _mean_rates(t:float, y:np.ndarray, args, out:np.ndarray):
+
+    """
+    Right-hand side of the mean state for the integrators.
+    The perturbing acceleration f (everything in acceleration_kernel but the point mass) is averaged over the
+    mean anomaly with nodes equally spaced in eccentric anomaly, dM = (1 - e cos E) dE:
+        dh/dt = r x f
+        de/dt = (f x h + v x (r x f)) / mu
+        dM/dt = n + Gauss equation of the mean anomaly
+    The position of the perturbing body is frozen over the revolution.
+    args = (fm, cos_E, sin_E, h_handoff)
+    """
+
+    fm, cos_E, sin_E, h_handoff = args
+    mu = fm.mu
+    h_vec = y[:3]
+    e_vec = y[3:6]
+    h = np.sqrt(np.sum(h_vec**2))
+    e = np.sqrt(np.sum(e_vec**2))
+    p = h**2 / mu
+    a = p / (1 - e**2)
+    b = a * np.sqrt(1 - e**2)
+    n = np.sqrt(mu / a**3)
+    h_hat, P, Q = _perifocal(h_vec, e_vec)
+
+    pos_bodies = ephemeris_position(t, fm.eph)
+    rot = body_rotation(t, fm.gravity)
+    state = np.empty(7)
+    state_dot = np.empty(7)
+    state[6] = y[7]
+    out[:] = 0.0
+
+    N = cos_E.size
+    for k in range(N):
+        r = a * (1 - e * cos_E[k])
+        r_vec = a * (cos_E[k] - e) * P + b * sin_E[k] * Q
+        v_vec = np.sqrt(mu * a) / r * (-sin_E[k] * P + np.sqrt(1 - e**2) * cos_E[k] * Q)
+        state[:3] = r_vec
+        state[3:6] = v_vec
+        acceleration_kernel(t, state, pos_bodies, rot, fm, 1.0, state_dot)
+        f = state_dot[3:6] + mu / r**3 * r_vec
+        w = (1 - e * cos_E[k]) / N
+
+        r_cross_f = np.cross(r_vec, f)
+        out[:3] += w * r_cross_f
+        out[3:6] += w * (np.cross(f, h_vec) + np.cross(v_vec, r_cross_f)) / mu
+
+        # Radial and along track components for the mean anomaly
+        f_R = np.sum(f * r_vec) / r
+        f_S = np.sum(f * np.cross(h_hat, r_vec)) / r
+        cos_nu = (cos_E[k] - e) / (1 - e * cos_E[k])
+        sin_nu = np.sqrt(1 - e**2) * sin_E[k] / (1 - e * cos_E[k])
+        out[6] += w * b / (a * h * max(e, 1e-8)) * ((p * cos_nu - 2 * r * e) * f_R - (p + r) * sin_nu * f_S)
+        out[7] += w * state_dot[6]
+
+    out[6] += n
+
+
+# Periapsis height crossing the handoff height
+@njit
+def _mean_events(t:float, y:np.ndarray, args, out:np.ndarray):
+    fm, _, _, h_handoff = args
+    p = np.sum(y[:3]**2) / fm.mu
+    out[0] = p / (1 + np.sqrt(np.sum(y[3:6]**2))) - fm.R_e - h_handoff
+
+
+# ------------PROPAGATION----------------
+def propagate_mean(t_span:np.ndarray, state0:np.ndarray, body:str='Earth', sc=spacecraft, h_handoff:float=None,
+                   n_quad:int=180, rtol:float=1e-9, atol:float=1e-9, dt_out:float=0.0, engine:str='DOP853',
+                   steering=None, force_model:dict=None, events=None) -> tuple:
+
+    """
+    Propagates the mean elements of an orbit. If h_handoff is given, the propagation switches to the
+    cartesian propagator (propagate_phase with the compiled physics) when the periapsis height drops below it.
+
+    Inputs:
+        t_span: The time span of the simulation, in et seconds
+        state0: The initial state, a 7 member numpy array with the position, velocity and mass of the spacecraft
+        body: The body that the spacecraft is orbiting
+        sc: The spacecraft named tuple used to build the force model
+        h_handoff: (Optional) The periapsis height in km below which the cartesian propagator takes over
+        n_quad: The number of quadrature nodes around the orbit. Drag near periapsis of eccentric orbits needs more
+        rtol, atol: The tolerances of the integration of the mean state
+        dt_out: If positive, the mean elements are output every dt_out seconds, otherwise at every step
+        engine: The engine of propagate_phase after the handoff
+        steering: (Optional) The SteeringLaw of the thrust. The duty cycles are averaged with the rest of the
+            thrust, the switches of the throttle schedules aren't steps of the mean propagation
+        force_model: (Optional) Options of dynamics.build_force_model for both propagations, e.g. {'perturbers': (), 'srp': False}.
+            The mean propagation keeps only the zonal terms of the gravity field
+        events: (Optional) The EventSet of the cartesian propagation after the handoff, see propagate_phase
+    Returns:
+        t_hist: The history of the time of the mean propagation
+        coes: The mean classical orbital elements in the layout of helper.states_to_coes, as a N*11 numpy array
+        mass_hist: The history of the mass of the spacecraft
+        handoff: None, or the output of propagate_phase after the handoff: (t_hist, pos_hist, vel_hist, mass_hist)
+
+    Raises ValueError if the step size of the mean propagation collapses before the end of the span.
+    """
+
+    # Zonal field only, the tesseral terms average out over a day
+    fm = build_force_model(t_span, body, sc, states0=state0, steering=steering, **{**(force_model or {}), 'order': 0})
+    E = 2 * np.pi * np.arange(n_quad) / n_quad
+    args = (fm, np.cos(E), np.sin(E), float(h_handoff) if h_handoff is not None else -np.inf)
+    y0 = state_to_mean(np.asarray(state0, dtype=np.float64), t_span[0], fm.mu)
+
+    # Hand off at once if the periapsis is already below the handoff height
+    g0 = np.empty(1)
+    _mean_events(t_span[0], y0, args, g0)
+    if g0[0] < 0:
+        t_hist, y_hist, status = np.array([t_span[0]]), y0[None, :], TERMINATED
+    else:
+        t_hist, y_hist, _, _, _, _, _, _, status = dop853(_mean_rates, _mean_events, float(t_span[0]), float(t_span[1]), y0, args,
+                                                          np.array([True]), np.array([-1.0]), rtol, atol, dt_out)
+        check_status(status, t_hist[-1])
+
+    states = mean_to_states(y_hist, fm.mu)
+    coes = states_to_coes_batch(states[:, :6], t_hist, fm.mu)
+
+    # Continue with the cartesian propagator, from the initial state if there was no mean propagation
+    handoff = None
+    if status == TERMINATED:
+        from Modules.simulation_math import propagate_phase
+        state_handoff = states[-1] if len(t_hist) > 1 else np.asarray(state0, dtype=np.float64)
+        handoff = propagate_phase(np.array([t_hist[-1], t_span[1]]), None, state_handoff, body, compiled=True, sc=sc,
+                                  engine=engine, verbose=False, steering=steering, force_model=force_model, events=events)
+
+    return t_hist, coes, y_hist[:, 7], handoff
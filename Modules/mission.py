@@ -0,0 +1,195 @@
+# Lucas Calderon
+# This file contains the mission sequencer: a list of phases (coast, thrust arc, aerobraking, SOI switch...)
+# run one after the other, each with its own body, spacecraft configuration and engine.
+# The run writes append-only binary checkpoints, so an interrupted mission resumes from the last one.
+
+import sys
+import os
+from collections import namedtuple
+import numpy as np
+import spiceypy as spice
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config.spacecraft import spacecraft
+from Modules.events import CRASH, EVENT_NAMES
+
+# One phase of the mission
+#   name: Label of the phase
+#   duration: Duration in seconds
+#   engine: Engine of propagate_phase ('LSODA', 'DOP853', 'KS', 'RK4', 'Verlet', 'RK8')
+#   body: The body the phase is propagated around, the state is recentred when it changes (SOI switch)
+#   dt: The step of the fixed step engines
+#   sc_changes: Fields of the Spacecraft named tuple changed in this phase, e.g. {'thrust': None} for a coast
+#   steering: The SteeringLaw of the thrust in this phase (steering.py), None for the thrust along the velocity
+#   force_model: Options of dynamics.build_force_model for this phase, e.g. {'perturbers': (), 'degree': 8, 'order': 8, 'srp': False},
+#       None for the defaults
+#   events: The EventSet of this phase (events.py), None for events.phase_event_set of every segment
+Phase = namedtuple('Phase', ['name', 'duration', 'engine', 'body', 'dt', 'sc_changes', 'steering', 'force_model', 'events'],
+                   defaults=('DOP853', 'Earth', 10.0, None, None, None, None))
+
+# Checkpoint records, all float64: [phase_index, phase_t0, et, seed, n_rows, status, x, y, z, vx, vy, vz, m]
+CHECKPOINT_SIZE = 13
+# History rows, all float64: [phase_index, t, x, y, z, vx, vy, vz, m]
+HISTORY_SIZE = 9
+
+# Status of the mission in the checkpoints
+RUNNING = 0
+FINISHED = 1
+CRASHED = 2
+
+
+# ------------CHECKPOINTS----------------
+# Complete records of a binary file of float64 rows, a record cut by an interruption is dropped
+def _read_records(path:str, size:int) -> np.ndarray:
+    if not os.path.exists(path):
+        return np.empty((0, size))
+    data = np.fromfile(path, dtype=np.float64)
+    n = len(data) // size
+
+    return data[:n * size].reshape(n, size)
+
+
+# Keep only the first n records of a binary file
+def _truncate(path:str, n:int, size:int):
+    with open(path, 'ab') as file:
+        file.truncate(n * size * 8)
+
+
+# Append rows to a binary file
+def _append(path:str, rows:np.ndarray):
+    with open(path, 'ab') as file:
+        np.ascontiguousarray(rows, dtype=np.float64).tofile(file)
+
+
+def last_checkpoint(checkpoint_file:str):
+
+    """
+    Returns the last complete checkpoint record of a mission, or None if there is none.
+    """
+
+    records = _read_records(checkpoint_file, CHECKPOINT_SIZE)
+
+    return records[-1] if len(records) else None
+
+
+def load_history(checkpoint_file:str) -> tuple:
+
+    """
+    Reads the history of a mission, up to its last checkpoint.
+
+    Returns:
+        t_hist: The history of the time of the mission
+        states: The history of the states as a N*7 numpy array: [x, y, z, vx, vy, vz, m] * N
+        phase_idx: The index of the phase of every row
+    """
+
+    checkpoint = last_checkpoint(checkpoint_file)
+    n_rows = 0 if checkpoint is None else int(checkpoint[4])
+    rows = np.memmap(checkpoint_file + '.hist', dtype=np.float64, mode='r', shape=(n_rows, HISTORY_SIZE)) if n_rows else np.empty((0, HISTORY_SIZE))
+
+    return np.array(rows[:, 1]), np.array(rows[:, 2:]), rows[:, 0].astype(np.int64)
+
+
+# ------------SEQUENCER----------------
+# State relative to new_body of a state relative to old_body
+def _recentre(state:np.ndarray, et:float, old_body:str, new_body:str) -> np.ndarray:
+    offset = spice.spkezr(new_body, et, 'J2000', 'NONE', old_body)[0]
+    state = state.copy()
+    state[:6] -= offset
+
+    return state
+
+
+def run_mission(phases:list, state0:np.ndarray, et0:float, checkpoint_file:str, checkpoint_every:float=86400,
+                seed:int=0, sc=spacecraft, resume:bool=True, verbose:bool=True) -> tuple:
+
+    """
+    Runs the phases of a mission in order. Every phase is split in segments of checkpoint_every seconds,
+    after each segment its history rows are appended to checkpoint_file + '.hist' and one checkpoint record
+    to checkpoint_file. The mission stops if the spacecraft crashes, the other terminal events of a phase
+    (SOI exit, propellant depleted) end the phase early and the next one starts.
+
+    Inputs:
+        phases: List of Phase named tuples
+        state0: The initial state, a 7 member numpy array with the position, velocity and mass of the spacecraft
+        et0: The initial epoch, in et seconds
+        checkpoint_file: The binary checkpoint file, the histories go to checkpoint_file + '.hist'
+        checkpoint_every: The time between checkpoints, in seconds
+        seed: The seed of the run, stored in the checkpoints and checked on resume
+        sc: The spacecraft named tuple the sc_changes of the phases are applied to
+        resume: Continue from the last checkpoint of checkpoint_file if there is one, otherwise start over
+        verbose: Print the progress of the phases
+    Returns:
+        t_hist, states, phase_idx: The history of the whole mission, see load_history
+        status: FINISHED or CRASHED
+    """
+
+    from Modules.simulation_math import propagate_phase
+
+    history_file = checkpoint_file + '.hist'
+    records = _read_records(checkpoint_file, CHECKPOINT_SIZE) if resume else np.empty((0, CHECKPOINT_SIZE))
+    checkpoint = records[-1] if len(records) else None
+
+    if checkpoint is None:
+        for path in (checkpoint_file, history_file):
+            if os.path.exists(path):
+                os.remove(path)
+        i_phase, phase_t0, et, n_rows, status = 0, et0, et0, 0, RUNNING
+        state = np.asarray(state0, dtype=np.float64)
+        _append(history_file, np.concatenate(([0, et], state))[None, :])
+        n_rows = 1
+    else:
+        if int(checkpoint[3]) != seed:
+            raise ValueError(f"The checkpoint was written with seed {int(checkpoint[3])}, not {seed}")
+        i_phase, phase_t0, et, n_rows, status = int(checkpoint[0]), checkpoint[1], checkpoint[2], int(checkpoint[4]), int(checkpoint[5])
+        state = checkpoint[6:].copy()
+        # Drop a record cut by the interruption and the rows written after the last checkpoint
+        _truncate(checkpoint_file, len(records), CHECKPOINT_SIZE)
+        _truncate(history_file, n_rows, HISTORY_SIZE)
+        if verbose and status == RUNNING:
+            print(f"Resuming phase {i_phase} ({phases[i_phase].name}) at et {et:.1f}")
+
+    with open(checkpoint_file, 'ab') as ckpt, open(history_file, 'ab') as hist:
+        while status == RUNNING:
+            phase = phases[i_phase]
+            phase_sc = sc._replace(**(phase.sc_changes or {}))
+            phase_t1 = phase_t0 + phase.duration
+            if verbose and et == phase_t0:
+                print(f"Phase {i_phase}: {phase.name}, {phase.duration:.0f} s around {phase.body}")
+
+            # Propagate one segment
+            t_end = min(et + checkpoint_every, phase_t1)
+            t_seg, pos_seg, vel_seg, mass_seg, events = propagate_phase(np.array([et, t_end]), None, state, phase.body, compiled=True,
+                                                                        sc=phase_sc, engine=phase.engine, dt=phase.dt, verbose=False,
+                                                                        return_events=True, steering=phase.steering,
+                                                                        force_model=phase.force_model, events=phase.events)
+            rows = np.column_stack((np.full(len(t_seg) - 1, i_phase), t_seg[1:], pos_seg[1:], vel_seg[1:], mass_seg[1:]))
+            rows.tofile(hist)
+            hist.flush()
+            n_rows += len(rows)
+            et = t_seg[-1]
+            state = np.concatenate((pos_seg[-1], vel_seg[-1], [mass_seg[-1]]))
+
+            # Next segment, next phase or end of the mission
+            if np.any(events['kind'] == CRASH):
+                status = CRASHED
+                if verbose:
+                    print(f"Crash in phase {i_phase} ({phase.name}) at et {et:.1f}")
+            elif et < t_end - 1e-6 or et >= phase_t1 - 1e-6:
+                if verbose and et < t_end - 1e-6:
+                    print(f"Phase {i_phase} ({phase.name}) ended by {EVENT_NAMES[events['kind'][-1]]} at et {et:.1f}")
+                i_phase += 1
+                phase_t0 = et
+                if i_phase == len(phases):
+                    status = FINISHED
+                elif phases[i_phase].body != phase.body:
+                    state = _recentre(state, et, phase.body, phases[i_phase].body)
+
+            np.concatenate(([i_phase, phase_t0, et, seed, n_rows, status], state)).tofile(ckpt)
+            ckpt.flush()
+
+    t_hist, states, phase_idx = load_history(checkpoint_file)
+
+    return t_hist, states, phase_idx, status
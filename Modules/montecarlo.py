@@ -0,0 +1,275 @@
+# Lucas Calderon
+# This file contains the Monte Carlo dispersion campaigns.
+# Every run samples the orbit inputs and the spacecraft parameters, propagates one phase with the
+# compiled acceleration on a pool of worker processes and appends a one line summary to a results file.
+
+import sys
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Config.spacecraft import spacecraft, orbit_inputs
+from Modules.elements import coes_to_states_batch, states_to_coes_batch
+from Modules.events import CRASH
+
+# Names that are sampled as orbit inputs, everything else must be a field of the Spacecraft named tuple
+ORBIT_KEYS = ('Periapsis', 'Apoapsis', 'Inclination', 'Rigth_Ascension_node', 'Argument_periapsis', 'Mean_anomaly_epoch')
+
+
+# ------------SAMPLING----------------
+# Draw one value from a distribution given as a tuple
+def _draw(rng:np.random.Generator, dist):
+
+    """
+    Distributions are tuples: ('normal', mean, std), ('uniform', low, high),
+    ('lognormal', median, sigma) or ('choice', [values]). Plain numbers are kept fixed.
+    """
+
+    if not isinstance(dist, tuple):
+        return dist
+
+    kind = dist[0]
+    if kind == 'normal':
+        return float(rng.normal(dist[1], dist[2]))
+    elif kind == 'uniform':
+        return float(rng.uniform(dist[1], dist[2]))
+    elif kind == 'lognormal':
+        return float(dist[1] * np.exp(rng.normal(0, dist[2])))
+    elif kind == 'choice':
+        return dist[1][rng.integers(len(dist[1]))]
+    else:
+        raise ValueError(f"Unknown distribution '{kind}'")
+
+
+def sample_case(dispersions:dict, seed:int, run_id:int) -> dict:
+
+    """
+    Samples the inputs of one run. The generator is seeded with (seed, run_id), so every run
+    gets the same inputs whatever the order, the number of workers or the resumes.
+
+    Inputs:
+        dispersions: Dictionary from input name to distribution, see _draw
+        seed: The seed of the campaign
+        run_id: The index of the run
+
+    Returns:
+        sample: Dictionary with the sampled value of every dispersed input
+    """
+
+    rng = np.random.default_rng([seed, run_id])
+    sample = {}
+    for name in sorted(dispersions):
+        if name not in ORBIT_KEYS and name not in spacecraft._fields:
+            raise ValueError(f"'{name}' is not an orbit input nor a spacecraft parameter")
+        sample[name] = _draw(rng, dispersions[name])
+
+    return sample
+
+
+# Initial state from the orbit inputs, processed like Config/spacecraft.py
+def orbit_state(inputs:dict, mass:float) -> np.ndarray:
+    body_data = getattr(bd, inputs['body'])
+    periapsis = inputs['Periapsis'] + body_data.radius_equator
+    apoapsis = inputs['Apoapsis'] + body_data.radius_equator
+    if apoapsis < periapsis:
+        raise ValueError("Apoapsis cannot be lower than the Periapsis")
+
+    elts = np.array([periapsis, (apoapsis - periapsis) / (apoapsis + periapsis), np.radians(inputs['Inclination']),
+                     np.radians(inputs['Rigth_Ascension_node']), np.radians(inputs['Argument_periapsis']),
+                     np.radians(inputs['Mean_anomaly_epoch']), inputs['et'], body_data.gravitational_parameter])
+    state = coes_to_states_batch(elts, inputs['et'])[0]
+
+    return np.concatenate((state, np.array([mass])))
+
+
+# ------------WORKERS----------------
+# Furnish the SPICE kernels once per worker process
+def _init_worker(meta_kernel):
+    from Modules.helper import load_kernels
+    load_kernels(meta_kernel)
+
+
+def run_case(run_id:int, sample:dict, t_phase:float, targeting:dict=None) -> dict:
+
+    """
+    Propagates one sampled case and summarises it.
+
+    Inputs:
+        run_id, sample, t_phase: The index of the run, its sampled inputs and the duration of the phase
+        targeting: (Optional) Dictionary with the goals and the controls of a targeting.Targeter and optionally
+            t_burn, method and guess (a dictionary of the controls). The controls are solved for every case from the
+            guess, by default the nominal controls of the case, so the solution doesn't depend on the worker that
+            runs it. The case is summarised on the solved trajectory
+
+    Returns:
+        summary: Dictionary with run_id, the sampled inputs, lifetime, crashed, final_mass,
+            periapsis_decay, time_in_atmosphere and wall_time, and with targeting the solved controls, the values
+            of the goals, converged, iterations, n_evals and the wall time of the targeting
+    """
+
+    from Modules.simulation_math import propagate_phase
+    from Modules.helper import sc_heigth
+
+    start = time.perf_counter()
+
+    # Build the inputs of the case
+    inputs = dict(orbit_inputs)
+    inputs.update({key: value for key, value in sample.items() if key in ORBIT_KEYS})
+    sc = spacecraft._replace(**{key: value for key, value in sample.items() if key not in ORBIT_KEYS})
+    body = inputs['body']
+    mu = getattr(bd, body).gravitational_parameter
+
+    state0 = orbit_state(inputs, sc.mass0)
+    sc = sc._replace(et0=inputs['et'], initial_position=state0[:3], initial_velocity=state0[3:6])
+    t_span = np.array([inputs['et'], inputs['et'] + t_phase])
+
+    if targeting is None:
+        t_hist, pos_hist, vel_hist, mass_hist, events = propagate_phase(t_span, None, state0, body, compiled=True, sc=sc, verbose=False,
+                                                                        return_events=True)
+    else:
+        from Modules.targeting import Targeter
+
+        targeter = Targeter(targeting['goals'], targeting['controls'], inputs, sc, t_phase, targeting.get('t_burn'))
+        guess = targeting.get('guess')
+        if guess is not None:
+            guess = np.array([guess[name] for name in targeter.controls], dtype=np.float64)
+        result = targeter.solve(guess, method=targeting.get('method', 'lm'))
+
+        t_hist, state_hist, events = targeter.trajectory(np.array(list(result.controls.values())))
+        pos_hist, vel_hist, mass_hist = state_hist[:, :3], state_hist[:, 3:6], state_hist[:, 6]
+
+    # Summary
+    coes = states_to_coes_batch(np.concatenate((pos_hist[[0, -1]], vel_hist[[0, -1]]), axis=1), t_hist[[0, -1]], mu)
+    heights = np.array([sc_heigth(p) for p in pos_hist])
+    in_atmos = (heights[1:] + heights[:-1]) / 2 < 745
+
+    summary = {
+        'run_id': run_id,
+        'sample': sample,
+        'lifetime': float(t_hist[-1] - t_hist[0]),
+        'crashed': bool(np.any(events['kind'] == CRASH)),
+        'final_mass': float(mass_hist[-1]),
+        'periapsis_decay': float(coes[0, 0] - coes[1, 0]),
+        'time_in_atmosphere': float(np.sum(np.diff(t_hist)[in_atmos])),
+        'wall_time': time.perf_counter() - start,
+    }
+    if targeting is not None:
+        summary['targeting'] = {
+            'controls': result.controls,
+            'values': result.values.tolist(),
+            'converged': result.converged,
+            'iterations': result.iterations,
+            'n_evals': result.n_evals,
+            'wall_time': result.wall_time,
+        }
+
+    return summary
+
+
+# ------------CAMPAIGN----------------
+def run_campaign(dispersions:dict, n_runs:int, results_file:str, t_phase:float=1e6, seed:int=0,
+                 workers:int=None, meta_kernel:str=None, progress_every:int=10, targeting:dict=None,
+                 retry_failed:bool=True) -> int:
+
+    """
+    Runs a dispersion campaign on a pool of processes.
+    Every finished run is appended to results_file as one JSON line. If the file already exists,
+    the runs it contains are skipped, so an interrupted campaign resumes where it stopped.
+    A run that raises is written as {'run_id', 'sample', 'error'}, so one bad sample (an apoapsis dispersed
+    below the periapsis, for example) doesn't stop the campaign. By default the failed runs are run again
+    on resume, so transient failures (a busy file, a SPICE error, a MemoryError) don't leave holes in the campaign.
+
+    Inputs:
+        dispersions: Dictionary from orbit input or spacecraft field to distribution, for example
+            {'Periapsis': ('normal', 200, 5), 'C_D': ('uniform', 2.0, 2.4)}
+        n_runs: The total number of runs of the campaign
+        results_file: The JSON lines file where the summaries are streamed
+        t_phase: The duration of every run in seconds
+        seed: The seed of the campaign
+        workers: The number of processes, by default the number of cores
+        meta_kernel: The SPICE meta kernel furnished by every worker, by default the one of the project
+        progress_every: Print the progress every this many runs
+        targeting: (Optional) The targeting problem solved in every run, see run_case
+        retry_failed: Run again the runs with an error line, otherwise they count as done
+
+    Returns:
+        n_done: The number of runs executed in this call
+    """
+
+    from Modules.helper import META_KERNEL
+
+    done = done_runs(results_file, retry_failed)
+    pending = [run_id for run_id in range(n_runs) if run_id not in done]
+    print(f"Campaign: {n_runs} runs, {len(done)} already done, {len(pending)} to run")
+    if not pending:
+        return 0
+
+    start = time.perf_counter()
+    n_done = 0
+    with open(results_file, 'a') as file, \
+         ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(meta_kernel or META_KERNEL,)) as pool:
+
+        # Close a line cut by an interruption, so it doesn't merge with the next summary
+        if file.tell() > 0:
+            with open(results_file, 'rb') as check:
+                check.seek(-1, os.SEEK_END)
+                if check.read(1) != b'\n':
+                    file.write('\n')
+
+        samples = {run_id: sample_case(dispersions, seed, run_id) for run_id in pending}
+        futures = {pool.submit(run_case, run_id, samples[run_id], t_phase, targeting): run_id for run_id in pending}
+        for future in as_completed(futures):
+            run_id = futures[future]
+            try:
+                summary = future.result()
+            except BrokenProcessPool:
+                raise # The pending runs are left for the resume
+            except Exception as error:
+                summary = {'run_id': run_id, 'sample': samples[run_id], 'error': f"{type(error).__name__}: {error}"}
+            file.write(json.dumps(summary) + '\n')
+            file.flush()
+            n_done += 1
+
+            if n_done % progress_every == 0 or n_done == len(pending):
+                elapsed = time.perf_counter() - start
+                eta = elapsed / n_done * (len(pending) - n_done)
+                print(f"{len(done) + n_done}/{n_runs} runs, {elapsed:.0f} s elapsed, {eta:.0f} s left")
+
+    return n_done
+
+
+# Indices of the runs already in a results file, without the failed ones if they are retried
+def done_runs(results_file:str, retry_failed:bool=True) -> set:
+    done = set()
+    if os.path.exists(results_file):
+        with open(results_file) as file:
+            for line in file:
+                try:
+                    summary = json.loads(line)
+                    if not (retry_failed and 'error' in summary):
+                        done.add(summary['run_id'])
+                except (ValueError, KeyError):
+                    pass # Line cut by an interruption
+
+    return done
+
+
+# Read the summaries of a campaign, the failed runs have an 'error' instead of the results. The error lines are kept
+# for diagnosis, a run that was retried has its error lines first and then its summary
+def load_results(results_file:str) -> list:
+    runs = []
+    with open(results_file) as file:
+        for line in file:
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                pass # Line cut by an interruption
+
+    return sorted(runs, key=lambda run: run['run_id'])
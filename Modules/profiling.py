@@ -0,0 +1,525 @@
+# Lucas Calderon
+# This file contains the instrumentation of the propagations: a RunProbe passed to propagate_phase records the wall
+# time of its sections (setup, engine, output), the accepted and rejected steps, the calls of the compiled kernel and
+# the lookups of the atmosphere (dynamics.COUNTERS), the SPICE calls and the hits of the caches. Without a probe the
+# kernel only checks the size of the empty counters of the force model.
+# The compiled physics can't be timed from inside, so the time of every force term is the cost per call measured on
+# states sampled along the trajectory times the number of calls. What is left of the time of the engine is its own
+# overhead (step control, events, dense output, calls). The steps are binned by altitude, so a step-size collapse
+# in the atmosphere shows up against the per-call costs.
+# The RunReport can be exported as JSON or as folded stacks for flame graph tools (flamegraph.pl, speedscope).
+
+import sys
+import os
+import json
+import time
+import functools
+from collections import namedtuple
+import numpy as np
+from numba import njit
+import spiceypy as spice
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Modules.atmos import atmos_interp, get_atmos, get_air_table, get_species_log
+from Modules.aero import drag_acceleration_bound
+from Modules.dynamics import ForceModel, RHS_CALLS, ATMOS_LOOKUPS, third_body_acceleration
+from Modules.ephemeris import cache_stats, ephemeris_position, ephemeris_positions
+from Modules.gravity import body_rotation, gravity_acceleration
+from Modules.helper import sc_heigth_radii
+from Modules.intake import INTAKE_IDX, INTAKE_SIZE, intake_flux, intake_rates
+from Modules.simulation_math import propagate_phase
+from Modules.srp import shadow_fraction, srp_acceleration
+from Modules.steering import steering_control
+from Modules.variational import STM_IDX, variational_rates
+
+# Force terms of the kernel, the harmonics are J2 and the rest of the gravity field
+EPHEMERIS = 0
+ROTATION = 1
+CENTRAL = 2
+HARMONICS = 3
+THIRD_BODY = 4
+SRP = 5
+DRAG = 6
+THRUST = 7
+INTAKE = 8
+VARIATIONAL = 9
+TERMS = ('ephemeris', 'rotation', 'central', 'harmonics', 'third_body', 'srp', 'drag', 'thrust', 'intake', 'variational')
+
+# SPICE functions counted during a run
+SPICE_FUNCTIONS = ('spkezr', 'spkpos', 'pxform', 'sxform', 'conics', 'oscltx')
+
+# A band of altitudes collapses when its median step is below this fraction of the median step of the run
+# and it holds at least COLLAPSE_SHARE of the steps
+COLLAPSE_RATIO = 0.2
+COLLAPSE_SHARE = 0.25
+
+# Report of a profiled run:
+#   engine: The engine of propagate_phase
+#   wall_time: The wall time of the run, in seconds
+#   sections: The wall time of setup (events, force model), of the engine and of the output, in seconds
+#   rhs_calls, accepted_steps, rejected_steps: The calls of the right-hand side and the steps (None if unknown)
+#   atmos_lookups: The lookups of the atmosphere
+#   terms: For every force term, its calls, its cost per call in microseconds and its estimated time in seconds.
+#       Empty with the python acceleration
+#   spice: For every SPICE function called, its calls, epochs and time in seconds
+#   caches: The hits and misses of the ephemeris, atmosphere and atmosphere provider caches during the run
+#   step_bands: The steps binned by altitude: h_min, h_max (None above the atmosphere), steps, time covered,
+#       median and minimum step, in km and seconds
+#   diagnosis: The cause of the cost of the run ('step_collapse', 'overhead' or 'force_terms') and its numbers
+RunReport = namedtuple('RunReport', ['engine', 'wall_time', 'sections', 'rhs_calls', 'accepted_steps', 'rejected_steps',
+                                     'atmos_lookups', 'terms', 'spice', 'caches', 'step_bands', 'diagnosis'])
+
+
+# ------------SAMPLED COSTS (NUMBA COMPATIBLE)----------------
+# Evaluates one force term at every sampled state, as the kernel does. Returns a sum of the results so the loop
+# isn't optimised away
+@njit
+def _sample_term(term:int, ets:np.ndarray, states:np.ndarray, pos_bodies:np.ndarray, rots:np.ndarray, fm:ForceModel,
+                 out:np.ndarray) -> float:
+
+    total = 0.0
+    for i in range(ets.size):
+        state = states[i]
+        x, y, z = state[0], state[1], state[2]
+
+        if term == EPHEMERIS:
+            total += ephemeris_position(ets[i], fm.eph).sum()
+        elif term == ROTATION:
+            total += body_rotation(ets[i], fm.gravity)[0, 0]
+        elif term == CENTRAL:
+            r = np.sqrt(x**2 + y**2 + z**2)
+            total += - fm.mu / r**3 * x
+        elif term == HARMONICS:
+            total += gravity_acceleration(state[:3], rots[i], fm.gravity)[0]
+        elif term == THIRD_BODY:
+            for k in range(fm.mu_bodies.size):
+                total += third_body_acceleration(x, y, z, pos_bodies[i, 3 * k], pos_bodies[i, 3 * k + 1],
+                                                 pos_bodies[i, 3 * k + 2], fm.mu_bodies[k])[0]
+        elif term == SRP:
+            j = 3 * fm.sun_index
+            nu = shadow_fraction(x, y, z, pos_bodies[i, j], pos_bodies[i, j + 1], pos_bodies[i, j + 2], fm.R_e)
+            if nu > 0.0:
+                total += srp_acceleration(x, y, z, pos_bodies[i, j], pos_bodies[i, j + 1], pos_bodies[i, j + 2], nu, fm.C_R, fm.A, state[6])[0]
+        elif term == DRAG:
+            rho = atmos_interp(sc_heigth_radii(state[:3], fm.R_e, fm.R_p), fm.air_table)
+            total += drag_acceleration_bound(state[:3], state[3:6], rho, fm.C_D, fm.A, fm.mass0, fm.omega)[0]
+        elif term == THRUST:
+            throttle, u_x, u_y, u_z = steering_control(ets[i], state, fm.steering, fm.mu)
+            total += fm.thrust * throttle / state[6] / 1000 * u_x
+        elif term == INTAKE:
+            h = sc_heigth_radii(state[:3], fm.R_e, fm.R_p)
+            flux = intake_flux(state[:3], state[3:6], fm.omega, fm.A_eff)
+            intake_rates(h, atmos_interp(h, fm.air_table) * flux, flux, fm.air_table, fm.species, out)
+            total += out[INTAKE_IDX]
+        elif term == VARIATIONAL:
+            variational_rates(ets[i], state, pos_bodies[i], rots[i], fm, 1.0, out)
+            total += out[STM_IDX]
+
+    return total
+
+
+# Heights of the states and rotations to the body fixed frame at their epochs
+@njit
+def _heights(states:np.ndarray, R_e:float, R_p:float) -> np.ndarray:
+    heights = np.empty(states.shape[0])
+    for i in range(states.shape[0]):
+        heights[i] = sc_heigth_radii(states[i, :3], R_e, R_p)
+
+    return heights
+
+
+@njit
+def _rotations(ets:np.ndarray, fm:ForceModel) -> np.ndarray:
+    rots = np.empty((ets.size, 3, 3))
+    for i in range(ets.size):
+        rots[i] = body_rotation(ets[i], fm.gravity)
+
+    return rots
+
+
+def term_costs(fm:ForceModel, ets:np.ndarray, states:np.ndarray, repeat:int=5) -> dict:
+
+    """
+    Cost per call of the force terms of the kernel, evaluated on sampled states of a run.
+
+    Inputs:
+        fm: The force model of the run
+        ets: The epochs of the sampled states
+        states: The sampled states, with all the components of the run (intake, STM)
+        repeat: The best of this many timings is kept
+
+    Returns:
+        costs: For every term of TERMS present in the force model, its cost per call in seconds. The drag and the
+            intake are timed on the states inside the atmosphere
+    """
+
+    ets = np.ascontiguousarray(ets, dtype=np.float64)
+    states = np.ascontiguousarray(states, dtype=np.float64)
+    pos_bodies = ephemeris_positions(ets, fm.eph)
+    rots = _rotations(ets, fm)
+    out = np.zeros(states.shape[1])
+    inside = _heights(states, fm.R_e, fm.R_p) < fm.h_atmos
+
+    terms = [EPHEMERIS, ROTATION, CENTRAL, HARMONICS]
+    if fm.mu_bodies.size > 0:
+        terms.append(THIRD_BODY)
+    if fm.sun_index >= 0:
+        terms.append(SRP)
+    if fm.atmos:
+        terms.append(DRAG)
+    if fm.thrust != 0.0:
+        terms.append(THRUST)
+    if fm.atmos and states.shape[1] >= INTAKE_IDX + INTAKE_SIZE:
+        terms.append(INTAKE)
+    if states.shape[1] > STM_IDX:
+        terms.append(VARIATIONAL)
+
+    costs = {}
+    for term in terms:
+        idx = np.flatnonzero(inside) if term in (DRAG, INTAKE) and np.any(inside) else np.arange(ets.size)
+        args = (term, ets[idx], states[idx], pos_bodies[idx], rots[idx], fm, out)
+        _sample_term(*args) # Compile and warm up before timing
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _sample_term(*args)
+            best = min(best, time.perf_counter() - start)
+        costs[TERMS[term]] = best / idx.size
+
+    return costs
+
+
+# ------------PROBE----------------
+# Hits, misses and hit rate of a cache
+def _hit_rate(hits:int, misses:int) -> dict:
+    total = hits + misses
+    return {'hits': int(hits), 'misses': int(misses), 'hit_rate': hits / total if total else None}
+
+
+class RunProbe:
+
+    """
+    Records a run of propagate_phase, used as a context manager around it. The SPICE functions are counted while
+    it is open.
+
+    Inputs:
+        body: The body of the run, for the heights of the steps of the python acceleration
+        atmos_provider: (Optional) The atmosphere provider of the run, its stats are read if it has them
+        n_samples: The number of states of the run where the force terms are timed
+        band: The width of the altitude bands of the steps, in km
+    """
+
+    def __init__(self, body:str='Earth', atmos_provider=None, n_samples:int=1000, band:float=50.0):
+        self.body = body
+        self.atmos_provider = atmos_provider
+        self.n_samples = n_samples
+        self.band = band
+        self.sections = {}
+        self.section_spice = {}
+        self.spice = {}
+        self.run = None
+
+    def __enter__(self):
+        self._caches = self._cache_snapshot()
+        self._originals = {name: getattr(spice, name) for name in SPICE_FUNCTIONS}
+        for name, func in self._originals.items():
+            setattr(spice, name, self._counted(name, func))
+        self._start = self._last = time.perf_counter()
+        self._last_spice = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self._originals.items():
+            setattr(spice, name, func)
+        after = self._cache_snapshot()
+        self._caches = {key: (before, after[key]) for key, before in self._caches.items()}
+        return False
+
+    # SPICE function that counts its calls, its epochs and its time
+    def _counted(self, name:str, func:callable) -> callable:
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = self.spice.setdefault(name, {'calls': 0, 'epochs': 0, 'time': 0.0})
+                stats['calls'] += 1
+                stats['epochs'] += int(np.size(args[1])) if name in ('spkezr', 'spkpos') and len(args) > 1 else 1
+                stats['time'] += time.perf_counter() - start
+        return counted
+
+    def _cache_snapshot(self) -> dict:
+        snapshot = {'ephemeris': cache_stats()}
+        for name, func in (('atmos', get_atmos), ('air_table', get_air_table), ('species', get_species_log)):
+            info = func.cache_info()
+            snapshot[name] = {'hits': info.hits, 'misses': info.misses}
+        if hasattr(self.atmos_provider, 'stats'):
+            snapshot['atmos_provider'] = self.atmos_provider.stats()
+        return snapshot
+
+    def mark(self, section:str):
+
+        """
+        Ends a section of the run, its wall time and its SPICE time are the ones since the previous mark.
+        """
+
+        now = time.perf_counter()
+        spice_time = sum(stats['time'] for stats in self.spice.values())
+        self.sections[section] = self.sections.get(section, 0.0) + now - self._last
+        self.section_spice[section] = self.section_spice.get(section, 0.0) + spice_time - self._last_spice
+        self._last = now
+        self._last_spice = spice_time
+
+    def record(self, engine:str, t_hist:np.ndarray, state_hist:np.ndarray, n_steps:int, n_rejected:int, fm:ForceModel=None,
+               n_rhs:int=None, dt:float=None):
+
+        """
+        Records the result of the engine of the run.
+
+        Inputs:
+            engine: The engine of propagate_phase
+            t_hist, state_hist: The histories of the run, every step of the adaptive engines
+            n_steps, n_rejected: The accepted and rejected steps, None if the engine doesn't count them
+            fm: The force model of the compiled physics, with its counters. None with the python acceleration
+            n_rhs: The calls of the right-hand side counted by the engine, used without a force model
+            dt: The step of the fixed step engines, whose histories may be decimated
+        """
+
+        self.run = {'engine': engine, 't_hist': np.asarray(t_hist), 'state_hist': np.asarray(state_hist), 'n_steps': n_steps,
+                    'n_rejected': n_rejected, 'fm': fm, 'n_rhs': n_rhs, 'dt': dt}
+
+    def report(self) -> RunReport:
+
+        """
+        Builds the report of the run, after the probe is closed. It times the force terms on the sampled states.
+        """
+
+        run = self.run
+        if run is None:
+            raise ValueError("The probe did not record a run")
+        fm = run['fm']
+        t_hist = run['t_hist']
+        state_hist = run['state_hist']
+        engine = run['engine']
+
+        # Calls
+        if fm is not None:
+            rhs_calls = int(fm.counters[RHS_CALLS])
+            atmos_lookups = int(fm.counters[ATMOS_LOOKUPS])
+        else:
+            rhs_calls = run['n_rhs']
+            if self.atmos_provider is None:
+                before, after = self._caches['air_table']
+                atmos_lookups = after['hits'] - before['hits']
+            elif 'atmos_provider' in self._caches:
+                before, after = self._caches['atmos_provider']
+                atmos_lookups = after['hits'] + after['misses'] - before['hits'] - before['misses']
+            else:
+                atmos_lookups = None
+
+        caches = {}
+        for name, (before, after) in self._caches.items():
+            caches[name] = _hit_rate(after['hits'] - before['hits'], after['misses'] - before['misses'])
+        caches['ephemeris']['size'] = self._caches['ephemeris'][1]['size']
+
+        # Force terms, timed on states spread over the run
+        terms = {}
+        if fm is not None and len(t_hist) > 0:
+            idx = np.unique(np.linspace(0, len(t_hist) - 1, min(self.n_samples, len(t_hist))).astype(np.int64))
+            calls = {'drag': atmos_lookups, 'intake': atmos_lookups}
+            for name, cost in term_costs(fm, t_hist[idx], state_hist[idx]).items():
+                n_calls = calls.get(name, rhs_calls)
+                terms[name] = {'calls': n_calls, 'us_per_call': cost * 1e6, 'time': cost * n_calls}
+
+        # Steps by altitude, the fixed step engines take (t_hist[i + 1] - t_hist[i]) / dt steps between two outputs
+        if fm is not None:
+            R_e, R_p, h_atmos = fm.R_e, fm.R_p, fm.h_atmos
+        else:
+            R_e, R_p, h_atmos = getattr(bd, self.body).radius_equator, getattr(bd, self.body).radius_polar, 745.0
+        heights = _heights(np.ascontiguousarray(state_hist[:, :3], dtype=np.float64), R_e, R_p)[:-1]
+        steps = np.diff(t_hist)
+        counts = np.ones(steps.size)
+        if run['dt'] is not None:
+            counts = np.maximum(np.round(np.abs(steps) / run['dt']), 1)
+            steps = steps / counts
+        step_bands = _step_bands(heights, np.abs(steps), counts, self.band, h_atmos)
+        median_step = float(np.median(np.abs(steps))) if run['dt'] is None and steps.size else None
+
+        sections = dict(self.sections)
+        return RunReport(engine=engine, wall_time=sum(sections.values()), sections=sections, rhs_calls=rhs_calls,
+                         accepted_steps=run['n_steps'], rejected_steps=run['n_rejected'], atmos_lookups=atmos_lookups,
+                         terms=terms, spice={name: dict(stats) for name, stats in self.spice.items()}, caches=caches,
+                         step_bands=step_bands,
+                         diagnosis=_diagnose(engine, sections, self.section_spice, rhs_calls, run['n_steps'], run['n_rejected'],
+                                             terms, step_bands, median_step))
+
+
+# Steps binned by altitude, every band_width km up to the atmosphere and one band above it
+def _step_bands(heights:np.ndarray, steps:np.ndarray, counts:np.ndarray, band_width:float, h_atmos:float) -> list:
+    edges = np.arange(np.floor(min(np.min(heights, initial=h_atmos), h_atmos) / band_width) * band_width, h_atmos, band_width)
+    edges = np.append(edges, h_atmos)
+    bands = []
+    for k in range(edges.size):
+        h_min = edges[k]
+        h_max = edges[k + 1] if k + 1 < edges.size else None
+        inside = (heights >= h_min) & ((heights < h_max) if h_max is not None else True)
+        if not np.any(inside):
+            continue
+        bands.append({'h_min': float(h_min), 'h_max': None if h_max is None else float(h_max),
+                      'steps': int(np.sum(counts[inside])), 'time': float(np.sum(steps[inside] * counts[inside])),
+                      'median_step': float(np.median(steps[inside])), 'min_step': float(np.min(steps[inside]))})
+
+    return bands
+
+
+# Cause of the cost of a run: a band of collapsed steps, the overhead of the engine or the force terms
+def _diagnose(engine:str, sections:dict, section_spice:dict, rhs_calls:int, n_steps:int, n_rejected:int, terms:dict,
+              step_bands:list, median_step:float) -> dict:
+
+    engine_time = sections.get(engine, 0.0)
+    force_time = sum(term['time'] for term in terms.values())
+    spice_time = section_spice.get(engine, 0.0)
+    overhead = max(engine_time - force_time - spice_time, 0.0) if terms else None
+
+    # The band with the shortest steps against the median of all of them, the steps of the fixed step engines don't collapse
+    collapse = None
+    if median_step is not None and step_bands:
+        total = sum(band['steps'] for band in step_bands)
+        band = min(step_bands, key=lambda band: band['median_step'])
+        collapse = {'h_min': band['h_min'], 'h_max': band['h_max'], 'share': band['steps'] / total,
+                    'ratio': band['median_step'] / median_step if median_step > 0 else 1.0}
+
+    diagnosis = {'us_per_rhs': engine_time / rhs_calls * 1e6 if rhs_calls else None,
+                 'rejected_fraction': n_rejected / max(n_steps + n_rejected, 1) if n_rejected is not None and n_steps is not None else None,
+                 'force_fraction': force_time / engine_time if terms and engine_time > 0 else None,
+                 'spice_fraction': spice_time / engine_time if engine_time > 0 else None,
+                 'overhead_fraction': overhead / engine_time if overhead is not None and engine_time > 0 else None,
+                 'collapse_band': collapse}
+
+    if collapse is not None and collapse['ratio'] < COLLAPSE_RATIO and collapse['share'] >= COLLAPSE_SHARE:
+        where = (f"above {collapse['h_min']:.0f} km" if collapse['h_max'] is None
+                 else f"between {collapse['h_min']:.0f} and {collapse['h_max']:.0f} km")
+        diagnosis['cause'] = 'step_collapse'
+        diagnosis['detail'] = (f"{collapse['share']:.0%} of the steps are {where}, "
+                               f"with a median step {collapse['ratio']:.2f} times the one of the run")
+    elif not terms or (diagnosis['overhead_fraction'] or 0.0) > 0.5:
+        diagnosis['cause'] = 'overhead'
+        rejected = f"{diagnosis['rejected_fraction']:.0%} of the steps rejected, " if diagnosis['rejected_fraction'] is not None else ""
+        diagnosis['detail'] = (f"{diagnosis['us_per_rhs']:.2f} us per call of the right-hand side, {rejected}"
+                               f"{diagnosis['spice_fraction'] or 0.0:.0%} of the engine time in SPICE")
+    else:
+        largest = max(terms, key=lambda name: terms[name]['time'])
+        diagnosis['cause'] = 'force_terms'
+        diagnosis['detail'] = f"{diagnosis['force_fraction']:.0%} of the engine time in the force terms, most of it in {largest}"
+
+    return diagnosis
+
+
+# ------------PROFILED RUNS----------------
+def profile_phase(t_span:np.ndarray, acc_func:callable, state0:np.ndarray, n_samples:int=1000, band:float=50.0, **kwargs) -> tuple:
+
+    """
+    Runs propagate_phase with a RunProbe and builds its report.
+
+    Inputs:
+        t_span, acc_func, state0: As in propagate_phase
+        n_samples: The number of states where the force terms are timed
+        band: The width of the altitude bands of the steps, in km
+        kwargs: The other arguments of propagate_phase
+
+    Returns:
+        results: The results of propagate_phase
+        report: The RunReport of the run
+    """
+
+    probe = RunProbe(kwargs.get('body', 'Earth'), kwargs.get('atmos_provider'), n_samples, band)
+    with probe:
+        results = propagate_phase(t_span, acc_func, state0, probe=probe, **kwargs)
+
+    return results, probe.report()
+
+
+# ------------EXPORT----------------
+# Numpy scalars and arrays as plain JSON values
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def report_json(report:RunReport, path:str=None) -> str:
+
+    """
+    The report as JSON, also written to path if given.
+    """
+
+    text = json.dumps(report._asdict(), indent=2, default=_json_default)
+    if path is not None:
+        with open(path, 'w') as file:
+            file.write(text)
+
+    return text
+
+
+def report_folded(report:RunReport, path:str=None) -> str:
+
+    """
+    The report as folded stacks ('frame;frame;frame count' lines, counts in microseconds) for flamegraph.pl,
+    speedscope or inferno, also written to path if given. The engine is split in the force terms, SPICE and the
+    rest of it (integrator); the other sections in SPICE and the rest.
+    """
+
+    lines = []
+    add = lambda stack, seconds: lines.append(f"{stack} {int(round(seconds * 1e6))}") if seconds >= 0.5e-6 else None
+    spice_total = sum(stats['time'] for stats in report.spice.values())
+    spice_engine = (report.diagnosis['spice_fraction'] or 0.0) * report.sections.get(report.engine, 0.0)
+
+    for section, seconds in report.sections.items():
+        stack = f"propagate_phase;{section}"
+        if section == report.engine:
+            for name, term in report.terms.items():
+                add(f"{stack};rhs;{name}", term['time'])
+            add(f"{stack};spice", spice_engine)
+            rest = seconds - spice_engine - sum(term['time'] for term in report.terms.values())
+            add(f"{stack};integrator" if report.terms else stack, max(rest, 0.0))
+        else:
+            # SPICE outside of the engine is mostly the fits of the ephemerides in the setup
+            section_spice = min(spice_total - spice_engine, seconds) if section == 'setup' else 0.0
+            add(f"{stack};spice", section_spice)
+            add(stack, seconds - section_spice)
+
+    text = "\n".join(lines) + "\n"
+    if path is not None:
+        with open(path, 'w') as file:
+            file.write(text)
+
+    return text
+
+
+def report_summary(report:RunReport) -> str:
+
+    """
+    A few lines of text with the steps, the calls, the time of the force terms and the diagnosis of the run.
+    """
+
+    lines = [f"{report.engine}: {report.wall_time:.3f} s ("
+             + ", ".join(f"{name} {seconds:.3f} s" for name, seconds in report.sections.items()) + ")",
+             f"Steps: {report.accepted_steps} accepted, {report.rejected_steps} rejected, {report.rhs_calls} rhs calls, "
+             f"{report.atmos_lookups} atmosphere lookups"]
+    for name, term in sorted(report.terms.items(), key=lambda item: -item[1]['time']):
+        lines.append(f"  {name}: {term['us_per_call']:.3f} us per call, {term['time']:.3f} s")
+    for name, stats in report.spice.items():
+        lines.append(f"  spice.{name}: {stats['calls']} calls, {stats['epochs']} epochs, {stats['time']:.3f} s")
+    for band in report.step_bands:
+        where = f"{band['h_min']:.0f} - {band['h_max']:.0f} km" if band['h_max'] is not None else f"above {band['h_min']:.0f} km"
+        lines.append(f"  {where}: {band['steps']} steps, median {band['median_step']:.2f} s, "
+                     f"min {band['min_step']:.3f} s")
+    lines.append(f"Diagnosis: {report.diagnosis['cause']}, {report.diagnosis['detail']}")
+
+    return "\n".join(lines)
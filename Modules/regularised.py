@@ -0,0 +1,193 @@
+# Lucas Calderon
+# This file contains the Kustaanheimo-Stiefel (KS) regularised propagation with the Sundman time transformation.
+# The position is replaced by the 4 KS coordinates u and time by the fictitious time s, with dt = r ds. The Kepler
+# problem becomes a harmonic oscillator in s, so the steps are spread evenly around eccentric orbits instead of
+# piling up at periapsis. The perturbations are the ones of acceleration_kernel, everything but the point mass.
+# The KS state is y = [u (4), u' (4), h, t, m], where ' is d/ds and h = mu / r - v^2 / 2 is minus the Kepler energy.
+# The intake components of a state (intake.intake_state) follow m unchanged, integrated in s.
+
+import sys
+import os
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Modules.dynamics import ForceModel, acceleration_kernel
+from Modules.ephemeris import ephemeris_position
+from Modules.gravity import body_rotation
+from Modules.integrators import dop853, check_status
+from Modules.events import EventSet, evaluate_events, make_event_array
+
+
+# ------------CONVERSIONS----------------
+# KS matrix L(u), the position is L(u) u and the velocity 2 L(u) u' / r
+@njit
+def _ks_matrix(u):
+    return np.array([[u[0], -u[1], -u[2], u[3]],
+                     [u[1], u[0], -u[3], -u[2]],
+                     [u[2], u[3], u[0], u[1]],
+                     [u[3], -u[2], u[1], -u[0]]])
+
+
+# KS state of a cartesian state
+@njit
+def state_to_ks(state:np.ndarray, et:float, mu:float) -> np.ndarray:
+
+    """
+    Inputs:
+        state: The state of the spacecraft as a 7 element numpy array: [x, y, z, vx, vy, vz, m], and the
+            intake components if there are any
+        et: The epoch of the state
+        mu: The gravitational parameter of the central body (km^3/s^2)
+
+    Returns:
+        y: The KS state as a 11 element numpy array: [u, u', h, t, m], and the intake components
+    """
+
+    x = state[:3]
+    r = np.sqrt(np.sum(x**2))
+    u = np.zeros(4)
+    if x[0] >= 0:
+        u[0] = np.sqrt((r + x[0]) / 2)
+        u[1] = x[1] / (2 * u[0])
+        u[2] = x[2] / (2 * u[0])
+    else:
+        u[1] = np.sqrt((r - x[0]) / 2)
+        u[0] = x[1] / (2 * u[1])
+        u[3] = x[2] / (2 * u[1])
+
+    v4 = np.zeros(4)
+    v4[:3] = state[3:6]
+    y = np.empty(state.size + 4)
+    y[:4] = u
+    y[4:8] = 0.5 * _ks_matrix(u).T @ v4
+    y[8] = mu / r - np.sum(state[3:6]**2) / 2
+    y[9] = et
+    y[10:] = state[6:]
+
+    return y
+
+
+# Cartesian states of KS states
+@njit
+def ks_to_states(y:np.ndarray) -> np.ndarray:
+
+    """
+    Inputs:
+        y: The KS states as a N*11 numpy array: [u, u', h, t, m] * N, with the intake components after them
+
+    Returns:
+        states: The states as a N*7 numpy array: [x, y, z, vx, vy, vz, m] * N, with the intake components
+    """
+
+    states = np.empty((y.shape[0], y.shape[1] - 4))
+    for k in range(y.shape[0]):
+        L = _ks_matrix(y[k, :4])
+        r = np.sum(y[k, :4]**2)
+        states[k, :3] = (L @ y[k, :4])[:3]
+        states[k, 3:6] = (2 / r * (L @ y[k, 4:8]))[:3]
+        states[k, 6:] = y[k, 10:]
+
+    return states
+
+
+# ------------EQUATIONS OF MOTION----------------
+@njit
+def _ks_rhs(s:float, y:np.ndarray, args, out:np.ndarray):
+
+    """
+    Derivatives of the KS state with respect to the fictitious time s, with P the perturbing acceleration:
+        u'' = -h / 2 u + r / 2 L(u)^T P
+        h' = -2 u' . L(u)^T P
+        t' = r
+    args = (fm, event_set, t1)
+    """
+
+    fm = args[0]
+    u = y[:4]
+    du = y[4:8]
+    L = _ks_matrix(u)
+    r = np.sum(u**2)
+
+    state = np.empty(y.size - 4)
+    state_dot = np.empty(y.size - 4)
+    state[:3] = (L @ u)[:3]
+    state[3:6] = (2 / r * (L @ du))[:3]
+    state[6:] = y[10:]
+    acceleration_kernel(y[9], state, ephemeris_position(y[9], fm.eph), body_rotation(y[9], fm.gravity), fm, 1.0, state_dot)
+
+    P = np.zeros(4)
+    P[:3] = state_dot[3:6] + fm.mu / r**3 * state[:3]
+    LP = L.T @ P
+
+    out[:4] = du
+    out[4:8] = -y[8] / 2 * u + r / 2 * LP
+    out[8] = -2 * np.sum(du * LP)
+    out[9] = r
+    out[10:] = r * state_dot[6:]
+
+
+# Events: end of the phase in physical time (terminal) followed by the events of the event set
+@njit
+def _ks_events(s:float, y:np.ndarray, args, out:np.ndarray):
+    fm, event_set, t1 = args
+    u = y[:4]
+    L = _ks_matrix(u)
+    state = np.empty(7)
+    state[:3] = (L @ u)[:3]
+    state[3:6] = (2 / np.sum(u**2) * (L @ y[4:8]))[:3]
+    state[6] = y[10]
+    out[0] = y[9] - t1
+    evaluate_events(y[9], state, event_set, out[1:])
+
+
+# ------------PROPAGATION----------------
+def propagate_ks(t_span:np.ndarray, state0:np.ndarray, fm:ForceModel, event_set:EventSet, rtol:float=1e-9, atol:float=1e-9) -> tuple:
+
+    """
+    Propagates a phase in KS coordinates with the compiled DOP853 engine.
+
+    Inputs:
+        t_span: The time span of the phase, in et seconds
+        state0: The initial state as a 7 element numpy array: [x, y, z, vx, vy, vz, m], or with the intake
+            components of intake.intake_state after them
+        fm: The force model of the phase
+        event_set: The events of the phase (events.phase_event_set), the terminal ones stop the propagation
+        rtol, atol: The tolerances of the integration of the KS state
+    Returns:
+        t_hist: The history of the time of the simulation
+        states: The history of the states as a N*7 numpy array (or N*state0.size)
+        events: The events found, as a structured array of events.EVENT_DTYPE
+        n_steps: The number of accepted steps
+        n_rejected: The number of rejected steps
+        n_rhs: The number of evaluations of the right-hand side
+
+    Raises ValueError if the phase runs backward in time or if the step size collapses before its end.
+    """
+
+    # The fictitious time grows with t, so the end of the phase is only found forward
+    if t_span[1] < t_span[0]:
+        raise ValueError("The KS propagation only runs forward in time")
+
+    y0 = state_to_ks(np.asarray(state0, dtype=np.float64), float(t_span[0]), fm.mu)
+
+    # dt = r ds and r > R_p before the crash, so the phase ends before this fictitious time
+    s_max = (t_span[1] - t_span[0]) / fm.R_p * 1.01
+    args = (fm, event_set, float(t_span[1]))
+    terminal = np.concatenate(([True], event_set.terminal))
+    direction = np.concatenate(([1.0], event_set.direction))
+    restart = np.concatenate(([False], event_set.restart))
+    # The intake components aren't error controlled, they follow the steps of the KS state
+    _, y_hist, _, event_idx, event_y, n_steps, n_rejected, n_rhs, status = dop853(_ks_rhs, _ks_events, 0.0, s_max, y0, args,
+                                                                    terminal, direction, rtol, atol, restart=restart, n_err=11)
+
+    check_status(status, y_hist[-1, 9])
+
+    # Drop the end of the phase, the other events are shifted by one
+    found = event_idx > 0
+    event_y = event_y[found]
+    events = make_event_array(event_y[:, 9], event_idx[found] - 1, ks_to_states(event_y), event_set)
+
+    return y_hist[:, 9], ks_to_states(y_hist), events, n_steps, n_rejected, n_rhs
@@ -8,14 +8,26 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import numpy as np
 import scipy.integrate as spi
+from scipy.integrate._ivp import dop853_coefficients as DOP853
 from numba import njit
-from Modules.dynamics import acceleration
+from Modules.dynamics import ForceModel, acceleration, acceleration_compiled, acceleration_kernel, build_force_model
+from Modules.ephemeris import ephemeris_position
+from Modules.gravity import body_rotation
+from Modules.integrators import dop853, dense_eval, locate_event, hermite_coefficients, check_status
+from Modules.regularised import propagate_ks
+from Modules.events import EventSet, phase_event_set, phase_events, evaluate_events, make_event_array, scipy_events
+from Modules.intake import intake_state, flows_hist
+from Modules.steering import SteeringLaw, LYAPUNOV
+from Modules.variational import STM_IDX, variational_rates, variational_state, stm_hist
 from Config.spacecraft import spacecraft
 from Modules.helper import sc_heigth
 
 
 # Orbit propagator using scipy ODE solver: solve_ivp
-def propagate_phase(t_span:np.ndarray, acc_func:callable, state0:np.ndarray, body:str='Earth') -> tuple:
+def propagate_phase(t_span:np.ndarray, acc_func:callable, state0:np.ndarray, body:str='Earth', compiled:bool=False, sc=spacecraft, atmos_provider=None, verbose:bool=True,
+                    engine:str='LSODA', dt:float=10, decimation:int=1, events:EventSet=None, return_events:bool=False,
+                    intake:bool=False, stm:bool=False, steering:SteeringLaw=None, probe=None,
+                    force_model:dict=None) -> tuple:
 
     """
     This function propagates an orbit.
@@ -25,39 +37,121 @@ def propagate_phase(t_span:np.ndarray, acc_func:callable, state0:np.ndarray, bod
         acc_func: The acceleration function to use
         state0: The initial state of the spacecraft, a 7 member numpy array with the initial position, velocity and mass of the spacecraft
         body: The body that the spacecraft is orbiting initially
+        compiled: If True, acc_func is ignored and the compiled acceleration is used, with the constants
+            and the ephemeris of the perturbing body bound once for the whole phase
+        sc: The spacecraft named tuple used to build the compiled force model
+        atmos_provider: (Optional) An AtmosphereProvider passed to acc_func for the density, only with compiled=False.
+            A CachedProvider can be filled beforehand with atmos_provider.prefill_along_orbit
+        verbose: Print when the propagation starts and ends
+        engine: 'LSODA' for solve_ivp, 'DOP853' for the compiled adaptive engine, 'KS' for the same engine in
+            regularised coordinates (fewer steps on eccentric orbits), or 'RK4', 'Verlet' or 'RK8' for the compiled
+            fixed step engine run_simulation. The compiled engines always use the compiled physics
+        dt: The time step of the fixed step engines, in seconds
+        decimation: Store one of every this many steps of the fixed step engines
+        events: (Optional) The EventSet of the phase, by default events.phase_event_set(body, sc) with the crash at H_CRASH
+            and the eclipses. The terminal events (crash, SOI exit, mass depletion) stop the propagation and the
+            adaptive compiled engines end their steps at the eclipse boundaries
+        return_events: Also return the events found, as a structured array of events.EVENT_DTYPE
+        intake: Integrate the air and the species captured by the intake (sc.A_intake, sc.eff_in) with the state
+            and also return them. Only with the compiled physics
+        stm: Propagate the state transition matrix and the sensitivities to C_D, A, thrust and mass_flow_rate
+            with the state (variational.py) and also return them. Only with the DOP853 and fixed step engines
+        steering: (Optional) The SteeringLaw of the thrust (steering.py), by default along the velocity. Only with
+            the compiled physics, its switches are added to the default events
+        probe: (Optional) A profiling.RunProbe that records the wall time of the sections, the steps and the calls of
+            the run, see profiling.profile_phase. The force model then counts the calls of its kernel
+        force_model: (Optional) Options of dynamics.build_force_model for the phase, e.g. {'perturbers': (), 'degree': 8,
+            'order': 8, 'srp': False}. Only with the compiled physics
     Returns:
         pos_hist: The history of the positions of the spacecraft
         vel_hist: The history of the velocities of the spacecraft
         mass_hist: The history of the mass of the spacecraft
         t_hist: The history of the time of the simulation
+        events: Only if return_events, the events found
+        flows: Only if intake, the air and particles captured at every step (intake.flows_hist), for
+            Results.visualization.plot_atmos_data
+        stm_hist, sens_hist: Only if stm, the state transition matrices from state0 (N*7*7) and the sensitivities
+            to variational.PARAMS (N*7*4) at t_hist
 
     """
     # Print that the propagation is starting
-    print("Propagating orbit")
-
-    # --- Event functions ---
-
-    # Collision event (WORK IN PROGRESS, NEEDS TO BE GENERALIZED)
-    def collision_event(t, state):
-        R = 6371  # Earth's radius in meters
-        tolerance = 69  # Allow a buffer for a realistic height boundary
-        r = np.linalg.norm(state[:3])
-        return r - (R + tolerance)
-
-    collision_event.terminal = True
-    collision_event.direction = 0
-
-    # SOI event (WORK IN PROGRESS)
-    def SOI_event(t, state):
-
-        pass
-
-    # Define the events
-    events = [collision_event]
-
-
-    # Solve ODE: dv/dt = a, dx/dt = v
-    sol = spi.solve_ivp(acc_func, t_span, state0, method='LSODA', rtol=1e-9, atol=1e-9, events=events)
+    if verbose:
+        print("Propagating orbit")
+
+    # Events of the phase
+    event_set = phase_event_set(body, sc, H_CRASH, t_span=t_span, steering=steering) if events is None else events
+
+    # Bind the force model once for the phase
+    if compiled and atmos_provider is not None:
+        raise ValueError("The atmosphere providers are only supported by the python acceleration")
+    if steering is not None and not compiled and engine == 'LSODA':
+        raise ValueError("The steering laws are only supported by the compiled physics")
+    if force_model is not None and not compiled and engine == 'LSODA':
+        raise ValueError("The force model options are only supported by the compiled physics")
+
+    if intake:
+        if not compiled and engine == 'LSODA':
+            raise ValueError("The intake is only integrated with the compiled physics")
+        state0 = intake_state(state0)
+
+    if stm:
+        if engine in ('LSODA', 'KS'):
+            raise ValueError("The STM is only propagated by the DOP853 and fixed step engines")
+        if sc.air_breathing:
+            raise ValueError("The sensitivities of the air-breathing thrust are not modelled")
+        if steering is not None and steering.kind == LYAPUNOV:
+            raise ValueError("The sensitivities of the Lyapunov feedback are not modelled")
+        state0 = variational_state(state0)
+
+    if atmos_provider is not None:
+        python_acc_func = acc_func
+        acc_func = lambda t, state: python_acc_func(t, state, body, atmos_provider=atmos_provider)
+
+    if engine != 'LSODA':
+        if atmos_provider is not None:
+            raise ValueError("The compiled engines only support the compiled acceleration")
+
+        state0 = np.asarray(state0, dtype=np.float64)
+        fm = build_force_model(t_span, body, sc, states0=state0, steering=steering, profile=probe is not None, **(force_model or {}))
+        if probe is not None:
+            probe.mark('setup')
+        if engine == 'KS':
+            t_hist, state_hist, found, n_steps, n_rejected, _ = propagate_ks(t_span, state0, fm, event_set)
+        else:
+            t_hist, state_hist, event_t, event_idx, event_y, n_steps, n_rejected = run_engine(t_span, state0, fm, event_set, engine, dt,
+                                                                                             decimation, return_stats=True)
+            found = make_event_array(event_t, event_idx, event_y, event_set)
+        if probe is not None:
+            probe.mark(engine)
+            probe.record(engine, t_hist, state_hist, n_steps, n_rejected, fm=fm, dt=dt if engine in ('RK4', 'Verlet', 'RK8') else None)
+        if verbose:
+            print("Propagation finished")
+
+        results = (t_hist, state_hist[:, :3], state_hist[:, 3:6], state_hist[:, 6])
+        if return_events:
+            results += (found,)
+        if intake:
+            results += (flows_hist(state_hist, sc.name),)
+        if stm:
+            results += stm_hist(state_hist)
+        if probe is not None:
+            probe.mark('output')
+        return results
+
+    fm = None
+    if compiled:
+        fm = build_force_model(t_span, body, sc, states0=state0, steering=steering, profile=probe is not None, **(force_model or {}))
+        acc_func = lambda t, state: acceleration_compiled(t, state, fm)
+    if probe is not None:
+        probe.mark('setup')
+
+    # Solve ODE: dv/dt = a, dx/dt = v. The intake components are left out of the error control
+    atol = np.full(len(state0), 1e-9)
+    atol[7:] = np.inf
+    sol = spi.solve_ivp(acc_func, t_span, state0, method='LSODA', rtol=1e-9, atol=atol, events=scipy_events(event_set))
+    if probe is not None:
+        probe.mark(engine)
+        probe.record(engine, sol.t, sol.y.T, len(sol.t) - 1, None, fm=fm, n_rhs=sol.nfev)
 
     # Extract the results
     t_hist = sol.t
@@ -66,111 +160,239 @@ def propagate_phase(t_span:np.ndarray, acc_func:callable, state0:np.ndarray, bod
     mass_hist = sol.y[6]
 
     # Print end
-    print("Propagation finished")
-    
-    return t_hist.T, pos_hist.T, vel_hist.T, mass_hist.T
+    if verbose:
+        print("Propagation finished")
 
+    results = (t_hist.T, pos_hist.T, vel_hist.T, mass_hist.T)
+    if return_events:
+        event_idx = np.concatenate([np.full(len(t), i) for i, t in enumerate(sol.t_events)]).astype(np.int64)
+        event_t = np.concatenate(sol.t_events)
+        event_y = np.concatenate([np.reshape(y, (-1, len(state0))) for y in sol.y_events])
+        order = np.argsort(event_t, kind='stable')
+        results += (make_event_array(event_t[order], event_idx[order], event_y[order], event_set),)
+    if intake:
+        results += (flows_hist(sol.y.T, sc.name),)
+    if probe is not None:
+        probe.mark('output')
+
+    return results
+
+
+# Compiled engine of propagate_phase, without the packing of its results
+def run_engine(t_span:np.ndarray, state0:np.ndarray, fm:ForceModel, event_set:EventSet, engine:str='DOP853', dt:float=10,
+               decimation:int=1, rtol:float=1e-9, atol:float=1e-9, return_stats:bool=False) -> tuple:
 
-# Numba compatible propagation function (OLD, NOT SUPPORTED ANYMORE)
-@njit
-def run_simulation(n_max: int, dt:float, Method:str = "RK4"):
     """
-    This function runs the simulation.
+    Runs the DOP853 or a fixed step engine on a phase with a force model that is already built.
 
     Inputs:
-        dt = 1: The time step of the simulation
-        n_max = 1000: The maximum number of time steps of the simulation
-        Method = "RK4": The method to use to run the simulation. Currently only RK4 is supported, but more methods can be added in the future.
+        t_span, state0, engine, dt, decimation: As in propagate_phase, state0 may have the intake and STM components
+        fm: The force model of the phase
+        event_set: The events of the phase
+        rtol, atol: The tolerances of DOP853
+        return_stats: Also return the number of accepted and rejected steps
+
+    Raises ValueError if the step size of DOP853 collapses before the end of the phase.
+
     Returns:
-        pos_hist: THe history of the positions of the spacecraft
-        vel_hist: The history of the velocities of the spacecraft
-        acc_hist: The history of the accelerations of the spacecraft
-        flows_hist: The history of the composition of the air captured by the spacecraft
-        atmos_time: The time that the spacecraft has been in the atmosphere
-    
+        t_hist: The history of the time of the simulation
+        state_hist: The history of the states, with all the components of state0
+        event_t, event_idx: The times of the events found and their index in event_set
+        event_y: The states at event_t, with all the components of state0
+        n_steps, n_rejected: Only if return_stats, the accepted and rejected steps (none with a fixed step)
     """
 
-    # Create lists
-    pos_hist = np.zeros((n_max, 3)) # Ordered in the following way: [x, y, z]
-    vel_hist = np.zeros((n_max, 3)) # Ordered in the following way: [v_x, v_y, v_z]
-    acc_hist = np.zeros((n_max, 3)) # Ordered in the following way: [a_x, a_y, a_z]
-    flows_hist = np.zeros((n_max, 8)) # This is the composition of the air captured by the spacecraft, ordered in the following way: [air_mass, O_num, N2_num, O2_num, He_num, Ar_num, H_num, N_num]
-    atmos_time = 0
+    state0 = np.asarray(state0, dtype=np.float64)
+    if engine == 'DOP853':
+        results = dop853(_phase_rhs, phase_events, float(t_span[0]), float(t_span[1]), state0, (fm, event_set),
+                         event_set.terminal, event_set.direction, rtol, atol, restart=event_set.restart, n_err=7)
+        check_status(results[8], results[0][-1])
+        return results[:7] if return_stats else results[:5]
 
-    # Apply initial conditions
-    pos_hist[0] = spacecraft.initial_position
-    vel_hist[0] = spacecraft.initial_velocity
+    results = run_simulation(float(t_span[0]), float(t_span[1]), float(dt), state0, fm, event_set, engine, int(decimation))
+    if return_stats:
+        # Steps taken up to the end of the span or the terminal event, with the step adjusted by run_simulation
+        n_span = max(int(np.ceil((t_span[1] - t_span[0]) / dt)), 1)
+        results += (int(np.ceil((results[0][-1] - t_span[0]) / (t_span[1] - t_span[0]) * n_span - 1e-6)), 0)
 
-    # Run the simulation
-    if Method == "euler": # Simple euler implementation
-        for i in range(1, n_max):
-
-            acc = acceleration(pos_hist[i-1], vel_hist[i-1])
-            acc_hist[i] = acc
-
-            vel_hist[i] = vel_hist[i-1] + acc * dt
-            pos_hist[i] = pos_hist[i-1] + vel_hist[i] * dt
-
-    elif Method == "RK4":
-        for i in range(1, n_max):
-            # RK4 for velocity
-            k1_v = acceleration(pos_hist[i-1], vel_hist[i-1])
-            k2_v = acceleration(pos_hist[i-1] + vel_hist[i-1] * dt / 2, vel_hist[i-1] + k1_v * dt / 2)
-            k3_v = acceleration(pos_hist[i-1] + vel_hist[i-1] * dt / 2, vel_hist[i-1] + k2_v * dt / 2)
-            k4_v = acceleration(pos_hist[i-1] + vel_hist[i-1] * dt, vel_hist[i-1] + k3_v * dt)
-
-            acc_hist[i] = k1_v
-            vel_hist[i] = vel_hist[i-1] + (k1_v + 2*k2_v + 2*k3_v + k4_v) / 6 * dt
-
-            # RK4 for position
-            k1_r = vel_hist[i-1]
-            k2_r = vel_hist[i-1] + k1_v * dt / 2
-            k3_r = vel_hist[i-1] + k2_v * dt / 2
-            k4_r = vel_hist[i-1] + k3_v * dt
-
-            pos_hist[i] = pos_hist[i-1] + (k1_r + 2*k2_r + 2*k3_r + k4_r) / 6 * dt
-            
-            if sc_heigth(pos_hist[i]) < 745:
-                atmos_time += dt
-                # Calculate the composition of the air captured by the spacecraft
-                flows_hist[i] = [0, 0, 0, 0, 0, 0, 0, 0] # This is a placeholder for now
-                
-                # Check for crash
-                if sc_heigth(pos_hist[i]) < 69: # Check for unrealistic values
-                    print("The spacecraft has crashed")
-
-                    # Trim the ourput arrays
-                    pos_hist = pos_hist[:i]
-                    vel_hist = vel_hist[:i]
-                    acc_hist = acc_hist[:i]
-                    flows_hist = flows_hist[:i]
-
-                    break
-
-    elif Method == "Verlet":
-        # Initial updates
-        a0 = acceleration(pos_hist[0], vel_hist[0])
-        pos_hist[1] = pos_hist[0] + vel_hist[0] * dt + 0.5 * a0 * dt**2
-        a1 = acceleration(pos_hist[1], vel_hist[0])
-        vel_hist[1] = vel_hist[0] + 0.5 * (a0 + a1) * dt
-        
-        for i in range(1, n_max - 1):
-            # Verlet for position
-            pos_hist[i + 1] = pos_hist[i] + vel_hist[i] * dt + 0.5 * a1 * dt**2
-            
-            # Update acceleration at new position
-            a2 = acceleration(pos_hist[i + 1], vel_hist[i])
-            
-            # Verlet for velocity
-            vel_hist[i + 1] = vel_hist[i] + 0.5 * (a1 + a2) * dt
-            
-            # Update previous acceleration for the next step
-            a1 = a2
+    return results
+
+
+# ------------COMPILED ENGINES----------------
+# Height of the crash, in km
+H_CRASH = 69.0
+# Butcher tableau of the 8th order solution of Dormand-Prince 8(5,3), used as a fixed step RK8
+RK8_A = np.ascontiguousarray(DOP853.A[:DOP853.N_STAGES, :DOP853.N_STAGES])
+RK8_B = np.ascontiguousarray(DOP853.B)
+RK8_C = np.ascontiguousarray(DOP853.C[:DOP853.N_STAGES])
+
+
+# Right-hand side of the compiled engines, writes the derivative in out. The variational equations are added when y
+# has the STM
+@njit
+def _rhs(t:float, y:np.ndarray, fm:ForceModel, out:np.ndarray):
+    pos_bodies = ephemeris_position(t, fm.eph)
+    rot = body_rotation(t, fm.gravity)
+    acceleration_kernel(t, y, pos_bodies, rot, fm, 1.0, out)
+    if y.size > STM_IDX:
+        variational_rates(t, y, pos_bodies, rot, fm, 1.0, out)
+
+
+# Right-hand side with the arguments of the engines with events, args = (fm, event_set)
+@njit
+def _phase_rhs(t:float, y:np.ndarray, args, out:np.ndarray):
+    _rhs(t, y, args[0], out)
+
+
+# One step of the selected scheme, writes the new state in y_new
+@njit
+def _fixed_step(t:float, y:np.ndarray, dt:float, method:str, fm:ForceModel, k:np.ndarray, y_tmp:np.ndarray, y_new:np.ndarray):
+
+    if method == "RK4":
+        _rhs(t, y, fm, k[0])
+        y_tmp[:] = y + 0.5 * dt * k[0]
+        _rhs(t + 0.5 * dt, y_tmp, fm, k[1])
+        y_tmp[:] = y + 0.5 * dt * k[1]
+        _rhs(t + 0.5 * dt, y_tmp, fm, k[2])
+        y_tmp[:] = y + dt * k[2]
+        _rhs(t + dt, y_tmp, fm, k[3])
+        y_new[:] = y + dt / 6 * (k[0] + 2 * k[1] + 2 * k[2] + k[3])
+
+    elif method == "Verlet":
+        # Velocity Verlet, the velocity dependent forces (drag, thrust) are evaluated with a predicted velocity.
+        # The mass and the intake components use the trapezoidal rule
+        _rhs(t, y, fm, k[0])
+        y_tmp[:3] = y[:3] + y[3:6] * dt + 0.5 * k[0, 3:6] * dt**2
+        y_tmp[3:6] = y[3:6] + k[0, 3:6] * dt
+        y_tmp[6:] = y[6:] + k[0, 6:] * dt
+        _rhs(t + dt, y_tmp, fm, k[1])
+        y_new[:3] = y_tmp[:3]
+        y_new[3:] = y[3:] + 0.5 * (k[0, 3:] + k[1, 3:]) * dt
+
+    elif method == "RK8":
+        for i in range(RK8_B.shape[0]):
+            y_tmp[:] = y
+            for j in range(i):
+                y_tmp += dt * RK8_A[i, j] * k[j]
+            _rhs(t + RK8_C[i] * dt, y_tmp, fm, k[i])
+        y_new[:] = y
+        for i in range(RK8_B.shape[0]):
+            y_new += dt * RK8_B[i] * k[i]
 
     else:
         raise ValueError("Method must be a valid entry")
 
 
-    return pos_hist, vel_hist, acc_hist, flows_hist, atmos_time
+# Numba compatible propagation function
+@njit
+def run_simulation(t0:float, t1:float, dt:float, state0:np.ndarray, fm:ForceModel, event_set:EventSet, method:str = "RK4",
+                   decimation:int = 1, max_events:int = 100000):
+    """
+    This function runs the simulation with a fixed step and the same physics as acceleration_compiled.
 
+    Inputs:
+        t0, t1: The initial and final time of the simulation, in et seconds
+        dt: The time step of the simulation, adjusted down so the span is an integer number of steps
+        state0: The initial state of the spacecraft as a 7 element numpy array: [x, y, z, vx, vy, vz, m], or with
+            the intake components of intake.intake_state after them (and the STM of variational.variational_state)
+        fm: The force model of the phase, from build_force_model
+        event_set: The events of the phase, from events.phase_event_set. They are bracketed every step
+            and their roots polished on the cubic Hermite interpolant of the step
+        method = "RK4": The method to use to run the simulation: "RK4", "Verlet" (velocity Verlet) or "RK8"
+        decimation = 1: Store one of every this many steps in the history
+        max_events = 100000: The maximum number of events that are recorded
+    Returns:
+        t_hist: The history of the time of the simulation, the last one is t1 or the time of a terminal event
+        state_hist: The history of the states of the spacecraft, as a N*7 numpy array (or N*state0.size)
+        event_t: The times of the events found, in chronological order
+        event_idx: The index in event_set of every event found
+        event_y: The states at event_t
+
+    """
 
+    n_steps = max(int(np.ceil((t1 - t0) / dt)), 1)
+    dt = (t1 - t0) / n_steps
+    decimation = max(decimation, 1)
+    args = (fm, event_set)
+    n_events = event_set.kind.size
+
+    # Preallocated histories and buffers
+    n_hist = n_steps // decimation + 2
+    t_hist = np.empty(n_hist)
+    n = state0.size
+    state_hist = np.empty((n_hist, n))
+    event_t = np.empty(max_events)
+    event_idx = np.empty(max_events, dtype=np.int64)
+    event_y = np.empty((max_events, n))
+    k = np.empty((RK8_B.shape[0], n))
+    y = state0.astype(np.float64).copy()
+    y_tmp = np.empty(n)
+    y_new = np.empty(n)
+    f_new = np.empty(n)
+    F = np.empty((7, n))
+    g_old = np.empty(n_events)
+    g_new = np.empty(n_events)
+    g_tmp = np.empty(n_events)
+    roots = np.empty(n_events)
+
+    # Apply initial conditions
+    t_hist[0] = t0
+    state_hist[0] = y
+    j = 1
+    n_found = 0
+    evaluate_events(t0, y, event_set, g_old)
+
+    # Run the simulation
+    for i in range(1, n_steps + 1):
+        t = t0 + (i - 1) * dt
+        _fixed_step(t, y, dt, method, fm, k, y_tmp, y_new)
+
+        # Bracket the events of the step and polish their roots, k[0] is the derivative at the start of the step
+        evaluate_events(t + dt, y_new, event_set, g_new)
+        n_roots = 0
+        for e in range(n_events):
+            up = g_old[e] < 0 and g_new[e] >= 0
+            down = g_old[e] > 0 and g_new[e] <= 0
+            if (up and event_set.direction[e] >= 0) or (down and event_set.direction[e] <= 0):
+                if n_roots == 0:
+                    _rhs(t + dt, y_new, fm, f_new)
+                    hermite_coefficients(y, k[0], y_new, f_new, dt, F)
+                roots[e] = locate_event(phase_events, e, t, g_old[e], t + dt, g_new[e], t, dt, y, F, args, y_tmp, g_tmp)
+                n_roots += 1
+            else:
+                roots[e] = np.nan
+
+        # Record them in chronological order, up to the first terminal one
+        terminated = False
+        while n_roots > 0:
+            first = -1
+            for e in range(n_events):
+                if not np.isnan(roots[e]) and (first < 0 or roots[e] < roots[first]):
+                    first = e
+            t_root = roots[first]
+            if n_found < max_events:
+                event_t[n_found] = t_root
+                event_idx[n_found] = first
+                dense_eval(t_root, t, dt, y, F, event_y[n_found])
+                n_found += 1
+            roots[first] = np.nan
+            n_roots -= 1
+
+            if event_set.terminal[first]:
+                t_hist[j] = t_root
+                dense_eval(t_root, t, dt, y, F, state_hist[j])
+                j += 1
+                terminated = True
+                break
+
+        if terminated:
+            break
+
+        y[:] = y_new
+        g_old[:] = g_new
+        if i % decimation == 0 or i == n_steps:
+            t_hist[j] = t + dt
+            state_hist[j] = y
+            j += 1
+
+    return t_hist[:j], state_hist[:j], event_t[:n_found], event_idx[:n_found], event_y[:n_found]
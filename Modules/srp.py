@@ -0,0 +1,133 @@
+# Lucas Calderon
+# This file contains the solar radiation pressure and the eclipses of the spacecraft by the central body.
+# The shadow is conical: the Sun and the body are seen as discs and the illuminated fraction is the part of
+# the solar disc that the body doesn't cover, so the penumbra is included. The Sun positions come from the
+# cached Chebyshev ephemerides, never from SPICE during the propagation.
+
+import sys
+import os
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Modules.ephemeris import ChebEphemeris, get_ephemeris, ephemeris_position
+
+# Solar constants
+R_SUN = 695700.0 # km, nominal solar radius
+AU = 1.495978707e8 # km
+P_SUN = 4.56e-6 # N/m^2, radiation pressure at 1 AU on an absorbing surface
+
+
+# ------------SHADOW (NUMBA COMPATIBLE)----------------
+# Apparent radii of the Sun and the body and their apparent separation seen from the spacecraft, in rad.
+# The spacecraft is at (x, y, z) and the Sun at (s_x, s_y, s_z), both wrt the body
+@njit
+def shadow_angles(x:float, y:float, z:float, s_x:float, s_y:float, s_z:float, R_body:float) -> tuple:
+    d_x = s_x - x
+    d_y = s_y - y
+    d_z = s_z - z
+    d = np.sqrt(d_x**2 + d_y**2 + d_z**2)
+    r = np.sqrt(x**2 + y**2 + z**2)
+    a = np.arcsin(min(R_SUN / d, 1.0))
+    b = np.arcsin(min(R_body / r, 1.0))
+    cos_c = -(x * d_x + y * d_y + z * d_z) / (r * d)
+    c = np.arccos(min(max(cos_c, -1.0), 1.0))
+
+    return a, b, c
+
+
+@njit
+def shadow_fraction(x:float, y:float, z:float, s_x:float, s_y:float, s_z:float, R_body:float) -> float:
+
+    """
+    Illuminated fraction of the solar disc seen from the spacecraft, conical shadow model.
+
+    Inputs:
+        x, y, z: The position of the spacecraft wrt the body, in km
+        s_x, s_y, s_z: The position of the Sun wrt the body, in km
+        R_body: The radius of the body, in km
+
+    Returns:
+        nu: 1 in sunlight, 0 in the umbra, in between in the penumbra (or an annular eclipse)
+    """
+
+    a, b, c = shadow_angles(x, y, z, s_x, s_y, s_z, R_body)
+
+    if c >= a + b:
+        return 1.0 # No overlap of the discs
+    if c <= b - a:
+        return 0.0 # Umbra, the body covers the whole Sun
+    if c <= a - b:
+        return 1.0 - b**2 / a**2 # Annular, the whole body in front of the Sun
+
+    # Partial overlap of the two discs, u is the distance from the centre of the Sun to the chord of the overlap and
+    # v its half length. Factored differences and atan2 keep the digits near the edges, where the arccos lose them
+    u = ((c - b) * (c + b) + a**2) / (2 * c)
+    v = np.sqrt(max((a - u) * (a + u), 0.0))
+    area = a**2 * np.arctan2(v, u) + b**2 * np.arctan2(v, c - u) - c * v
+
+    return 1.0 - area / (np.pi * a**2)
+
+
+@njit
+def srp_acceleration(x:float, y:float, z:float, s_x:float, s_y:float, s_z:float, nu:float, C_R:float, A:float, mass:float) -> tuple:
+
+    """
+    Solar radiation pressure on a cannonball spacecraft, directed away from the Sun.
+
+    Inputs:
+        x, y, z: The position of the spacecraft wrt the body, in km
+        s_x, s_y, s_z: The position of the Sun wrt the body, in km
+        nu: The illuminated fraction, from shadow_fraction
+        C_R: The reflectivity coefficient, 1 for a black body and 2 for a mirror facing the Sun
+        A: The area facing the Sun, in m^2
+        mass: The mass of the spacecraft, in kg
+
+    Returns:
+        ax, ay, az: The acceleration, in km/s^2
+    """
+
+    d_x = x - s_x
+    d_y = y - s_y
+    d_z = z - s_z
+    d = np.sqrt(d_x**2 + d_y**2 + d_z**2)
+    k = nu * P_SUN * (AU / d)**2 * C_R * A / mass / 1000 / d # in km/s^2, divided by the distance to the Sun
+
+    return k * d_x, k * d_y, k * d_z
+
+
+# ------------BATCHED SHADOW----------------
+# Illuminated fractions along a trajectory, one Sun position per epoch from the cached ephemeris
+@njit
+def _shadow_batch(ets:np.ndarray, positions:np.ndarray, eph:ChebEphemeris, R_body:float) -> np.ndarray:
+    nu = np.empty(len(ets))
+    for i in range(len(ets)):
+        sun = ephemeris_position(ets[i], eph)
+        nu[i] = shadow_fraction(positions[i, 0], positions[i, 1], positions[i, 2], sun[0], sun[1], sun[2], R_body)
+
+    return nu
+
+
+def illumination(ets:np.ndarray, positions:np.ndarray, body:str='Earth', eph_tol:float=1e-3) -> np.ndarray:
+
+    """
+    Illuminated fraction of the Sun along a whole trajectory at once, for the power and thermal post-processing.
+
+    Inputs:
+        ets: The epochs of the trajectory, in et seconds
+        positions: The positions of the spacecraft wrt the body at ets, as a N*3 numpy array in km
+        body: The celestial body that the spacecraft is orbiting
+        eph_tol: The maximum position error of the cached ephemeris of the Sun, in km
+
+    Returns:
+        nu: The illuminated fraction at every epoch, 1 in sunlight and 0 in the umbra
+    """
+
+    ets = np.ascontiguousarray(ets, dtype=np.float64)
+    positions = np.ascontiguousarray(positions, dtype=np.float64)
+    eph = get_ephemeris('SUN', body, np.array([ets.min(), ets.max()]), tol=eph_tol)
+
+    return _shadow_batch(ets, positions, eph, float(getattr(bd, body).radius_equator))
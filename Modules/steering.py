@@ -0,0 +1,231 @@
+# Lucas Calderon
+# This file contains the steering laws of the thruster, evaluated inside the compiled physics from the parameters
+# bound in the force model, so a control law costs the same as the fixed thrust along the velocity:
+#   - Along the velocity (orbit raising, drag compensation) or against it (lowering)
+#   - Lyapunov feedback on the orbital elements: the thrust points where the weighted distance to the target
+#     elements decreases the fastest, from the Gauss variational equations
+#   - A throttle schedule, piecewise constant in time
+#   - A duty cycle that only thrusts on an arc around the periapsis or the apoapsis
+# The switches of the schedule and of the duty cycle are events of the compiled engines (events.py), so the
+# adaptive steps end on them instead of crossing the jumps of the thrust.
+
+import sys
+import os
+from collections import namedtuple
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+
+# Kinds of steering laws
+TANGENT = 0
+ANTI_TANGENT = 1
+LYAPUNOV = 2
+STEERING_KINDS = {'tangent': TANGENT, 'anti_tangent': ANTI_TANGENT, 'lyapunov': LYAPUNOV}
+
+# Arcs of the duty cycles
+ALWAYS = 0
+PERIAPSIS_ARC = 1
+APOAPSIS_ARC = -1
+
+# Elements of the Lyapunov feedback, named as the orbit inputs: heights of the apsides in km and angles in degrees
+ELEMENTS = ('Periapsis', 'Apoapsis', 'Inclination', 'Rigth_Ascension_node', 'Argument_periapsis')
+
+# Parameters of a steering law:
+#   kind: TANGENT, ANTI_TANGENT or LYAPUNOV
+#   times: The epochs of the switches of the throttle schedule, increasing
+#   throttles: The throttle before the first switch and after every one of them, times.size + 1 elements in [0, 1]
+#   duty: ALWAYS, PERIAPSIS_ARC or APOAPSIS_ARC
+#   duty_cos: The cosine of half the width of the thrust arc
+#   target: The target elements of the Lyapunov feedback: radii of the apsides in km and angles in radians
+#   weights: The weights of the elements, 0 leaves an element free
+#   tol: The weighted distance to the target (km and degrees) under which the throttle ramps down to 0. It is the gain
+#       of the feedback near the target: a small tolerance holds the target tighter with shorter steps
+SteeringLaw = namedtuple('SteeringLaw', ['kind', 'times', 'throttles', 'duty', 'duty_cos', 'target', 'weights', 'tol'])
+
+
+# ------------LAWS----------------
+def steering_law(kind:str='tangent', schedule:list=None, duty:str=None, duty_width:float=180.0, target:dict=None,
+                 weights:dict=None, tol:float=10.0, body:str='Earth') -> SteeringLaw:
+
+    """
+    Builds the parameters of a steering law for build_force_model. The default is the thrust along the velocity,
+    always on, as without a steering law.
+
+    Inputs:
+        kind: 'tangent', 'anti_tangent' or 'lyapunov'
+        schedule: (Optional) The throttle schedule, a list of (et, throttle) switches. The throttle is 1 before the first one
+        duty: None to always thrust, 'periapsis' or 'apoapsis' to thrust only on an arc centred on the apsis
+        duty_width: The width of the thrust arc in true anomaly, in degrees
+        target: The target elements of the Lyapunov feedback, a dictionary with some of ELEMENTS
+        weights: (Optional) The weights of the target elements, 1 by default
+        tol: The weighted distance to the target, in km and degrees, under which the thrust ramps down. Below a few
+            km the feedback chatters around the target and the adaptive engine takes steps of seconds
+        body: The body of the orbit, for the radii of the apsides
+
+    Returns:
+        law: The SteeringLaw named tuple
+    """
+
+    if kind not in STEERING_KINDS:
+        raise ValueError(f"Unknown steering law '{kind}'")
+    if kind == 'lyapunov' and not target:
+        raise ValueError("The Lyapunov feedback needs target elements")
+    if duty not in (None, 'periapsis', 'apoapsis'):
+        raise ValueError(f"Unknown duty cycle '{duty}'")
+    if tol <= 0:
+        raise ValueError("The tolerance of the Lyapunov feedback must be positive")
+
+    schedule = sorted(schedule or [])
+    times = np.array([switch[0] for switch in schedule], dtype=np.float64)
+    throttles = np.array([1.0] + [switch[1] for switch in schedule], dtype=np.float64)
+    if np.any(throttles < 0) or np.any(throttles > 1):
+        raise ValueError("The throttles must be between 0 and 1")
+
+    # Radii of the apsides and angles in radians
+    target = target or {}
+    weights = weights or {}
+    R_e = getattr(bd, body).radius_equator
+    target_arr = np.zeros(len(ELEMENTS))
+    weight_arr = np.zeros(len(ELEMENTS))
+    for j, name in enumerate(ELEMENTS):
+        if name in target:
+            target_arr[j] = target[name] + R_e if j < 2 else np.radians(target[name])
+            weight_arr[j] = weights.get(name, 1.0)
+        elif name in weights:
+            raise ValueError(f"'{name}' has a weight but no target")
+
+    return SteeringLaw(kind=STEERING_KINDS[kind], times=times, throttles=throttles,
+                       duty={None: ALWAYS, 'periapsis': PERIAPSIS_ARC, 'apoapsis': APOAPSIS_ARC}[duty],
+                       duty_cos=float(np.cos(np.radians(duty_width) / 2)), target=target_arr, weights=weight_arr, tol=float(tol))
+
+
+# ------------CONTROL (NUMBA COMPATIBLE)----------------
+# Cosine of the true anomaly, 1 on circular orbits
+@njit
+def cos_true_anomaly(state:np.ndarray, mu:float) -> float:
+    x, y, z, v_x, v_y, v_z = state[0], state[1], state[2], state[3], state[4], state[5]
+    r = np.sqrt(x**2 + y**2 + z**2)
+    k_r = (v_x**2 + v_y**2 + v_z**2) / mu - 1 / r
+    k_v = (x * v_x + y * v_y + z * v_z) / mu
+    e_x = k_r * x - k_v * v_x
+    e_y = k_r * y - k_v * v_y
+    e_z = k_r * z - k_v * v_z
+    e = np.sqrt(e_x**2 + e_y**2 + e_z**2)
+    if e < 1e-12:
+        return 1.0
+
+    return (e_x * x + e_y * y + e_z * z) / (e * r)
+
+
+# Direction of the Lyapunov feedback in the radial, transverse and normal frame, and the weighted distance to the target
+@njit
+def _lyapunov_direction(state:np.ndarray, mu:float, law:SteeringLaw) -> tuple:
+    r_vec = state[:3]
+    v_vec = state[3:6]
+    r = np.sqrt(np.sum(r_vec**2))
+    h_vec = np.cross(r_vec, v_vec)
+    h = np.sqrt(np.sum(h_vec**2))
+    e_vec = np.cross(v_vec, h_vec) / mu - r_vec / r
+    e = np.sqrt(np.sum(e_vec**2))
+    p = h**2 / mu
+    a = p / (1 - e**2)
+
+    # Elements, with the node and the periapsis only where they are defined
+    n_x = -h_vec[1]
+    n_y = h_vec[0]
+    n = np.sqrt(n_x**2 + n_y**2)
+    i = np.arctan2(n, h_vec[2])
+    sin_i = n / h
+    raan = np.arctan2(n_y, n_x) if n > 1e-9 * h else 0.0
+    if e > 1e-9 and n > 1e-9 * h:
+        aop = np.arccos(min(max((n_x * e_vec[0] + n_y * e_vec[1]) / (n * e), -1.0), 1.0))
+        if e_vec[2] < 0:
+            aop = 2 * np.pi - aop
+    else:
+        aop = 0.0
+    cos_f = cos_true_anomaly(state, mu)
+    sin_f = np.sqrt(max(1 - cos_f**2, 0.0)) * (1.0 if np.dot(r_vec, v_vec) >= 0 else -1.0)
+    cos_u = (n_x * r_vec[0] + n_y * r_vec[1]) / (n * r) if n > 1e-9 * h else 1.0
+    sin_u = r_vec[2] / (r * sin_i) if n > 1e-9 * h else 0.0
+
+    # Gauss variational equations, d element / dt per unit radial, transverse and normal acceleration
+    B = np.zeros((5, 3))
+    da_r = 2 * a**2 / h * e * sin_f
+    da_t = 2 * a**2 / h * p / r
+    de_r = p * sin_f / h
+    de_t = ((p + r) * cos_f + r * e) / h
+    B[0, 0] = (1 - e) * da_r - a * de_r
+    B[0, 1] = (1 - e) * da_t - a * de_t
+    B[1, 0] = (1 + e) * da_r + a * de_r
+    B[1, 1] = (1 + e) * da_t + a * de_t
+    B[2, 2] = r * cos_u / h
+    if n > 1e-9 * h:
+        B[3, 2] = r * sin_u / (h * sin_i)
+    if e > 1e-9:
+        B[4, 0] = -p * cos_f / (h * e)
+        B[4, 1] = (p + r) * sin_f / (h * e)
+        B[4, 2] = -B[3, 2] * np.cos(i)
+
+    # V = 1/2 sum W (element - target)^2 in km and degrees
+    elements = np.array([a * (1 - e), a * (1 + e), i, raan, aop])
+    grad = np.zeros(5)
+    distance = 0.0
+    for k in range(5):
+        error = elements[k] - law.target[k]
+        scale = 1.0
+        if k >= 2:
+            error = (error + np.pi) % (2 * np.pi) - np.pi
+            scale = 180 / np.pi
+        grad[k] = law.weights[k] * error * scale**2
+        distance += law.weights[k] * (error * scale)**2
+    distance = np.sqrt(distance / max(np.sum(law.weights), 1e-300))
+
+    g = B.T @ grad
+    return -g / max(np.sqrt(np.sum(g**2)), 1e-300), distance
+
+
+@njit
+def steering_control(et:float, state:np.ndarray, law:SteeringLaw, mu:float) -> tuple:
+
+    """
+    Throttle and direction of the thrust of a steering law.
+
+    Inputs:
+        et: The epoch, for the throttle schedule
+        state: The state of the spacecraft, the first 6 components are used
+        law: The SteeringLaw named tuple
+        mu: The gravitational parameter of the body
+
+    Returns:
+        throttle: The fraction of the thrust and of the mass flow, in [0, 1]
+        u_x, u_y, u_z: The unit vector of the thrust, 0 without thrust
+    """
+
+    throttle = law.throttles[np.searchsorted(law.times, et, side='right')]
+    if law.duty != ALWAYS and law.duty * cos_true_anomaly(state, mu) < law.duty_cos:
+        throttle = 0.0
+
+    v = np.sqrt(state[3]**2 + state[4]**2 + state[5]**2)
+    if throttle == 0.0 or v == 0.0:
+        return 0.0, 0.0, 0.0, 0.0
+
+    if law.kind == TANGENT:
+        return throttle, state[3] / v, state[4] / v, state[5] / v
+    elif law.kind == ANTI_TANGENT:
+        return throttle, -state[3] / v, -state[4] / v, -state[5] / v
+
+    # Lyapunov feedback, the throttle ramps down to 0 at the target
+    u_rtn, distance = _lyapunov_direction(state, mu, law)
+    throttle *= min(distance / law.tol, 1.0)
+    r_vec = state[:3]
+    h_vec = np.cross(r_vec, state[3:6])
+    r_hat = r_vec / np.sqrt(np.sum(r_vec**2))
+    n_hat = h_vec / np.sqrt(np.sum(h_vec**2))
+    t_hat = np.cross(n_hat, r_hat)
+    u = u_rtn[0] * r_hat + u_rtn[1] * t_hat + u_rtn[2] * n_hat
+
+    return throttle, u[0], u[1], u[2]
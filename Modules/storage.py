@@ -0,0 +1,178 @@
+# Lucas Calderon
+# This file contains the streaming trajectory storage, so long runs don't keep their histories in memory.
+# The propagation is done in segments and every segment is pushed to a writer that appends it to .npy files
+# on disk, optionally decimated and with the orbital elements computed chunk by chunk.
+# The files are plain .npy files that are read back with memory mapping.
+
+import sys
+import os
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config.spacecraft import spacecraft
+from Modules.elements import states_to_coes_batch
+
+# Files of a trajectory store
+TRAJECTORY_FILE = 'trajectory.npy' # Rows: [t, x, y, z, vx, vy, vz, m]
+COES_FILE = 'coes.npy' # Rows: the 11 columns of helper.states_to_coes
+
+# Size of the .npy headers, fixed so the number of rows can be rewritten in place
+HEADER_SIZE = 128
+
+
+# ------------APPEND-ONLY NPY FILES----------------
+# Header of a version 1.0 .npy file of float64 rows, padded to HEADER_SIZE bytes
+def _npy_header(n_rows:int, n_cols:int) -> bytes:
+    header = repr({'descr': '<f8', 'fortran_order': False, 'shape': (n_rows, n_cols)}).encode('latin1')
+    header = header.ljust(HEADER_SIZE - 10 - 1) + b'\n'
+
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header
+
+
+class _NpyAppender:
+
+    """
+    A .npy file of float64 rows that grows at the end. The header is updated after every append,
+    so the file is always a valid .npy file with the rows written so far.
+    """
+
+    def __init__(self, path:str, n_cols:int):
+        self.n_cols = n_cols
+        self.n_rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(_npy_header(0, n_cols))
+
+    def append(self, rows:np.ndarray):
+        self.file.seek(0, os.SEEK_END)
+        np.ascontiguousarray(rows, dtype='<f8').tofile(self.file)
+        self.n_rows += len(rows)
+        self.file.seek(0)
+        self.file.write(_npy_header(self.n_rows, self.n_cols))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# ------------WRITER----------------
+class TrajectoryWriter:
+
+    """
+    Streams a trajectory to a directory. The samples are kept in a buffer of chunk_rows rows,
+    every full chunk is decimated, converted to orbital elements if mu is given and appended to disk.
+
+    Inputs:
+        path: The directory of the store, created if needed
+        mu: (Optional) The gravitational parameter, if given coes.npy is written too
+        decimation: Keep one of every this many samples
+        chunk_rows: The number of samples kept in memory before writing them
+    """
+
+    def __init__(self, path:str, mu:float=None, decimation:int=1, chunk_rows:int=10000):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.mu = mu
+        self.decimation = max(int(decimation), 1)
+        self.chunk_rows = chunk_rows
+        self._count = 0 # Samples received, for the decimation
+        self._buffer = []
+        self._buffered = 0
+        self._trajectory = _NpyAppender(os.path.join(path, TRAJECTORY_FILE), 8)
+        self._coes = _NpyAppender(os.path.join(path, COES_FILE), 11) if mu is not None else None
+
+    # Add samples, t has N elements and states is N*7
+    def append(self, t:np.ndarray, states:np.ndarray):
+        keep = (self._count + np.arange(len(t))) % self.decimation == 0
+        self._count += len(t)
+        if np.any(keep):
+            self._buffer.append(np.column_stack((t[keep], states[keep])))
+            self._buffered += int(np.sum(keep))
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    # Write the buffered samples
+    def flush(self):
+        if not self._buffer:
+            return
+        rows = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+
+        self._trajectory.append(rows)
+        if self._coes is not None:
+            self._coes.append(states_to_coes_batch(rows[:, 1:7], rows[:, 0], self.mu))
+
+    def close(self):
+        self.flush()
+        self._trajectory.close()
+        if self._coes is not None:
+            self._coes.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Read a store with memory mapping
+def open_trajectory(path:str) -> tuple:
+
+    """
+    Returns:
+        t_hist: The history of the time
+        pos_hist, vel_hist, mass_hist: The histories of the position, velocity and mass
+        coes: The orbital elements as a N*11 array, None if they were not written
+    All of them are read only memory maps, so nothing is loaded until it is used.
+    """
+
+    data = np.load(os.path.join(path, TRAJECTORY_FILE), mmap_mode='r')
+    coes_path = os.path.join(path, COES_FILE)
+    coes = np.load(coes_path, mmap_mode='r') if os.path.exists(coes_path) else None
+
+    return data[:, 0], data[:, 1:4], data[:, 4:7], data[:, 7], coes
+
+
+# ------------STREAMING PROPAGATION----------------
+def propagate_streaming(t_span:np.ndarray, state0:np.ndarray, writer:TrajectoryWriter, body:str='Earth', sc=spacecraft,
+                        engine:str='DOP853', segment:float=86400, dt:float=10, verbose:bool=True) -> np.ndarray:
+
+    """
+    Propagates a phase with propagate_phase in segments of a given duration and pushes every segment
+    to the writer, so the memory used doesn't depend on the length of the run.
+
+    Inputs:
+        t_span: The time span of the simulation, in et seconds
+        state0: The initial state, a 7 member numpy array with the position, velocity and mass of the spacecraft
+        writer: The TrajectoryWriter of the samples
+        body: The body that the spacecraft is orbiting
+        sc: The spacecraft named tuple
+        engine: The engine of propagate_phase, always with the compiled physics
+        segment: The duration of the segments, in seconds
+        dt: The step of the fixed step engines
+        verbose: Print the progress after every segment
+    Returns:
+        state: The final state of the spacecraft, earlier than t_span[1] after a terminal event
+    """
+
+    from Modules.simulation_math import propagate_phase
+
+    state = np.asarray(state0, dtype=np.float64)
+    writer.append(np.array([t_span[0]]), state[None, :])
+    t = t_span[0]
+    while t < t_span[1]:
+        t_end = min(t + segment, t_span[1])
+        t_hist, pos_hist, vel_hist, mass_hist = propagate_phase(np.array([t, t_end]), None, state, body, compiled=True,
+                                                                sc=sc, engine=engine, dt=dt, verbose=False)
+        writer.append(t_hist[1:], np.column_stack((pos_hist[1:], vel_hist[1:], mass_hist[1:])))
+        state = np.concatenate((pos_hist[-1], vel_hist[-1], [mass_hist[-1]]))
+
+        if verbose:
+            print(f"Propagated {t_hist[-1] - t_span[0]:.0f} of {t_span[1] - t_span[0]:.0f} s")
+        if t_hist[-1] < t_end - 1e-6:
+            break # Terminal event: crash, SOI exit or propellant depleted
+        t = t_hist[-1]
+
+    return state
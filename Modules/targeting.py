@@ -0,0 +1,395 @@
+# Lucas Calderon
+# This file contains the differential corrector of the compiled propagation: it solves for the orbit inputs, an
+# impulsive burn or spacecraft parameters that reach goals on the periapsis, the apoapsis or the time spent in the
+# atmosphere. Every evaluation is one DOP853 run with the STM and the sensitivities (variational.py), so the
+# Jacobian of the goals comes with the goals instead of one run per control. The iterations are Levenberg-Marquardt
+# or Newton on the goals scaled by their tolerances.
+# The derivatives of the state wrt the controls u are carried as D = d state / d u (7*n_u), on every arc:
+#   D(t) = Phi(t) D(t0) + S(t) P, P = d params / d u
+
+import sys
+import os
+import time
+from collections import namedtuple
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Config import bodies_data as bd
+from Config.spacecraft import spacecraft, orbit_inputs
+from Modules.dynamics import build_force_model
+from Modules.helper import sc_heigth_radii
+from Modules.events import EventSet, PERIAPSIS, APOAPSIS, ATMOS_ENTRY, ATMOS_EXIT, phase_event_set, make_event_array
+from Modules.montecarlo import ORBIT_KEYS, orbit_state
+from Modules.simulation_math import run_engine, H_CRASH
+from Modules.steering import SteeringLaw, LYAPUNOV
+from Modules.variational import PARAMS, N_PARAMS, STM_IDX, SENS_IDX, height_gradient, variational_state
+
+# Goal of the targeter:
+#   kind: 'periapsis' for the osculating periapsis height at the end of the phase, 'apoapsis' for the height of the
+#       first apoapsis after n periapsis passages or 'atmos_time' for the time spent below the top of the atmosphere
+#   value: The target, in km or seconds
+#   tol: The tolerance of the goal, in the same units
+#   n: The number of periapsis passages before the apoapsis
+Goal = namedtuple('Goal', ['kind', 'value', 'tol', 'n'], defaults=(1.0, 0))
+
+# Result of Targeter.solve: the solved controls (dictionary), the values of the goals, whether all of them are within
+# their tolerances, the iterations, the propagations and the wall time in seconds
+TargetResult = namedtuple('TargetResult', ['controls', 'values', 'converged', 'iterations', 'n_evals', 'wall_time'])
+
+# Name of the control of the impulsive burn along the velocity, in km/s
+DV = 'dv'
+# Steps of the differences of orbit_state, in km and degrees
+ORBIT_STEPS = {'Periapsis': -1e-4, 'Apoapsis': 1e-4, 'Inclination': 1e-6, 'Rigth_Ascension_node': 1e-6,
+               'Argument_periapsis': 1e-6, 'Mean_anomaly_epoch': 1e-6}
+# Field of the force model of every spacecraft parameter of the sensitivities
+FM_FIELDS = {'C_D': 'C_D', 'A': 'A', 'thrust': 'thrust', 'mass_flow_rate': 'm_dot'}
+
+
+# ------------GOALS----------------
+# Osculating periapsis height, in km
+def _periapsis_height(state:np.ndarray, mu:float, R_e:float) -> float:
+    r = state[:3]
+    v = state[3:6]
+    h = np.cross(r, v)
+    e = np.linalg.norm(np.cross(v, h) / mu - r / np.linalg.norm(r))
+
+    return np.dot(h, h) / mu / (1 + e) - R_e
+
+
+# Value and gradient of the periapsis height, the gradient by central differences of the conversion
+def _periapsis_goal(state:np.ndarray, mu:float, R_e:float) -> tuple:
+    grad = np.zeros(7)
+    for j, step in enumerate([1e-4] * 3 + [1e-7] * 3):
+        dx = step * np.eye(7)[j]
+        grad[j] = (_periapsis_height(state + dx, mu, R_e) - _periapsis_height(state - dx, mu, R_e)) / (2 * step)
+
+    return _periapsis_height(state, mu, R_e), grad
+
+
+# Derivative of the epoch of a height crossing, the crossing moves by -dh/du / (dh/dt)
+def _crossing_time_derivative(state:np.ndarray, d_state:np.ndarray, R_e:float, R_p:float) -> np.ndarray:
+    g_h = np.array(height_gradient(state[0], state[1], state[2], R_e, R_p))
+
+    return -(g_h @ d_state[:3]) / (g_h @ state[3:6])
+
+
+# ------------TARGETER----------------
+class Targeter:
+
+    """
+    Differential corrector of one phase. The force model and the events are built once, so every evaluation is a
+    single compiled run. The evaluations are cached by the controls, the arc before the burn by the controls that
+    change it (so the iterations on the burn alone only propagate after it) and the last solution is the guess
+    of the next solve of the same targeter.
+
+    Inputs:
+        goals: The Goal named tuples
+        controls: The names of the controls: orbit inputs of montecarlo.ORBIT_KEYS (km and degrees), 'dv' for an
+            impulsive burn along the velocity (km/s) at t_burn or spacecraft parameters of variational.PARAMS
+        inputs: The orbit inputs, as Config.spacecraft.orbit_inputs
+        sc: The spacecraft named tuple. The burn spends propellant with the exhaust velocity thrust / mass_flow_rate
+        t_phase: The duration of the phase in seconds
+        t_burn: The time of the burn after the start of the phase in seconds, needed with 'dv'
+        engine, dt: The compiled engine and its time step, as in simulation_math.propagate_phase
+        steering: (Optional) The SteeringLaw of the thrust, along or against the velocity
+        force_model: (Optional) Options of dynamics.build_force_model (perturbers, degree, order, srp, ...)
+        events: (Optional) The EventSet of the phase, by default events.phase_event_set with the eclipses
+    """
+
+    def __init__(self, goals, controls, inputs:dict=orbit_inputs, sc=spacecraft, t_phase:float=1e5,
+                 t_burn:float=None, engine:str='DOP853', dt:float=10, steering:SteeringLaw=None,
+                 force_model:dict=None, events:EventSet=None):
+
+        for name in controls:
+            if name not in ORBIT_KEYS and name not in PARAMS and name != DV:
+                raise ValueError(f"'{name}' is not an orbit input, a burn nor a parameter of the sensitivities")
+        if DV in controls and t_burn is None:
+            raise ValueError("The burn needs its time t_burn")
+        if sc.air_breathing:
+            raise ValueError("The sensitivities of the air-breathing thrust are not modelled")
+        if steering is not None and steering.kind == LYAPUNOV:
+            raise ValueError("The sensitivities of the Lyapunov feedback are not modelled")
+        for goal in goals:
+            if goal.kind not in ('periapsis', 'apoapsis', 'atmos_time'):
+                raise ValueError(f"Unknown goal '{goal.kind}'")
+
+        self.goals = tuple(goals)
+        self.controls = tuple(controls)
+        self.inputs = dict(inputs)
+        self.sc = sc
+        self.engine = engine
+        self.dt = dt
+        body = inputs['body']
+        self.mu = getattr(bd, body).gravitational_parameter
+        self.t_span = np.array([inputs['et'], inputs['et'] + t_phase], dtype=np.float64)
+        self.t_burn = None if t_burn is None else float(inputs['et'] + t_burn)
+
+        state0 = orbit_state(self.inputs, sc.mass0)
+        self.fm = build_force_model(self.t_span, body, sc, states0=state0, steering=steering, **(force_model or {}))
+        self.event_set = phase_event_set(body, sc, H_CRASH, t_span=self.t_span, steering=steering) if events is None else events
+
+        # d params / d u, constant
+        self.P = np.zeros((N_PARAMS, len(self.controls)))
+        for j, name in enumerate(self.controls):
+            if name in PARAMS:
+                self.P[PARAMS.index(name), j] = 1.0
+
+        self.last = None
+        self.n_evals = 0
+        self._evals = {}
+        self._coast = (None, None)
+
+    # Controls of the inputs, the burn starts at 0
+    def nominal(self) -> np.ndarray:
+        values = {**self.inputs, **self.sc._asdict(), DV: 0.0}
+        if values['thrust'] is None:
+            values['thrust'] = 0.0
+
+        return np.array([values[name] for name in self.controls], dtype=np.float64)
+
+    # Initial state and its derivatives wrt the controls, by differences of orbit_state
+    def _initial_state(self, inputs:dict) -> tuple:
+        state0 = orbit_state(inputs, self.sc.mass0)
+        D0 = np.zeros((7, len(self.controls)))
+        for j, name in enumerate(self.controls):
+            if name in ORBIT_KEYS:
+                step = ORBIT_STEPS[name]
+                D0[:, j] = (orbit_state({**inputs, name: inputs[name] + step}, self.sc.mass0) - state0) / step
+
+        return state0, D0
+
+    # One compiled run with the STM from state, D and P at its start
+    def _arc(self, t_start:float, t_end:float, state:np.ndarray, D_in:np.ndarray, fm) -> tuple:
+        t_hist, y_hist, event_t, event_idx, event_y = run_engine(np.array([t_start, t_end]), variational_state(state), fm,
+                                                                 self.event_set, self.engine, self.dt)
+        self.n_evals += 1
+
+        return t_hist, y_hist, event_t, event_idx, event_y, D_in
+
+    # Derivative of a state of an arc wrt the controls
+    def _chain(self, y:np.ndarray, D_in:np.ndarray) -> np.ndarray:
+        phi = y[STM_IDX:SENS_IDX].reshape(7, 7)
+        sens = y[SENS_IDX:SENS_IDX + 7 * N_PARAMS].reshape(7, N_PARAMS)
+
+        return phi @ D_in + sens @ self.P
+
+    # Impulsive burn along the velocity, with the rocket equation, and the derivatives of the state after it
+    def _burn(self, state:np.ndarray, D:np.ndarray, dv:float, fm) -> tuple:
+        v = np.linalg.norm(state[3:6])
+        v_hat = state[3:6] / v
+        after = state[:7].copy()
+        after[3:6] += dv * v_hat
+
+        # d after / d before
+        B = np.eye(7)
+        B[3:6, 3:6] += dv / v * (np.eye(3) - np.outer(v_hat, v_hat))
+        D = B @ D
+        if DV not in self.controls:
+            return after, D
+        D[3:6, self.controls.index(DV)] += v_hat
+
+        if fm.thrust > 0 and fm.m_dot > 0:
+            k = dv * 1000 * fm.m_dot / fm.thrust # dv over the exhaust velocity
+            after[6] = state[6] * np.exp(-k)
+            D[6] = np.exp(-k) * D[6]
+            D[6, self.controls.index(DV)] -= after[6] * 1000 * fm.m_dot / fm.thrust
+            if 'thrust' in self.controls:
+                D[6, self.controls.index('thrust')] += after[6] * k / fm.thrust
+            if 'mass_flow_rate' in self.controls:
+                D[6, self.controls.index('mass_flow_rate')] -= after[6] * k / fm.m_dot
+
+        return after, D
+
+    def _propagate(self, u:np.ndarray) -> list:
+
+        """
+        Propagates the phase with the controls u.
+
+        Returns:
+            arcs: The arcs of the phase, tuples of (t_hist, y_hist, event_t, event_idx, event_y, D_in)
+        """
+
+        values = dict(zip(self.controls, u))
+        inputs = {**self.inputs, **{name: values[name] for name in self.controls if name in ORBIT_KEYS}}
+        fm = self.fm._replace(**{FM_FIELDS[name]: float(values[name]) for name in self.controls if name in PARAMS})
+
+        if self.t_burn is None:
+            state0, D0 = self._initial_state(inputs)
+            return [self._arc(self.t_span[0], self.t_span[1], state0, D0, fm)]
+
+        # The arc before the burn only depends on the other controls
+        key = tuple(value for name, value in values.items() if name != DV)
+        if self._coast[0] != key:
+            state0, D0 = self._initial_state(inputs)
+            self._coast = (key, self._arc(self.t_span[0], self.t_burn, state0, D0, fm))
+        coast = self._coast[1]
+        if coast[0][-1] < self.t_burn: # Terminal event before the burn
+            return [coast]
+
+        y = coast[1][-1]
+        state, D = self._burn(y, self._chain(y, coast[5]), values.get(DV, 0.0), fm)
+
+        return [coast, self._arc(self.t_burn, self.t_span[1], state, D, fm)]
+
+    def _goals(self, arcs:list) -> tuple:
+
+        """
+        Values of the goals and their Jacobian wrt the controls.
+        """
+
+        R_e = self.event_set.R_e
+        R_p = self.event_set.R_p
+        kinds = [self.event_set.kind[arc[3]] for arc in arcs]
+        values = np.zeros(len(self.goals))
+        jac = np.zeros((len(self.goals), len(self.controls)))
+
+        for i, goal in enumerate(self.goals):
+            if goal.kind == 'periapsis':
+                y = arcs[-1][1][-1]
+                values[i], grad = _periapsis_goal(y[:7], self.mu, R_e)
+                jac[i] = grad @ self._chain(y, arcs[-1][5])
+
+            elif goal.kind == 'apoapsis':
+                # At an apsis the height doesn't change with the epoch, only with the state
+                passes = 0
+                found = False
+                for arc, kind in zip(arcs, kinds):
+                    for t, y, event_kind in zip(arc[2], arc[4], kind):
+                        if event_kind == PERIAPSIS:
+                            passes += 1
+                        elif event_kind == APOAPSIS and passes >= goal.n and not found:
+                            r = np.linalg.norm(y[:3])
+                            values[i] = r - R_e
+                            jac[i] = (y[:3] / r) @ self._chain(y, arc[5])[:3]
+                            found = True
+                if not found:
+                    raise ValueError(f"The phase has no apoapsis after {goal.n} periapsis passages")
+
+            else:
+                # Sum of the exits minus the entries, with the ends of the phase if it starts or ends inside
+                inside = self.fm.atmos and sc_heigth_radii(arcs[0][1][0, :3], R_e, R_p) < self.fm.h_atmos
+                if inside:
+                    values[i] -= arcs[0][0][0]
+                for arc, kind in zip(arcs, kinds):
+                    for t, y, event_kind in zip(arc[2], arc[4], kind):
+                        if event_kind in (ATMOS_ENTRY, ATMOS_EXIT):
+                            sign = 1.0 if event_kind == ATMOS_EXIT else -1.0
+                            values[i] += sign * t
+                            jac[i] += sign * _crossing_time_derivative(y, self._chain(y, arc[5]), R_e, R_p)
+                            inside = event_kind == ATMOS_ENTRY
+                if inside:
+                    values[i] += arcs[-1][0][-1]
+
+        return values, jac
+
+    def evaluate(self, u:np.ndarray) -> tuple:
+
+        """
+        Values of the goals and their Jacobian, cached by the controls.
+
+        Inputs:
+            u: The values of the controls
+
+        Returns:
+            values: The values of the goals
+            jac: The derivatives of the goals wrt the controls, n_goals*n_controls
+        """
+
+        key = tuple(np.asarray(u, dtype=np.float64))
+        if key not in self._evals:
+            arcs = self._propagate(np.array(key))
+            if len(self._evals) > 32:
+                self._evals.clear()
+            self._evals[key] = self._goals(arcs) + (arcs,)
+
+        return self._evals[key][:2]
+
+    def trajectory(self, u:np.ndarray) -> tuple:
+
+        """
+        Trajectory of the phase with the controls u, usually the solution.
+
+        Returns:
+            t_hist: The history of the time, the burn epoch is repeated
+            state_hist: The history of the states [x, y, z, vx, vy, vz, m], N*7
+            events: The events found, as a structured array of events.EVENT_DTYPE
+        """
+
+        self.evaluate(u)
+        arcs = self._evals[tuple(np.asarray(u, dtype=np.float64))][2]
+        t_hist = np.concatenate([arc[0] for arc in arcs])
+        state_hist = np.concatenate([arc[1][:, :7] for arc in arcs])
+        events = np.concatenate([make_event_array(arc[2], arc[3], arc[4], self.event_set) for arc in arcs])
+
+        return t_hist, state_hist, events
+
+    def solve(self, guess:np.ndarray=None, method:str='lm', max_iter:int=20) -> TargetResult:
+
+        """
+        Iterates the controls until every goal is within its tolerance.
+
+        Inputs:
+            guess: The initial controls, by default the last solution or the nominal controls
+            method: 'lm' for Levenberg-Marquardt, 'newton' for Newton (least squares if the goals and the controls
+                are not as many) with the step halved until the goals improve
+            max_iter: The maximum number of iterations
+
+        Returns:
+            result: The TargetResult named tuple
+        """
+
+        start = time.perf_counter()
+        n_evals = self.n_evals
+        target = np.array([goal.value for goal in self.goals])
+        tol = np.array([goal.tol for goal in self.goals])
+
+        if guess is None:
+            guess = self.last if self.last is not None else self.nominal()
+        u = np.array(guess, dtype=np.float64)
+        values, jac = self.evaluate(u)
+        res = (values - target) / tol
+        lam = 1e-3
+
+        iterations = 0
+        while np.max(np.abs(res)) > 1 and iterations < max_iter:
+            iterations += 1
+            J = jac / tol[:, None]
+            accepted = False
+
+            if method == 'lm':
+                A = J.T @ J
+                g = J.T @ res
+                while not accepted and lam < 1e10:
+                    du = np.linalg.solve(A + lam * np.diag(np.maximum(np.diag(A), 1e-12)), -g)
+                    new_values, new_jac = self.evaluate(u + du)
+                    new_res = (new_values - target) / tol
+                    if np.sum(new_res**2) < np.sum(res**2):
+                        accepted = True
+                        lam = max(lam / 10, 1e-12)
+                    else:
+                        lam *= 10
+            elif method == 'newton':
+                du = np.linalg.lstsq(J, -res, rcond=None)[0]
+                for _ in range(8):
+                    new_values, new_jac = self.evaluate(u + du)
+                    new_res = (new_values - target) / tol
+                    if np.sum(new_res**2) < np.sum(res**2):
+                        accepted = True
+                        break
+                    du /= 2
+            else:
+                raise ValueError(f"Unknown method '{method}'")
+
+            if not accepted:
+                break
+            u = u + du
+            values, jac, res = new_values, new_jac, new_res
+
+        converged = bool(np.max(np.abs(res)) <= 1)
+        if converged:
+            self.last = u
+
+        return TargetResult(controls=dict(zip(self.controls, u.tolist())), values=values, converged=converged,
+                            iterations=iterations, n_evals=self.n_evals - n_evals, wall_time=time.perf_counter() - start)
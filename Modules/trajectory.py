@@ -0,0 +1,129 @@
+# Lucas Calderon
+# This file contains the stored trajectories: a propagated history kept as piecewise Hermite polynomials, so it
+# can be evaluated at any epoch without propagating again. Between two steps the position is the quintic that
+# matches the position, velocity and acceleration at both ends, the velocity is its derivative and the mass is
+# the cubic that matches the mass and mass flow.
+
+import sys
+import os
+from collections import namedtuple
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Modules.dynamics import ForceModel, acceleration_kernel
+from Modules.ephemeris import ephemeris_position
+from Modules.gravity import body_rotation
+
+# t has N increasing epochs, states is N*7 [x, y, z, vx, vy, vz, m] and derivs is N*7, the derivative of the states
+Trajectory = namedtuple('Trajectory', ['t', 'states', 'derivs'])
+
+
+# ------------BUILDING----------------
+# Derivatives of the states of a history with the compiled physics
+@njit
+def trajectory_derivatives(t:np.ndarray, states:np.ndarray, fm:ForceModel) -> np.ndarray:
+    derivs = np.empty_like(states)
+    for i in range(len(t)):
+        acceleration_kernel(t[i], states[i], ephemeris_position(t[i], fm.eph), body_rotation(t[i], fm.gravity), fm, 1.0, derivs[i])
+
+    return derivs
+
+
+def build_trajectory(t_hist:np.ndarray, pos_hist:np.ndarray, vel_hist:np.ndarray, mass_hist:np.ndarray, fm:ForceModel) -> Trajectory:
+
+    """
+    Builds a trajectory from the output of propagate_phase.
+    The interpolation error grows with the step, it is tens of meters with the DOP853 steps of the default
+    scenario. A denser history (a fixed step engine or a smaller tolerance) gives a tighter fit.
+
+    Inputs:
+        t_hist, pos_hist, vel_hist, mass_hist: The histories returned by propagate_phase
+        fm: The force model of the phase, to evaluate the accelerations at the steps
+
+    Returns:
+        trajectory: The Trajectory named tuple
+    """
+
+    t = np.asarray(t_hist, dtype=np.float64)
+    states = np.ascontiguousarray(np.column_stack((pos_hist, vel_hist, mass_hist)), dtype=np.float64)
+
+    # Repeated epochs (an event at the end of a step) would give empty intervals
+    keep = np.concatenate((np.diff(t) > 0, [True]))
+
+    return Trajectory(t=t[keep], states=states[keep], derivs=trajectory_derivatives(t[keep], states[keep], fm))
+
+
+# Save and load trajectories
+def save_trajectory(path:str, trajectory:Trajectory):
+    np.savez(path, t=trajectory.t, states=trajectory.states, derivs=trajectory.derivs)
+
+
+def load_trajectory(path:str) -> Trajectory:
+    data = np.load(path)
+    return Trajectory(t=data['t'], states=data['states'], derivs=data['derivs'])
+
+
+# ------------EVALUATION (NUMBA COMPATIBLE)----------------
+# States at an array of epochs, nan outside of the trajectory
+@njit
+def evaluate_trajectory(ets:np.ndarray, trajectory:Trajectory) -> np.ndarray:
+    t = trajectory.t
+    y = trajectory.states
+    dy = trajectory.derivs
+    out = np.full((len(ets), 7), np.nan)
+
+    for n in range(len(ets)):
+        et = ets[n]
+        if et < t[0] or et > t[-1]:
+            continue
+        k = min(max(np.searchsorted(t, et, side='right') - 1, 0), len(t) - 2)
+        h = t[k + 1] - t[k]
+        s = (et - t[k]) / h
+        s2 = s * s
+        s3 = s2 * s
+        s4 = s3 * s
+        s5 = s4 * s
+
+        # Quintic Hermite basis and its derivative
+        H0 = 1 - 10 * s3 + 15 * s4 - 6 * s5
+        H1 = s - 6 * s3 + 8 * s4 - 3 * s5
+        H2 = 0.5 * (s2 - 3 * s3 + 3 * s4 - s5)
+        H3 = 0.5 * (s3 - 2 * s4 + s5)
+        H4 = -4 * s3 + 7 * s4 - 3 * s5
+        H5 = 10 * s3 - 15 * s4 + 6 * s5
+        dH0 = -30 * s2 + 60 * s3 - 30 * s4
+        dH1 = 1 - 18 * s2 + 32 * s3 - 15 * s4
+        dH2 = 0.5 * (2 * s - 9 * s2 + 12 * s3 - 5 * s4)
+        dH3 = 0.5 * (3 * s2 - 8 * s3 + 5 * s4)
+        dH4 = -12 * s2 + 28 * s3 - 15 * s4
+
+        for j in range(3):
+            p0, v0, a0 = y[k, j], y[k, 3 + j], dy[k, 3 + j]
+            p1, v1, a1 = y[k + 1, j], y[k + 1, 3 + j], dy[k + 1, 3 + j]
+            out[n, j] = H0 * p0 + H1 * h * v0 + H2 * h**2 * a0 + H3 * h**2 * a1 + H4 * h * v1 + H5 * p1
+            out[n, 3 + j] = (dH0 * p0 + dH1 * h * v0 + dH2 * h**2 * a0 + dH3 * h**2 * a1 + dH4 * h * v1 - dH0 * p1) / h
+
+        # Cubic Hermite for the mass
+        out[n, 6] = ((2 * s3 - 3 * s2 + 1) * y[k, 6] + (s3 - 2 * s2 + s) * h * dy[k, 6]
+                     + (-2 * s3 + 3 * s2) * y[k + 1, 6] + (s3 - s2) * h * dy[k + 1, 6])
+
+    return out
+
+
+# States on a uniform grid
+def resample_trajectory(trajectory:Trajectory, dt:float) -> tuple:
+
+    """
+    Returns:
+        t: The epochs from the start to the end of the trajectory every dt seconds
+        states: The states at t, as a N*7 numpy array
+    """
+
+    t = np.arange(trajectory.t[0], trajectory.t[-1], dt)
+    if t[-1] != trajectory.t[-1]:
+        t = np.append(t, trajectory.t[-1])
+
+    return t, evaluate_trajectory(t, trajectory)
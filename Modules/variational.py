@@ -0,0 +1,252 @@
+# Lucas Calderon
+# This file contains the variational equations of the compiled physics, to get sensitivities from a single run.
+# The state transition matrix Phi = d state / d state0 and the sensitivities S = d state / d p to the parameters
+# p = (C_D, A, thrust, mass_flow_rate) are propagated with the state by the compiled engines:
+#   Phi' = J Phi, Phi(t0) = I
+#   S' = J S + df/dp, S(t0) = 0
+# with J the Jacobian of acceleration_kernel. The point mass, J2 and third body terms are analytic, the drag uses
+# the slope of the atmosphere table and the rest of the gravity field (the degrees above 2 and the tesseral terms,
+# much smaller) is differentiated by central differences. The shadow is held constant in the derivatives of the
+# solar radiation pressure, so the jump of the eclipse boundaries isn't in the STM, and so is the throttle of the
+# steering laws. The thrust along or against the velocity is differentiated, the Lyapunov feedback is not modelled.
+# Phi and S go after the intake components, row by row: [state (7), intake (8), Phi (7*7), S (7*4)]
+
+import sys
+import os
+import numpy as np
+from numba import njit
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Modules.atmos import atmos_interp_slope
+from Modules.dynamics import ForceModel
+from Modules.gravity import gravity_acceleration, C_IDX
+from Modules.helper import sc_heigth_radii
+from Modules.intake import INTAKE_IDX, INTAKE_SIZE, intake_state
+from Modules.srp import shadow_fraction, srp_acceleration
+from Modules.steering import ANTI_TANGENT, steering_control
+
+# Parameters of the sensitivities, named as in the spacecraft
+PARAMS = ('C_D', 'A', 'thrust', 'mass_flow_rate')
+N_PARAMS = len(PARAMS)
+
+# Index of Phi and of S in the state
+STM_IDX = INTAKE_IDX + INTAKE_SIZE
+SENS_IDX = STM_IDX + 49
+VARIATIONAL_SIZE = 49 + 7 * N_PARAMS
+
+
+# ------------JACOBIAN (NUMBA COMPATIBLE)----------------
+# J2 acceleration about the pole (p_x, p_y, p_z), k = 3/2 mu J2 R^2
+@njit
+def _j2_acceleration(x:float, y:float, z:float, p_x:float, p_y:float, p_z:float, k:float) -> tuple:
+    s = x**2 + y**2 + z**2
+    u = p_x * x + p_y * y + p_z * z
+    s52 = s**-2.5
+    c = 5 * u**2 * s52 / s - s52
+
+    return k * (c * x - 2 * u * s52 * p_x), k * (c * y - 2 * u * s52 * p_y), k * (c * z - 2 * u * s52 * p_z)
+
+
+# Gradient of the height of helper.sc_heigth_radii
+@njit
+def height_gradient(x:float, y:float, z:float, R_e:float, R_p:float) -> tuple:
+    r = np.sqrt(x**2 + y**2 + z**2)
+    rho = np.sqrt(x**2 + y**2 + 1e-10)
+    f = (R_e - R_p) / (2 * np.pi) / (rho**2 + z**2)
+    if z < 0:
+        f = -f
+
+    return x / r - f * z * x / rho, y / r - f * z * y / rho, z / r + f * rho
+
+
+@njit
+def acceleration_jacobian(et:float, state:np.ndarray, pos_bodies:np.ndarray, rot:np.ndarray, fm:ForceModel, drag_scale:float) -> np.ndarray:
+
+    """
+    Derivatives of the acceleration of acceleration_kernel with respect to the state and to the parameters.
+    The velocity and mass rows of the Jacobian are trivial, so only the acceleration ones are returned.
+
+    Inputs:
+        et: The epoch, for the throttle of the steering law
+        state: The state of the spacecraft, the first 7 components are used
+        pos_bodies, rot, fm, drag_scale: As in dynamics.acceleration_kernel
+
+    Returns:
+        jac: 3*11 numpy array, d a / d [x, y, z, vx, vy, vz, m] in the first 7 columns and d a / d PARAMS in the last 4
+    """
+
+    jac = np.zeros((3, 7 + N_PARAMS))
+    x = state[0]
+    y = state[1]
+    z = state[2]
+    r_vec = state[:3]
+    r2 = x**2 + y**2 + z**2
+    r = np.sqrt(r2)
+
+    # Point mass
+    k = fm.mu / (r2 * r)
+    for i in range(3):
+        for j in range(3):
+            jac[i, j] = k * 3 * r_vec[i] * r_vec[j] / r2
+        jac[i, i] -= k
+
+    # J2, about the pole of the body
+    field = fm.gravity
+    k_J2 = 0.0
+    if field.n_max >= 2:
+        k_J2 = -1.5 * field.mu * np.sqrt(5.0) * field.coef[C_IDX, 2, 0] * field.R**2
+        p = rot[2]
+        u = p[0] * x + p[1] * y + p[2] * z
+        s52 = r2**-2.5
+        s72 = s52 / r2
+        c = 5 * u**2 * s72 - s52
+        for i in range(3):
+            for j in range(3):
+                jac[i, j] += k_J2 * (r_vec[i] * (10 * u * s72 * p[j] + (5 * s72 - 35 * u**2 * s72 / r2) * r_vec[j])
+                                     - 2 * p[i] * (s52 * p[j] - 5 * u * s72 * r_vec[j]))
+            jac[i, i] += k_J2 * c
+
+    # Rest of the field by central differences
+    if field.n_max > 2 or field.m_max > 0:
+        delta = 1e-3 * r
+        shifted = np.empty(3)
+        for j in range(3):
+            shifted[:] = r_vec
+            shifted[j] = r_vec[j] + delta
+            g_p = gravity_acceleration(shifted, rot, field)
+            j2_p = _j2_acceleration(shifted[0], shifted[1], shifted[2], rot[2, 0], rot[2, 1], rot[2, 2], k_J2)
+            shifted[j] = r_vec[j] - delta
+            g_m = gravity_acceleration(shifted, rot, field)
+            j2_m = _j2_acceleration(shifted[0], shifted[1], shifted[2], rot[2, 0], rot[2, 1], rot[2, 2], k_J2)
+            for i in range(3):
+                jac[i, j] += (g_p[i] - j2_p[i] - g_m[i] + j2_m[i]) / (2 * delta)
+
+    # Third bodies
+    mu_bodies = fm.mu_bodies
+    for b in range(mu_bodies.size):
+        d_x = pos_bodies[3 * b] - x
+        d_y = pos_bodies[3 * b + 1] - y
+        d_z = pos_bodies[3 * b + 2] - z
+        d2 = d_x**2 + d_y**2 + d_z**2
+        k = mu_bodies[b] / (d2 * np.sqrt(d2))
+        d = (d_x, d_y, d_z)
+        for i in range(3):
+            for j in range(3):
+                jac[i, j] += k * 3 * d[i] * d[j] / d2
+            jac[i, i] -= k
+
+    # Solar radiation pressure, proportional to A / m
+    if fm.sun_index >= 0:
+        i = 3 * fm.sun_index
+        nu = shadow_fraction(x, y, z, pos_bodies[i], pos_bodies[i + 1], pos_bodies[i + 2], fm.R_e)
+        if nu > 0.0:
+            a_srp = srp_acceleration(x, y, z, pos_bodies[i], pos_bodies[i + 1], pos_bodies[i + 2], nu, fm.C_R, 1.0, state[6])
+            for j in range(3):
+                jac[j, 6] -= fm.A * a_srp[j] / state[6]
+                jac[j, 8] += a_srp[j]
+
+    # Drag, a = -1/2 C_D A rho(h) |v_rel| v_rel / mass0 with the rotating atmosphere
+    h = sc_heigth_radii(r_vec, fm.R_e, fm.R_p)
+    if h < fm.h_atmos and fm.atmos:
+        rho, drho = atmos_interp_slope(h, fm.air_table)
+        rho *= drag_scale
+        drho *= drag_scale
+        omega = fm.omega if np.sqrt(x**2 + y**2) > 10 else 0.0
+        v_rel = (state[3] + omega * y, state[4] - omega * x, state[5])
+        v = np.sqrt(v_rel[0]**2 + v_rel[1]**2 + v_rel[2]**2)
+        k = 0.5 * 1000 / fm.mass0
+        B = fm.C_D * fm.A * k
+        g_h = height_gradient(x, y, z, fm.R_e, fm.R_p)
+        d_v = np.empty((3, 3)) # d a / d v_rel
+        for i in range(3):
+            for j in range(3):
+                d_v[i, j] = -B * rho * v_rel[i] * v_rel[j] / v
+            d_v[i, i] -= B * rho * v
+        for i in range(3):
+            for j in range(3):
+                jac[i, 3 + j] += d_v[i, j]
+                jac[i, j] -= B * drho * v * v_rel[i] * g_h[j]
+            # d v_rel / d r is [[0, omega, 0], [-omega, 0, 0], [0, 0, 0]]
+            jac[i, 0] -= omega * d_v[i, 1]
+            jac[i, 1] += omega * d_v[i, 0]
+            jac[i, 7] -= fm.A * k * rho * v * v_rel[i]
+            jac[i, 8] -= fm.C_D * k * rho * v * v_rel[i]
+
+    # Thrust along or against the velocity
+    v = np.sqrt(state[3]**2 + state[4]**2 + state[5]**2)
+    throttle = steering_control(et, state, fm.steering, fm.mu)[0] if fm.thrust != 0.0 else 0.0
+    if throttle != 0.0:
+        k_T = throttle * fm.thrust / state[6] / 1000 / v
+        if fm.steering.kind == ANTI_TANGENT:
+            k_T = -k_T
+        for i in range(3):
+            for j in range(3):
+                jac[i, 3 + j] -= k_T * state[3 + i] * state[3 + j] / v**2
+            jac[i, 3 + i] += k_T
+            jac[i, 6] -= k_T * state[3 + i] / state[6]
+            jac[i, 9] += k_T * state[3 + i] / fm.thrust
+
+    return jac
+
+
+@njit
+def variational_rates(et:float, state:np.ndarray, pos_bodies:np.ndarray, rot:np.ndarray, fm:ForceModel, drag_scale:float, state_dot:np.ndarray):
+
+    """
+    Writes the derivatives of Phi and S in state_dot, after acceleration_kernel wrote the ones of the state.
+
+    Inputs:
+        et: The epoch, for the throttle of the steering law
+        state: The state with Phi and S, of size STM_IDX + VARIATIONAL_SIZE
+        pos_bodies, rot, fm, drag_scale: As in dynamics.acceleration_kernel
+        state_dot: The derivative of the state
+    """
+
+    jac = acceleration_jacobian(et, state, pos_bodies, rot, fm, drag_scale)
+
+    # Phi' = J Phi, the position rows are the velocity rows of Phi and the mass row is 0
+    for j in range(7):
+        for i in range(3):
+            state_dot[STM_IDX + 7 * i + j] = state[STM_IDX + 7 * (3 + i) + j]
+            rate = 0.0
+            for k in range(7):
+                rate += jac[i, k] * state[STM_IDX + 7 * k + j]
+            state_dot[STM_IDX + 7 * (3 + i) + j] = rate
+        state_dot[STM_IDX + 42 + j] = 0.0
+
+    # S' = J S + df/dp, the mass flow is the only parameter of m'
+    for j in range(N_PARAMS):
+        for i in range(3):
+            state_dot[SENS_IDX + N_PARAMS * i + j] = state[SENS_IDX + N_PARAMS * (3 + i) + j]
+            rate = jac[i, 7 + j]
+            for k in range(7):
+                rate += jac[i, k] * state[SENS_IDX + N_PARAMS * k + j]
+            state_dot[SENS_IDX + N_PARAMS * (3 + i) + j] = rate
+        state_dot[SENS_IDX + N_PARAMS * 6 + j] = 0.0
+    if not fm.air_breathing and fm.thrust != 0.0:
+        state_dot[SENS_IDX + N_PARAMS * 6 + 3] = -steering_control(et, state, fm.steering, fm.mu)[0]
+
+
+# ------------STATES AND RESULTS----------------
+# State with the intake components, Phi = I and S = 0
+def variational_state(state0:np.ndarray) -> np.ndarray:
+    return np.concatenate((intake_state(state0), np.eye(7).ravel(), np.zeros(7 * N_PARAMS)))
+
+
+def stm_hist(state_hist:np.ndarray) -> tuple:
+
+    """
+    Inputs:
+        state_hist: The history of the states with Phi and S, as a N*(STM_IDX + VARIATIONAL_SIZE) numpy array
+
+    Returns:
+        stm: The state transition matrices from the initial state, as a N*7*7 numpy array
+        sens: The sensitivities of the state to PARAMS, as a N*7*4 numpy array
+    """
+
+    stm = state_hist[:, STM_IDX:SENS_IDX].reshape(-1, 7, 7)
+    sens = state_hist[:, SENS_IDX:SENS_IDX + 7 * N_PARAMS].reshape(-1, 7, N_PARAMS)
+
+    return stm, sens
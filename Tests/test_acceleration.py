@@ -4,8 +4,10 @@ import sys
 # Add the project root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from Modules.dynamics import acceleration, acceleration_new
+from Modules.dynamics import acceleration, acceleration_new, acceleration_compiled, build_force_model, third_body_acceleration
+from Modules.helper import ROOT
 import numpy as np
+import spiceypy as spice
 
 # Test the acceleration function
 def test_acceleration(func):
@@ -39,7 +41,49 @@ def test_acceleration(func):
     
     print("The acceleration function is correct")
 
+
+# The third body term against the difference of the direct and indirect terms, computed in extended precision
+def test_third_body():
+    cases = [(np.array([7000.0, 100.0, -300.0]), np.array([1.4e8, 3e7, 1e7]), 1.32712440041279e11),
+             (np.array([-4000.0, 5000.0, 2000.0]), np.array([3e5, 2e5, 8e4]), 4.9048695e3),
+             (np.array([1e5, 3e5, 1e5]), np.array([3e5, 2e5, 8e4]), 4.9048695e3)]
+    for position, pos_body, mu_body in cases:
+        r = position.astype(np.longdouble)
+        s = pos_body.astype(np.longdouble)
+        exact = mu_body * ((s - r) / np.linalg.norm(s - r)**3 - s / np.linalg.norm(s)**3)
+        a = np.array(third_body_acceleration(*position, *pos_body, mu_body))
+        if not np.allclose(a, exact.astype(np.float64), rtol=1e-9, atol=0):
+            raise ValueError(f"The third body acceleration is incorrect: {a} instead of {exact.astype(np.float64)}")
+
+    print("The third body acceleration is correct")
+
+
+# The compiled kernel against the python acceleration on a J2 only force model, with drag and thrust.
+# At J2000 the pole of the body fixed frame is the z axis of J2000, later it drifts by the precession
+def test_compiled_parity():
+    spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+    states = np.array([[6778.0, 0.0, 0.0, 0.0, 5.4, 5.4, 5000.0],           # Inside the atmosphere
+                       [3000.0, -4000.0, 5500.0, 5.0, 4.0, 1.2, 4800.0],
+                       [0.0, 0.0, 7400.0, 7.3, 0.0, 0.0, 5000.0],             # Over the pole
+                       [-5000.0, 3000.0, -3500.0, -3.0, -5.0, 3.0, 4500.0]])
+    for et, rtol in ((0.0, 1e-8), (7.5e8, 1e-2)):
+        fm = build_force_model(np.array([et, et + 100]), perturbers=(), srp=False, degree=2, order=0)
+        for state in states:
+            a_python = acceleration(et, state, srp=False, perturbers=())
+            a_compiled = acceleration_compiled(et, state, fm)
+            point_mass = -fm.mu / np.linalg.norm(state[:3])**3 * state[:3]
+            if not np.array_equal(a_python[[0, 1, 2, 6]], a_compiled[[0, 1, 2, 6]]):
+                raise ValueError("The velocity or the mass flow of the compiled kernel differs")
+            error = np.linalg.norm(a_python[3:6] - a_compiled[3:6]) / np.linalg.norm(a_python[3:6] - point_mass)
+            if error > rtol:
+                raise ValueError(f"The perturbations of the compiled kernel differ by {error:.2e} at et {et:.0f} and {state[:3]}")
+
+    print("The compiled acceleration matches the python one")
+
+
 if __name__ == "__main__":
 
     test_acceleration(acceleration)
-    test_acceleration(acceleration_new)
\ No newline at end of file
+    test_acceleration(acceleration_new)
+    test_third_body()
+    test_compiled_parity()
@@ -0,0 +1,99 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import numpy as np
+from Modules.atmos import make_atmos_table, atmos_interp, atmos_interp_batch, atmos_interp_slope, load_atmos, parse_msis_text, DEFAULT_FILE
+
+
+# The direct indexing of an evenly spaced table gives the values of the binary search, at the nodes and between them
+def test_uniform_lookup():
+    data = parse_msis_text(DEFAULT_FILE)
+    uniform = make_atmos_table(data.h, data.air)
+    if not uniform.uniform:
+        raise ValueError("The MSIS heights are not detected as evenly spaced")
+    searched = uniform._replace(uniform=False)
+
+    heights = np.concatenate((data.h, np.random.default_rng(0).uniform(data.h[0], data.h[-1], 5000), [data.h[0] - 1, data.h[-1] + 1]))
+    direct = atmos_interp_batch(heights, uniform)
+    if not np.allclose(direct, atmos_interp_batch(heights, searched), rtol=1e-12, atol=0):
+        raise ValueError("The direct and the binary search lookups differ")
+    if not np.allclose(direct[:len(data.h)], data.air, rtol=1e-12, atol=0) or np.any(direct[-2:] != 0):
+        raise ValueError("The table does not give the nodes back or is not 0 out of range")
+    for x in heights[::50]:
+        if not np.allclose(atmos_interp_slope(x, uniform), atmos_interp_slope(x, searched), rtol=1e-9, atol=0):
+            raise ValueError("The slopes of the direct and the binary search lookups differ")
+
+    # Uneven heights use the binary search
+    uneven = make_atmos_table(np.array([100.0, 110.0, 130.0, 170.0]), np.array([1e-8, 1e-9, 1e-10, 1e-11]))
+    if uneven.uniform or not np.isclose(atmos_interp(120.0, uneven), np.sqrt(1e-9 * 1e-10), rtol=1e-12):
+        raise ValueError("The uneven table is wrong")
+
+    print("Atmosphere lookup is correct")
+
+
+# The binary cache is used while the text file is unchanged and rebuilt when it changes
+def test_cache():
+    with open(DEFAULT_FILE) as file:
+        lines = file.readlines()[:40]
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'msis.txt')
+        cache_dir = os.path.join(folder, 'cache')
+        cache_file = os.path.join(cache_dir, 'msis.txt.npz')
+        with open(filename, 'w') as file:
+            file.writelines(lines)
+        os.utime(filename, (1e9, 1e9))
+
+        parsed = load_atmos(filename, cache_dir)
+        if not os.path.exists(cache_file) or not np.array_equal(parsed.air, parse_msis_text(filename).air):
+            raise ValueError("The cache is not written")
+
+        # Mark the cached table, a fresh cache is read without parsing the text file
+        with np.load(cache_file) as cache:
+            fields = dict(cache)
+        fields['air'] = fields['air'] * 2
+        np.savez(cache_file, **fields)
+        if not np.array_equal(load_atmos(filename, cache_dir).air, 2 * parsed.air):
+            raise ValueError("The fresh cache is not used")
+
+        # A new mtime with the same content is settled by the hash, and the cache takes the new mtime
+        os.utime(filename, (2e9, 2e9))
+        if not np.array_equal(load_atmos(filename, cache_dir).air, 2 * parsed.air):
+            raise ValueError("The cache is dropped although the content did not change")
+        with np.load(cache_file) as cache:
+            if float(cache['mtime']) != 2e9:
+                raise ValueError("The mtime of the cache is not updated")
+
+        # A new content with a new mtime is parsed again and the cache is rewritten
+        with open(filename, 'w') as file:
+            file.writelines(lines[:30])
+        os.utime(filename, (3e9, 3e9))
+        data = load_atmos(filename, cache_dir)
+        if len(data.h) != 29 or not np.array_equal(data.air, parsed.air[:29]):
+            raise ValueError("The stale cache is not rebuilt")
+        with np.load(cache_file) as cache:
+            if float(cache['mtime']) != 3e9 or len(cache['h']) != 29:
+                raise ValueError("The stale cache is not rewritten")
+
+        # A half written cache is a miss and is replaced, without leaving temporary files
+        with open(cache_file, 'r+b') as file:
+            file.truncate(os.path.getsize(cache_file) // 2)
+        if not np.array_equal(load_atmos(filename, cache_dir).air, parsed.air[:29]):
+            raise ValueError("The half written cache is not parsed again")
+        with np.load(cache_file) as cache:
+            if len(cache['h']) != 29:
+                raise ValueError("The half written cache is not replaced")
+        if os.listdir(cache_dir) != ['msis.txt.npz']:
+            raise ValueError("The temporary files of the cache are left behind")
+
+    print("Atmosphere cache is correct")
+
+
+if __name__ == "__main__":
+
+    test_uniform_lookup()
+    test_cache()
@@ -0,0 +1,159 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Modules.atmos import get_air_table, atmos_interp
+from Modules.atmos_provider import TableProvider, CachedProvider, position_to_geodetic
+
+
+# Table provider that counts the points it evaluates
+class CountingProvider(TableProvider):
+
+    def __init__(self):
+        super().__init__()
+        self.points = 0
+
+    def density_geodetic(self, et, alt, lat, lon):
+        self.points += len(np.atleast_1d(alt))
+        return super().density_geodetic(et, alt, lat, lon)
+
+
+# Positions at the given altitudes over the equator, on the x axis
+def positions(alts:np.ndarray) -> np.ndarray:
+    return np.column_stack((6378.137 + alts, np.zeros_like(alts), np.zeros_like(alts)))
+
+
+# The table provider gives the densities of atmos_interp at the altitude of the positions
+def test_table_provider():
+    rng = np.random.default_rng(0)
+    ets = rng.uniform(0, 86400, 500)
+    points = rng.normal(size=(500, 3))
+    points = points / np.linalg.norm(points, axis=1)[:, None] * rng.uniform(6400, 7200, (500, 1))
+
+    alt = position_to_geodetic(ets, points)[0]
+    expected = np.array([atmos_interp(h, get_air_table()) for h in alt])
+    provider = TableProvider()
+    if not np.array_equal(provider.densities(ets, points), expected) or provider.density(ets[0], points[0]) != expected[0]:
+        raise ValueError("The table provider differs from atmos_interp")
+    if not np.any(expected == 0) or not np.all(expected[alt < 700] > 0):
+        raise ValueError("The points do not cover the inside and the outside of the table")
+
+    print("Table provider is correct")
+
+
+# Provider with a log density that is linear in the altitude, latitude, longitude and time, and one that is not
+class LogLinearProvider(CountingProvider):
+
+    def density_geodetic(self, et, alt, lat, lon):
+        self.points += len(np.atleast_1d(alt))
+        return np.exp(-alt / 50 + lat / 100 + lon / 200 + et / 1e5)
+
+
+class CurvedProvider(CountingProvider):
+
+    def density_geodetic(self, et, alt, lat, lon):
+        self.points += len(np.atleast_1d(alt))
+        return np.exp(-(alt / 50)**2 + np.sin(np.radians(lat)) + np.cos(np.radians(lon)) + (et / 1e4)**2)
+
+
+# Query points inside the cell [0, 2) degrees in latitude and longitude and [0, 3600) s in time
+def query(cached:CachedProvider, alts:np.ndarray) -> np.ndarray:
+    n = len(alts)
+    return cached.density_geodetic(np.full(n, 100.0), alts, np.full(n, 0.5), np.full(n, 0.5))
+
+
+# Every node is evaluated once and counted as a miss, the other reads of the node are hits
+def test_cached_provider():
+    provider = CountingProvider()
+    cached = CachedProvider(provider, alt_step=1.0)
+    alts = np.array([300.1, 300.7, 301.2, 300.4, 450.5])
+    densities = query(cached, alts)
+    # Altitude nodes 300, 301, 302, 450 and 451, times the 8 corners in latitude, longitude and time
+    if (cached.misses, cached.hits, provider.points) != (40, 40, 40):
+        raise ValueError("The misses and the hits of the first query are wrong")
+
+    # The table is log-linear between nodes 5 km apart, so the interpolation between the 1 km nodes gives it back
+    if not np.allclose(densities, TableProvider().density_geodetic(0.0, alts, 0.0, 0.0), rtol=1e-12, atol=0):
+        raise ValueError("The cached densities are not the log-linear interpolation of the nodes")
+
+    query(cached, alts)
+    stats = cached.stats()
+    if (stats['misses'], stats['hits'], stats['size'], provider.points) != (40, 120, 40, 40) or stats['hit_rate'] != 0.75:
+        raise ValueError("The repeated query is not served from the cache")
+
+    print("Cached provider is correct")
+
+
+# The interpolation is exact for a log-linear density on all the axes, gives the provider back at the nodes,
+# is continuous across the cell boundaries and doesn't depend on the order of the queries
+def test_interpolation():
+    rng = np.random.default_rng(1)
+    n = 200
+    points = (rng.uniform(0, 10000, n), rng.uniform(200, 400, n), rng.uniform(-90, 90, n), rng.uniform(-180, 180, n))
+    if not np.allclose(CachedProvider(LogLinearProvider()).density_geodetic(*points), LogLinearProvider().density_geodetic(*points), rtol=1e-12, atol=0):
+        raise ValueError("The interpolation is not log-linear on every axis")
+
+    provider = CurvedProvider()
+    nodes = (np.array([0.0, 3600.0, 7200.0]), np.array([300.0, 301.0, 305.0]), np.array([-4.0, 0.0, 10.0]), np.array([6.0, -2.0, 0.0]))
+    if not np.allclose(CachedProvider(provider).density_geodetic(*nodes), provider.density_geodetic(*nodes), rtol=1e-12, atol=0):
+        raise ValueError("The cached densities differ from the provider at the nodes")
+
+    # The two sides of a boundary of every axis
+    cached = CachedProvider(provider)
+    centre = np.array([1800.0, 300.5, 1.0, 1.0])
+    for axis, boundary in enumerate((3600.0, 301.0, 2.0, 2.0)):
+        sides = np.tile(centre, (2, 1))
+        sides[:, axis] = boundary + np.array([-1e-9, 1e-9]) * max(boundary, 1)
+        below, above = cached.density_geodetic(*sides.T)
+        if abs(above - below) > 1e-6 * below:
+            raise ValueError(f"The cached density jumps at a boundary of axis {axis}")
+
+    forward = CachedProvider(provider)
+    backward = CachedProvider(provider)
+    values = [forward.density_geodetic(*(axis[i:i + 1] for axis in points))[0] for i in range(n)]
+    values_back = [backward.density_geodetic(*(axis[i:i + 1] for axis in points))[0] for i in reversed(range(n))]
+    if not np.array_equal(values, values_back[::-1]):
+        raise ValueError("The cached densities depend on the order of the queries")
+
+    print("Cached interpolation is correct")
+
+
+# The least recently used nodes are dropped first, also when a single query has more nodes than the cache
+def test_eviction():
+    provider = CountingProvider()
+    # Room for the 16 nodes of 3 cells that share none
+    cached = CachedProvider(provider, alt_step=1.0, max_size=48)
+    for alt in (200.5, 210.5, 220.5, 230.5, 240.5):
+        query(cached, np.array([alt]))
+    if (cached.evictions, len(cached._nodes)) != (32, 48):
+        raise ValueError("The cache is not bounded")
+
+    query(cached, np.array([220.5])) # Kept and now the most recent
+    query(cached, np.array([250.5])) # Drops 230.5
+    points = provider.points
+    query(cached, np.array([240.5]))
+    query(cached, np.array([220.5]))
+    if provider.points != points:
+        raise ValueError("A recently used node was evicted")
+    query(cached, np.array([230.5]))
+    if provider.points != points + 16:
+        raise ValueError("The least recently used nodes were not evicted")
+
+    alts = np.arange(300.5, 310.5)
+    if not np.allclose(query(cached, alts), TableProvider().density_geodetic(0.0, alts, 0.0, 0.0), rtol=1e-12, atol=0):
+        raise ValueError("A query larger than the cache is wrong")
+    if len(cached._nodes) != 48:
+        raise ValueError("The cache is not bounded after a large query")
+
+    print("Cache eviction is correct")
+
+
+if __name__ == "__main__":
+
+    test_table_provider()
+    test_cached_provider()
+    test_interpolation()
+    test_eviction()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Modules.covariance import sigma_points, sigma_statistics
+
+rng = np.random.default_rng(0)
+mean = np.array([6771.0, 10.0, -5.0, 0.01, 7.6, 1.2, 5000.0, 0.0])
+root = rng.normal(size=(8, 8)) * np.array([1.0, 1.0, 1.0, 1e-3, 1e-3, 1e-3, 0.0, 0.2]) # Exact mass, singular
+cov = root @ root.T
+
+
+# The sigma points keep the mean and the covariance, also through a linear map, and the cubature keeps the moments
+# of degree 4 of a gaussian
+def test_sigma_points():
+    A = rng.normal(size=(8, 8))
+    for method in ('ut', 'cubature5'):
+        points, w_m, w_c = sigma_points(mean, cov, method)
+        if len(points) != (17 if method == 'ut' else 129):
+            raise ValueError(f"Wrong number of {method} sigma points")
+        m, c = sigma_statistics(points, w_m, w_c)
+        if not np.allclose(m, mean, rtol=1e-12, atol=1e-9) or not np.allclose(c, cov, rtol=1e-9, atol=1e-12):
+            raise ValueError(f"The {method} sigma points do not keep the mean and the covariance")
+        m, c = sigma_statistics(points @ A.T, w_m, w_c)
+        if not np.allclose(c, A @ cov @ A.T, rtol=1e-9, atol=1e-9):
+            raise ValueError(f"The {method} sigma points do not propagate the covariance through a linear map")
+
+    points, w_m, _ = sigma_points(np.zeros(5), np.eye(5), 'cubature5')
+    if not np.allclose(w_m @ points**4, 3) or not np.allclose(w_m @ (points[:, 0]**2 * points[:, 1]**2), 1):
+        raise ValueError("The cubature does not integrate the moments of degree 4")
+
+    print("Sigma points are correct")
+
+
+if __name__ == "__main__":
+
+    test_sigma_points()
@@ -0,0 +1,72 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Modules.elements import states_to_coes_batch, coes_to_states_batch
+
+mu = 3.986004418e5 # km^3/s^2
+
+
+# Random elements covering elliptic, hyperbolic, equatorial and retrograde orbits
+def random_elements(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    elts = np.zeros((n, 8))
+    elts[:, 0] = rng.uniform(6500, 20000, n)
+    elts[:, 1] = rng.uniform(0.001, 0.95, n)
+    elts[:, 2] = rng.uniform(0, np.pi, n)
+    elts[:, 3] = rng.uniform(0, 2 * np.pi, n)
+    elts[:, 4] = rng.uniform(0, 2 * np.pi, n)
+    elts[:, 5] = rng.uniform(0, 2 * np.pi, n)
+    elts[:, 7] = mu
+
+    elts[:100, 1] = rng.uniform(1.05, 3, 100) # Hyperbolic
+    elts[:100, 5] = rng.uniform(-2, 2, 100)
+    elts[100:200, 2] = 0 # Equatorial
+    elts[200:250, 2] = np.pi # Equatorial retrograde
+
+    return elts, rng.uniform(0, 1e5, n)
+
+
+# Test the batched coes_to_states against spice.conics
+def test_coes_to_states():
+    elts, et = random_elements()
+    states = coes_to_states_batch(elts, et)
+    states_spice = np.array([spice.conics(elts[i], et[i]) for i in range(len(elts))])
+
+    scale = np.linalg.norm(states_spice[:, :3], axis=1)[:, None]
+    if not np.allclose(states / scale, states_spice / scale, rtol=0, atol=1e-11):
+        raise ValueError("coes_to_states_batch does not match spice.conics")
+
+    print("coes_to_states_batch is correct")
+
+
+# Test the batched states_to_coes against spice.oscltx
+def test_states_to_coes():
+    elts, et = random_elements()
+    states = np.array([spice.conics(elts[i], et[i]) for i in range(len(elts))])
+    coes = states_to_coes_batch(states, et, mu)
+    coes_spice = np.array([spice.oscltx(states[i], et[i], mu) for i in range(len(states))])
+
+    # Compare angles on the circle
+    diff = np.abs(coes - coes_spice)
+    for j in (3, 4, 5, 8):
+        diff[:, j] = np.minimum(diff[:, j], 2 * np.pi - diff[:, j])
+
+    if not np.all(diff <= 1e-9 * np.maximum(1, np.abs(coes_spice))):
+        raise ValueError("states_to_coes_batch does not match spice.oscltx")
+
+    # Round trip
+    if not np.allclose(coes_to_states_batch(coes, et), states, rtol=1e-10, atol=1e-8):
+        raise ValueError("The round trip through the coes is not consistent")
+
+    print("states_to_coes_batch is correct")
+
+
+if __name__ == "__main__":
+
+    test_coes_to_states()
+    test_states_to_coes()
@@ -0,0 +1,63 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Config.spacecraft import spacecraft
+from Modules.ensemble import propagate_ensemble, RUNNING, CRASHED, MASS_DEPLETED
+from Modules.events import phase_event_set, CRASH
+from Modules.simulation_math import propagate_phase, H_CRASH
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies and the Sun are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+mu = 398600.4418
+force_model = {'perturbers': (), 'srp': False}
+m_dry = 4000.0
+t_span = np.array([0.0, 4000.0])
+
+
+# State at the apoapsis of an equatorial orbit with the given radii and mass
+def apoapsis_state(r_a:float, r_p:float, mass:float) -> np.ndarray:
+    return np.array([r_a, 0.0, 0.0, 0.0, np.sqrt(mu * (2 / r_a - 2 / (r_a + r_p))), 0.0, mass])
+
+
+# Every member stops on its own: one keeps going, one runs out of propellant and one crashes
+def test_termination():
+    t_empty = 1000.0
+    states0 = np.array([apoapsis_state(6778.0, 6778.0, 5000.0),
+                        apoapsis_state(6778.0, 6778.0, m_dry + t_empty * spacecraft.mass_flow_rate),
+                        apoapsis_state(6778.0, 6300.0, 5000.0)])
+    t_out, states_out, term_time, term_reason = propagate_ensemble(t_span, states0, dt=10, output_every=10, m_dry=m_dry,
+                                                                   threads=2, force_model=force_model)
+
+    if list(term_reason) != [RUNNING, MASS_DEPLETED, CRASHED] or not np.isnan(term_time[0]) or t_out[-1] != t_span[1]:
+        raise ValueError(f"The members do not stop on their own: {term_reason}")
+    if not t_empty <= term_time[1] < t_empty + 10:
+        raise ValueError("The propellant runs out at the wrong time")
+
+    # The crash is at the end of the RK4 step after the crash of DOP853
+    t_crash = propagate_phase(t_span, None, states0[2], compiled=True, verbose=False, engine='DOP853', return_events=True,
+                              events=phase_event_set(h_crash=H_CRASH, m_dry=m_dry), force_model=force_model)[4]
+    t_crash = t_crash['t'][t_crash['kind'] == CRASH][0]
+    if not t_crash <= term_time[2] < t_crash + 10 + 1e-6:
+        raise ValueError("The crash is found at the wrong time")
+
+    # The stopped members keep their last state and the others don't depend on them
+    i_crash = np.searchsorted(t_out, term_time[2])
+    if not np.all(states_out[i_crash:, 2] == states_out[i_crash, 2]) or states_out[-1, 1, 6] > m_dry:
+        raise ValueError("The stopped members move")
+    alone = propagate_ensemble(t_span, states0[:1], dt=10, output_every=10, m_dry=m_dry, threads=1, force_model=force_model)[1]
+    if not np.array_equal(alone[:, 0], states_out[:, 0]):
+        raise ValueError("The running member depends on the others")
+
+    print("Ensemble termination is correct")
+
+
+if __name__ == "__main__":
+
+    test_termination()
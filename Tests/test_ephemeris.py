@@ -0,0 +1,94 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import numpy as np
+import Modules.ephemeris as ephemeris
+from Modules.ephemeris import build_ephemeris, get_ephemeris, ephemeris_positions, save_ephemeris, load_ephemeris, cache_stats, CACHE_SIZE
+
+
+# Circular orbits of 7000 km with a period of 6000 s, the second target on the opposite side, in place of SPICE
+def analytic_positions(targets:tuple, observer:str, ets:np.ndarray, frame:str) -> np.ndarray:
+    ets = np.asarray(ets, dtype=np.float64)
+    angle = 2 * np.pi * ets / 6000.0
+    return np.hstack([sign * 7000.0 * np.column_stack((np.cos(angle), np.sin(angle), 0.1 * np.sin(2 * angle)))
+                      for sign, _ in zip((1, -1), targets)])
+
+
+# Run a test with the analytic positions as the source of the fits
+def with_analytic_source(test):
+    def run():
+        spice_positions = ephemeris._spice_positions
+        ephemeris._spice_positions = analytic_positions
+        try:
+            test()
+        finally:
+            ephemeris._spice_positions = spice_positions
+    run.__name__ = test.__name__
+    return run
+
+
+# The segments are halved until the fit is within the tolerance, and the table is saved and loaded unchanged
+@with_analytic_source
+def test_fit():
+    t_span = np.array([0.0, 86400.0])
+    eph = build_ephemeris(('A', 'B'), 'EARTH', t_span, tol=1e-3)
+    if eph.seg_len >= 4 * 86400 / 16 or eph.max_error > 1e-3 or eph.t0 != 0.0 or eph.t1 < 86400.0:
+        raise ValueError("The segments are not halved down to the tolerance")
+    if build_ephemeris('A', 'EARTH', t_span, tol=1.0).seg_len <= eph.seg_len:
+        raise ValueError("A looser tolerance does not give longer segments")
+
+    ets = np.random.default_rng(0).uniform(0.0, 86400.0, 2000)
+    if np.max(np.abs(ephemeris_positions(ets, eph) - analytic_positions(('A', 'B'), 'EARTH', ets, 'J2000'))) > 2e-3:
+        raise ValueError("The fit is not within the tolerance between its checks")
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'eph.npz')
+        save_ephemeris(path, eph)
+        loaded = load_ephemeris(path)
+    if (loaded.t0, loaded.t1, loaded.seg_len, loaded.max_error) != (eph.t0, eph.t1, eph.seg_len, eph.max_error) or \
+            not np.array_equal(loaded.coeffs, eph.coeffs) or not np.array_equal(ephemeris_positions(ets, loaded), ephemeris_positions(ets, eph)):
+        raise ValueError("The saved ephemeris is not loaded back")
+
+    print("Ephemeris fit is correct")
+
+
+# The cache reuses the tables that cover a window and keeps at most CACHE_SIZE of them
+@with_analytic_source
+def test_cache():
+    ephemeris._cache.clear()
+    first = get_ephemeris('A', 'EARTH', np.array([0.0, 3600.0]), tol=1.0)
+    if get_ephemeris('a', 'earth', np.array([1000.0, 2000.0]), tol=1.0) is not first:
+        raise ValueError("The cached ephemeris is not reused")
+
+    for day in range(1, CACHE_SIZE + 5):
+        get_ephemeris('A', 'EARTH', np.array([day * 5 * 86400.0, day * 5 * 86400.0 + 3600.0]), tol=1.0)
+    if cache_stats()['size'] != CACHE_SIZE:
+        raise ValueError("The cache is not bounded")
+    misses = cache_stats()['misses']
+    get_ephemeris('A', 'EARTH', np.array([0.0, 3600.0]), tol=1.0)
+    if cache_stats()['misses'] != misses + 1:
+        raise ValueError("The least recently used ephemeris is not dropped")
+    ephemeris._cache.clear()
+
+    # A tolerance under the rounding of the positions is never reached, the best fit is kept and reused for it
+    misses = cache_stats()['misses']
+    best = get_ephemeris('A', 'EARTH', np.array([0.0, 3600.0]), tol=1e-14, pad=0)
+    if best.max_error <= 1e-14 or get_ephemeris('A', 'EARTH', np.array([0.0, 3600.0]), tol=1e-14, pad=0) is not best:
+        raise ValueError("The best effort ephemeris is not reused")
+    if get_ephemeris('A', 'EARTH', np.array([0.0, 3600.0]), tol=1e-13, pad=0) is not best or cache_stats()['misses'] != misses + 1:
+        raise ValueError("The best effort ephemeris is not reused for a looser tolerance")
+    if cache_stats()['size'] != 1:
+        raise ValueError("The best effort ephemeris is cached several times")
+    ephemeris._cache.clear()
+
+    print("Ephemeris cache is correct")
+
+
+if __name__ == "__main__":
+
+    test_fit()
+    test_cache()
@@ -0,0 +1,67 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Config.spacecraft import spacecraft
+from Modules.events import phase_event_set, scipy_events, CRASH, PERIAPSIS, APOAPSIS
+from Modules.simulation_math import propagate_phase, H_CRASH
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies, the Sun and the eclipses are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+mu = 398600.4418
+sc = spacecraft._replace(thrust=None)
+force_model = {'perturbers': (), 'srp': False}
+event_set = phase_event_set(sc=sc, h_crash=H_CRASH)
+
+
+# State at the periapsis (or the apoapsis) of an equatorial orbit with the given radii
+def apsis_state(r_start:float, r_other:float) -> np.ndarray:
+    a = (r_start + r_other) / 2
+    return np.array([r_start, 0.0, 0.0, 0.0, np.sqrt(mu * (2 / r_start - 1 / a)), 0.0, sc.mass0])
+
+
+# The event functions of solve_ivp evaluate the set once per (t, y) and return the values of evaluate_events
+def test_scipy_events():
+    funcs = scipy_events(event_set)
+    state = apsis_state(6700.0, 8000.0)
+    values = [func(10.0, state) for func in funcs]
+    state[0] += 1.0
+    moved = [func(10.0, state) for func in funcs]
+    if values == moved or [func(10.0, apsis_state(6700.0, 8000.0)) for func in funcs] != values:
+        raise ValueError("The event values are kept for the wrong state")
+
+    print("Event functions are correct")
+
+
+# DOP853 and KS find the same apsides, atmosphere crossings and crash as solve_ivp
+def test_engine_events():
+    cases = [(apsis_state(6678.0, 8378.0), 10000.0),  # Two apoapsides and a periapsis, crossing the atmosphere boundary
+             (apsis_state(6778.0, 6378.0), 5000.0)]   # Periapsis under the ground, ends with the crash
+    for state0, t_phase in cases:
+        found = {}
+        for engine in ('LSODA', 'DOP853', 'KS'):
+            found[engine] = propagate_phase(np.array([0.0, t_phase]), None, state0, compiled=True, sc=sc, verbose=False, engine=engine,
+                                            events=event_set, return_events=True, force_model=force_model)[4]
+        reference = found['LSODA'][found['LSODA']['t'] > 0] # solve_ivp also reports the apsis the orbit starts on
+        if not np.isin([PERIAPSIS, APOAPSIS, CRASH], reference['kind']).any():
+            raise ValueError("The orbit has no apsis nor crash")
+        for engine in ('DOP853', 'KS'):
+            events = found[engine]
+            if not np.array_equal(events['kind'], reference['kind']) or not np.allclose(events['t'], reference['t'], rtol=0, atol=1e-2):
+                raise ValueError(f"{engine} finds other events than solve_ivp: {events[['t', 'kind']]} instead of {reference[['t', 'kind']]}")
+    if reference['kind'][-1] != CRASH:
+        raise ValueError("The crash is not found")
+
+    print("Engine events are correct")
+
+
+if __name__ == "__main__":
+
+    test_scipy_events()
+    test_engine_events()
@@ -0,0 +1,74 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from math import factorial
+import numpy as np
+import spiceypy as spice
+from scipy.special import lpmv
+from Modules.gravity import build_gravity_field, body_rotation, gravity_acceleration, C_IDX, S_IDX
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+positions = np.array([[7000.0, 1200.0, 3000.0], [10.0, 20.0, 6900.0], [-5000.0, 4000.0, -2000.0], [0.0, 0.0, -7200.0]])
+
+
+# Potential of the field without its point mass term, with scipy's Legendre functions
+def potential(position, field):
+    r = np.linalg.norm(position)
+    u = position[2] / r
+    lam = np.arctan2(position[1], position[0])
+    U = 0.0
+    for n in range(2, field.n_max + 1):
+        for m in range(min(n, field.m_max) + 1):
+            N = np.sqrt((2 - (m == 0)) * (2 * n + 1) * factorial(n - m) / factorial(n + m))
+            P = (-1)**m * lpmv(m, n, u) # Without the Condon-Shortley phase
+            U += field.mu / r * (field.R / r)**n * N * P * (field.coef[C_IDX, n, m] * np.cos(m * lam) + field.coef[S_IDX, n, m] * np.sin(m * lam))
+
+    return U
+
+
+# The degree 2 zonal field is the usual J2 acceleration
+def test_J2():
+    field = build_gravity_field('Earth', 0.0, 2, 0)
+    J2 = -np.sqrt(5) * field.coef[C_IDX, 2, 0]
+    for position in positions:
+        r = np.linalg.norm(position)
+        z2 = 5 * position[2]**2 / r**2
+        a_J2 = 1.5 * field.mu * J2 * field.R**2 / r**5 * position * np.array([z2 - 1, z2 - 1, z2 - 3])
+        a = np.array(gravity_acceleration(position, np.eye(3), field))
+        if not np.allclose(a, a_J2, rtol=1e-12, atol=0):
+            raise ValueError("The degree 2 field does not match the J2 acceleration")
+
+    print("Degree 2 field is correct")
+
+
+# The full field is the gradient of the potential, in the body fixed frame and through the rotation
+def test_gravity_acceleration():
+    field = build_gravity_field('Earth', 0.0, 8, 8)
+    rot = body_rotation(5e4, field)
+    for position in positions:
+        grad = np.array([(potential(position + e, field) - potential(position - e, field)) / 2e-2 for e in np.eye(3) * 1e-2])
+        a = np.array(gravity_acceleration(position, np.eye(3), field))
+        # The finite differences of the reference lose digits near the pole
+        if np.max(np.abs(a - grad)) > 1e-6 * np.max(np.abs(a)):
+            raise ValueError("The gravity acceleration is not the gradient of the potential")
+
+        a_rot = rot.T @ np.array(gravity_acceleration(rot @ position, np.eye(3), field))
+        if not np.allclose(np.array(gravity_acceleration(position, rot, field)), a_rot, rtol=1e-12, atol=0):
+            raise ValueError("The gravity acceleration does not rotate with the body")
+
+    if np.max(np.abs(rot - spice.pxform('J2000', 'IAU_EARTH', 5e4))) > 1e-6:
+        raise ValueError("body_rotation does not match the SPICE body fixed frame")
+
+    print("Gravity acceleration is correct")
+
+
+if __name__ == "__main__":
+
+    test_J2()
+    test_gravity_acceleration()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Modules.atmos import SPECIES, get_atmos, get_air_table, get_species_log, make_atmos_table, atmos_interp
+from Modules.intake import INTAKE_IDX, INTAKE_SIZE, intake_rates, intake_state, flows_hist
+
+# Molecular masses of SPECIES, in kg
+MASSES = np.array([15.999, 28.014, 31.998, 4.0026, 39.948, 1.008, 14.007]) * 1.66053907e-27
+
+
+# The captured particles are the species densities times the flux, and their mass is the captured air
+def test_intake_rates():
+    data = get_atmos()
+    table = get_air_table()
+    log_n = get_species_log()
+    flux = 1.2e4
+    state_dot = np.zeros(INTAKE_IDX + INTAKE_SIZE)
+    for h in np.linspace(120.0, 740.0, 37):
+        m_in = atmos_interp(h, table) * flux
+        intake_rates(h, m_in, flux, table, log_n, state_dot)
+        for j, species in enumerate(SPECIES):
+            n = atmos_interp(h, make_atmos_table(data.h, getattr(data, species))) * flux
+            if not np.isclose(state_dot[INTAKE_IDX + 1 + j], n, rtol=1e-12, atol=0):
+                raise ValueError(f"The captured {species} does not match its density")
+
+        # The air density of MSIS leaves the anomalous oxygen out
+        if abs(np.sum(MASSES * state_dot[INTAKE_IDX + 1:]) / state_dot[INTAKE_IDX] - 1) > 1e-2:
+            raise ValueError("The captured species do not add up to the captured air")
+
+    intake_rates(1000.0, 0.0, flux, table, log_n, state_dot)
+    if np.any(state_dot[INTAKE_IDX:] != 0):
+        raise ValueError("The intake captures particles out of the atmosphere")
+
+    print("Intake rates are correct")
+
+
+# The flows of every step add up to the captured totals
+def test_flows_hist():
+    states = intake_state(np.tile(np.arange(7.0), (5, 1)))
+    states[:, INTAKE_IDX:] = np.cumsum(np.random.default_rng(0).random((5, INTAKE_SIZE)), axis=0)
+    flows = flows_hist(states, 'MARST')
+    totals = states[-1, INTAKE_IDX:] - states[0, INTAKE_IDX:]
+    if not np.allclose([np.sum(flows[key]) for key in ('air_mass',) + SPECIES], totals, rtol=1e-12, atol=0):
+        raise ValueError("The flows do not add up to the captured totals")
+
+    print("Flows history is correct")
+
+
+if __name__ == "__main__":
+
+    test_intake_rates()
+    test_flows_hist()
@@ -0,0 +1,114 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import scipy.integrate as spi
+from numba import njit
+from Modules.integrators import dop853, no_events, check_status, FINISHED, TERMINATED, STEP_TOO_SMALL
+
+y0 = np.array([1.0, 0.0, 0.0, 1.2])
+args = np.array([1.0])
+
+
+# Two body problem in the plane, args = [mu]
+@njit
+def two_body(t, y, args, out):
+    r3 = (y[0]**2 + y[1]**2)**1.5
+    out[0] = y[2]
+    out[1] = y[3]
+    out[2] = -args[0] * y[0] / r3
+    out[3] = -args[0] * y[1] / r3
+
+
+# x and y crossing zero
+@njit
+def crossings(t, y, args, out):
+    out[0] = y[0]
+    out[1] = y[1]
+
+
+# Same right-hand side for solve_ivp
+def two_body_scipy(t, y):
+    out = np.empty(4)
+    two_body.py_func(t, y, args, out)
+    return out
+
+
+# Same steps as scipy's DOP853, the solutions only differ by the round-off of the sums
+def test_dop853():
+    no_event = np.zeros(0, dtype=np.bool_)
+    t_hist, y_hist, _, _, _, n_steps, _, _, status = dop853(two_body, no_events, 0.0, 30.0, y0, args, no_event, np.zeros(0), 1e-10, 1e-10)
+    sol = spi.solve_ivp(two_body_scipy, (0, 30), y0, method='DOP853', rtol=1e-10, atol=1e-10)
+
+    if status != FINISHED or n_steps != len(sol.t) - 1:
+        raise ValueError("dop853 doesn't take the same steps as scipy")
+    if not np.allclose(y_hist, sol.y.T, rtol=1e-5, atol=1e-5):
+        raise ValueError("dop853 doesn't match scipy")
+
+    # Dense output every 0.5 s, backwards in time
+    t_back, y_back, _, _, _, _, _, _, _ = dop853(two_body, no_events, 30.0, 0.0, y_hist[-1], args, no_event, np.zeros(0), 1e-10, 1e-10, 0.5)
+    if not np.allclose(t_back, np.linspace(30, 0, 61)) or not np.allclose(y_back[-1], y0, atol=1e-7):
+        raise ValueError("The dense output backwards in time is not consistent")
+
+    print("dop853 is correct")
+
+
+# Events match the ones of solve_ivp
+def test_dop853_events():
+    t_hist, y_hist, event_t, event_idx, event_y, _, _, _, status = dop853(two_body, crossings, 0.0, 30.0, y0, args,
+                                                                           np.array([True, False]), np.array([-1.0, 0.0]), 1e-10, 1e-10)
+
+    event_x = lambda t, y: y[0]
+    event_x.terminal = True
+    event_x.direction = -1
+    sol = spi.solve_ivp(two_body_scipy, (0, 30), y0, method='DOP853', rtol=1e-10, atol=1e-10, events=[event_x, lambda t, y: y[1]])
+
+    if status != TERMINATED or not np.isclose(t_hist[-1], sol.t_events[0][0], rtol=1e-9):
+        raise ValueError("The terminal event doesn't match solve_ivp")
+    if not np.allclose(event_t[event_idx == 1], sol.t_events[1], rtol=1e-9) or not np.allclose(event_y[-1], y_hist[-1]):
+        raise ValueError("The events don't match solve_ivp")
+
+    print("dop853 events are correct")
+
+
+# Steps ended at the restart events, each of them is a step of the history and the solution doesn't change
+def test_dop853_restart():
+    no_terminal = np.array([False, False])
+    direction = np.array([0.0, 0.0])
+    t_hist, y_hist, event_t, event_idx, _, _, _, _, status = dop853(two_body, crossings, 0.0, 30.0, y0, args, no_terminal, direction,
+                                                                    1e-10, 1e-10, restart=np.array([True, False]))
+    _, y_ref, event_ref, _, _, _, _, _, _ = dop853(two_body, crossings, 0.0, 30.0, y0, args, no_terminal, direction, 1e-10, 1e-10)
+
+    if status != FINISHED or len(event_t) != len(event_ref) or not np.allclose(event_t, event_ref, rtol=1e-9):
+        raise ValueError("The events change with the restarts")
+    if not np.all(np.isin(event_t[event_idx == 0], t_hist)):
+        raise ValueError("The steps don't end at the restart events")
+    if not np.allclose(y_hist[-1], y_ref[-1], atol=1e-7):
+        raise ValueError("The solution changes with the restarts")
+
+    print("dop853 restarts are correct")
+
+
+# Far from t = 0 the round-off of t bounds the steps, a tolerance that needs shorter ones stops the integration
+def test_dop853_step_collapse():
+    no_event = np.zeros(0, dtype=np.bool_)
+    t_hist, _, _, _, _, _, _, _, status = dop853(two_body, no_events, 1e12, 1e12 + 30.0, y0, args, no_event, np.zeros(0), 1e-20, 1e-20)
+    if status != STEP_TOO_SMALL or t_hist[-1] >= 1e12 + 30.0:
+        raise ValueError("The collapse of the step size is not reported")
+    try:
+        check_status(status, t_hist[-1])
+    except ValueError:
+        print("dop853 step collapse is reported")
+        return
+    raise ValueError("check_status does not raise on a collapsed step size")
+
+
+if __name__ == "__main__":
+
+    test_dop853()
+    test_dop853_events()
+    test_dop853_restart()
+    test_dop853_step_collapse()
@@ -0,0 +1,77 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Config import bodies_data as bd
+from Config.spacecraft import spacecraft
+from Modules.elements import states_to_coes_batch
+from Modules.events import phase_event_set
+from Modules.mean_elements import propagate_mean
+from Modules.simulation_math import propagate_phase, H_CRASH
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies, the Sun and the eclipses are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+mu = bd.Earth.gravitational_parameter
+R_e = bd.Earth.radius_equator
+# A large drag area, so the periapsis drops from 280 km to the handoff in a few days
+sc = spacecraft._replace(thrust=None, A=1000.0)
+force_model = {'perturbers': (), 'srp': False}
+events = phase_event_set(sc=sc, h_crash=H_CRASH)
+r_a, r_p = R_e + 600, R_e + 280
+state0 = np.array([r_a, 0.0, 0.0, 0.0, np.sqrt(mu * (2 / r_a - 2 / (r_a + r_p))), 0.3, sc.mass0])
+
+
+# The mean propagation hands off to the cartesian one when the periapsis reaches h_handoff
+def test_handoff():
+    t_span = np.array([0.0, 5 * 86400.0])
+    t_hist, coes, mass_hist, handoff = propagate_mean(t_span, state0, sc=sc, h_handoff=250.0, dt_out=86400.0,
+                                                      force_model=force_model, events=events)
+
+    if handoff is None or not t_span[0] < t_hist[-1] < t_span[1]:
+        raise ValueError("The mean propagation does not hand off")
+    if abs(coes[-1, 0] - R_e - 250.0) > 1e-3:
+        raise ValueError("The handoff is not at the periapsis height h_handoff")
+
+    # The cartesian propagation starts from the last mean state and runs to the end of the span
+    t_cart, pos_cart, vel_cart, mass_cart = handoff
+    end_coes = states_to_coes_batch(np.concatenate((pos_cart[0], vel_cart[0])), t_cart[0], mu)[0]
+    if t_cart[0] != t_hist[-1] or t_cart[-1] != t_span[1] or mass_cart[0] != mass_hist[-1]:
+        raise ValueError("The cartesian propagation does not continue the mean one")
+    if not np.allclose(end_coes[[0, 1, 2, 9]], coes[-1, [0, 1, 2, 9]], rtol=1e-9, atol=1e-9):
+        raise ValueError("The handoff state is not the last mean state")
+
+    print("Mean element handoff is correct")
+
+
+# Above the atmosphere the averaged thrust raises the semi-major axis like the cartesian propagation over a day.
+# The mean elements start from the osculating ones, so the comparison is on the orbit averages of the cartesian orbit
+def test_mean_rates():
+    thrusting = spacecraft
+    r = R_e + 800
+    state = np.array([r, 0.0, 0.0, 0.0, np.sqrt(mu / r), 0.5, thrusting.mass0])
+    t_hist, coes, mass_hist, handoff = propagate_mean(np.array([0.0, 86400.0]), state, sc=thrusting, dt_out=3600.0, force_model=force_model)
+    if handoff is not None or t_hist[-1] != 86400.0 or abs(mass_hist[-1] - (thrusting.mass0 - 86400.0 * thrusting.mass_flow_rate)) > 1e-6:
+        raise ValueError("The mean propagation does not reach the end of the span")
+
+    t_cart, pos, vel, _ = propagate_phase(np.array([0.0, 86400.0]), None, state, compiled=True, sc=thrusting, verbose=False, engine='RK8',
+                                          dt=10.0, events=phase_event_set(sc=thrusting, h_crash=H_CRASH), force_model=force_model)
+    a_osc = states_to_coes_batch(np.column_stack((pos, vel)), t_cart, mu)[:, 9]
+    period = coes[0, 10]
+    gain_cart = np.mean(a_osc[t_cart > 86400.0 - period]) - np.mean(a_osc[t_cart < period])
+    gain_mean = np.diff(np.interp([period / 2, 86400.0 - period / 2], t_hist, coes[:, 9]))[0]
+    if gain_cart < 10.0 or abs(gain_mean - gain_cart) > 0.02 * gain_cart:
+        raise ValueError(f"The mean gain of the semi-major axis {gain_mean:.3f} km differs from the cartesian one {gain_cart:.3f} km")
+
+    print("Mean element rates are correct")
+
+
+if __name__ == "__main__":
+
+    test_handoff()
+    test_mean_rates()
@@ -0,0 +1,67 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import numpy as np
+import spiceypy as spice
+from Config.spacecraft import spacecraft
+from Modules.events import phase_event_set
+from Modules.mission import Phase, run_mission, load_history, last_checkpoint, FINISHED, CHECKPOINT_SIZE, HISTORY_SIZE
+from Modules.simulation_math import H_CRASH
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies, the Sun and the eclipses are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+# Circular orbit at 400 km, a coast then a thrust arc
+state0 = np.array([6778.0, 0.0, 0.0, 0.0, 7.669, 0.0, 5000.0])
+force_model = {'perturbers': (), 'srp': False}
+coast = spacecraft._replace(thrust=None)
+phases = [Phase('coast', 2500.0, sc_changes={'thrust': None}, force_model=force_model, events=phase_event_set(sc=coast, h_crash=H_CRASH)),
+          Phase('thrust', 2000.0, force_model=force_model, events=phase_event_set(h_crash=H_CRASH))]
+
+
+# A mission cut after a checkpoint, with a half written record and rows past it, resumes to the same history
+def test_resume():
+    with tempfile.TemporaryDirectory() as folder:
+        reference_file = os.path.join(folder, 'reference.bin')
+        t_ref, states_ref, phase_ref, status = run_mission(phases, state0, 0.0, reference_file, checkpoint_every=1000, verbose=False)
+        if status != FINISHED or abs(t_ref[-1] - 4500.0) > 1e-6 or list(np.unique(phase_ref)) != [0, 1]:
+            raise ValueError("The mission does not run its phases")
+        if last_checkpoint(reference_file)[4] != len(t_ref):
+            raise ValueError("The checkpoint does not count the rows of the history")
+
+        # Keep three checkpoints, then cut the fourth record and leave rows after the third
+        cut_file = os.path.join(folder, 'cut.bin')
+        run_mission(phases, state0, 0.0, cut_file, checkpoint_every=1000, verbose=False)
+        records = np.fromfile(cut_file, dtype=np.float64).reshape(-1, CHECKPOINT_SIZE)
+        n_rows = int(records[2, 4])
+        np.concatenate((records[:3].ravel(), records[3, :5])).tofile(cut_file)
+        with open(cut_file + '.hist', 'ab') as hist:
+            hist.truncate((n_rows + 5) * HISTORY_SIZE * 8)
+        if last_checkpoint(cut_file)[2] != records[2, 2] or len(load_history(cut_file)[0]) != n_rows:
+            raise ValueError("The cut records are not dropped")
+
+        t_hist, states, phase_idx, status = run_mission(phases, state0, 0.0, cut_file, checkpoint_every=1000, verbose=False)
+        if status != FINISHED or not np.array_equal(t_hist, t_ref) or not np.array_equal(states, states_ref) or not np.array_equal(phase_idx, phase_ref):
+            raise ValueError("The resumed mission differs from the uninterrupted one")
+        if os.path.getsize(cut_file) != os.path.getsize(reference_file):
+            raise ValueError("The checkpoints of the resumed mission are wrong")
+
+        # A checkpoint of another seed is not resumed
+        try:
+            run_mission(phases, state0, 0.0, cut_file, checkpoint_every=1000, seed=1, verbose=False)
+        except ValueError:
+            pass
+        else:
+            raise ValueError("The seed of the checkpoint is not checked")
+
+    print("Mission resume is correct")
+
+
+if __name__ == "__main__":
+
+    test_resume()
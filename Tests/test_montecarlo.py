@@ -0,0 +1,63 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import tempfile
+from Modules.montecarlo import sample_case, done_runs, load_results, run_campaign
+from Modules.helper import ROOT
+
+dispersions = {'Periapsis': ('normal', 200, 5), 'C_D': ('uniform', 2.0, 2.4), 'Inclination': ('choice', [0, 45, 90])}
+
+
+# The inputs of a run only depend on the seed and its index
+def test_sample_case():
+    forward = [sample_case(dispersions, 7, run_id) for run_id in range(5)]
+    backward = [sample_case(dict(reversed(list(dispersions.items()))), 7, run_id) for run_id in reversed(range(5))][::-1]
+    if forward != backward:
+        raise ValueError("The samples depend on the order of the runs")
+    if forward[0] == forward[1] or forward[0] == sample_case(dispersions, 8, 0):
+        raise ValueError("The samples do not change with the run or the seed")
+
+    print("Sampling is correct")
+
+
+# A cut line is skipped on resume and closed before the new runs, the runs that raise are written as errors and retried
+def test_resume():
+    with tempfile.TemporaryDirectory() as folder:
+        results_file = os.path.join(folder, 'runs.jsonl')
+        with open(results_file, 'w') as file:
+            file.write(json.dumps({'run_id': 0, 'lifetime': 1.0}) + '\n')
+            file.write(json.dumps({'run_id': 1, 'lifetime': 2.0}) + '\n')
+            file.write('{"run_id": 2, "life')
+
+        if done_runs(results_file) != {0, 1}:
+            raise ValueError("The cut line is not skipped")
+
+        # Every apoapsis is below the periapsis, so every run raises in orbit_state before any propagation
+        failing = {'Apoapsis': ('uniform', 100, 150)}
+        pck = os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt')
+        n_done = run_campaign(failing, 4, results_file, workers=1, meta_kernel=pck)
+        runs = load_results(results_file)
+        if n_done != 2 or [run['run_id'] for run in runs] != [0, 1, 2, 3] or done_runs(results_file, retry_failed=False) != {0, 1, 2, 3}:
+            raise ValueError("The campaign does not resume after the cut line")
+        if not all(run['error'].startswith('ValueError') and run['sample'] == sample_case(failing, 0, run['run_id']) for run in runs[2:]):
+            raise ValueError("The failed runs are not recorded")
+
+        # The failed runs are run again on resume unless retry_failed is off, and their error lines are kept
+        if run_campaign(failing, 4, results_file, workers=1, meta_kernel=pck, retry_failed=False) != 0:
+            raise ValueError("The failed runs are run again with retry_failed off")
+        if run_campaign(failing, 4, results_file, workers=1, meta_kernel=pck) != 2:
+            raise ValueError("The failed runs are not retried")
+        if [run['run_id'] for run in load_results(results_file)] != [0, 1, 2, 2, 3, 3] or done_runs(results_file) != {0, 1}:
+            raise ValueError("The error lines of the retried runs are wrong")
+
+    print("Resume is correct")
+
+
+if __name__ == "__main__":
+
+    test_sample_case()
+    test_resume()
@@ -0,0 +1,61 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import numpy as np
+import spiceypy as spice
+from Modules.dynamics import build_force_model
+from Modules.events import phase_event_set, phase_events
+from Modules.integrators import dop853
+from Modules.profiling import RunProbe, report_json, report_folded
+from Modules.simulation_math import _phase_rhs
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies and the Sun are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+# Circular orbit at 300 km, always inside the atmosphere
+state0 = np.array([6678.0, 0.0, 0.0, 0.0, 7.726, 0.0, 5000.0])
+t_span = np.array([0.0, 6000.0])
+
+
+# The counters of the kernel match the calls of the engine, the report adds up and the trajectory doesn't change
+def test_run_report():
+    event_set = phase_event_set()
+    run = lambda fm: dop853(_phase_rhs, phase_events, t_span[0], t_span[1], state0, (fm, event_set), event_set.terminal,
+                            event_set.direction, 1e-9, 1e-9, restart=event_set.restart, n_err=7)
+
+    fm = build_force_model(t_span, perturbers=(), srp=False, profile=True)
+    with RunProbe() as probe:
+        t_hist, y_hist, _, _, _, n_steps, n_rejected, n_rhs, _ = run(fm)
+        probe.mark('DOP853')
+        probe.record('DOP853', t_hist, y_hist, n_steps, n_rejected, fm=fm)
+    report = probe.report()
+
+    if report.rhs_calls != n_rhs or report.atmos_lookups != n_rhs:
+        raise ValueError("The counters do not match the calls of the engine")
+    if sum(band['steps'] for band in report.step_bands) != n_steps or report.rejected_steps != n_rejected:
+        raise ValueError("The steps of the report do not add up")
+    if set(report.terms) != {'ephemeris', 'rotation', 'central', 'harmonics', 'drag', 'thrust'}:
+        raise ValueError("The force terms of the report do not match the force model")
+
+    plain = build_force_model(t_span, perturbers=(), srp=False)
+    if plain.counters.size != 0 or not np.array_equal(run(plain)[1], y_hist):
+        raise ValueError("The counters change the run")
+
+    if json.loads(report_json(report))['rhs_calls'] != n_rhs:
+        raise ValueError("The JSON report is wrong")
+    for line in report_folded(report).splitlines():
+        stack, count = line.rsplit(' ', 1)
+        if not stack.startswith('propagate_phase;') or int(count) < 0:
+            raise ValueError("The folded stacks are wrong")
+
+    print("Run report is correct")
+
+
+if __name__ == "__main__":
+
+    test_run_report()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Modules.dynamics import build_force_model
+from Modules.events import phase_event_set
+from Modules.regularised import state_to_ks, ks_to_states, propagate_ks
+from Modules.helper import ROOT
+
+mu = 398600.4418
+
+
+# The KS coordinates of a state give the state back, on both branches of the conversion
+def test_ks_round_trip():
+    states = np.array([[7000.0, -1200.0, 300.0, 0.5, 7.4, 1.1, 5000.0, 2.0],    # x >= 0
+                       [0.0, 6800.0, -400.0, -7.5, 0.2, 0.9, 4000.0, 0.0],      # x = 0
+                       [-6900.0, 800.0, 2500.0, -1.0, -6.9, 2.2, 3000.0, 1.5],  # x < 0
+                       [-8000.0, 0.0, 0.0, 0.0, -7.0, 0.0, 2000.0, 3.0]])       # x < 0 on the axis
+    for state in states:
+        y = state_to_ks(state, 123.0, mu)
+        if not np.allclose(ks_to_states(y[None, :])[0], state, rtol=1e-13, atol=1e-12):
+            raise ValueError(f"The round trip of {state} through the KS coordinates is wrong")
+        if abs(np.sum(y[:4]**2) - np.linalg.norm(state[:3])) > 1e-9 or y[9] != 123.0:
+            raise ValueError("The KS state is wrong")
+        if abs(y[8] - (mu / np.linalg.norm(state[:3]) - np.sum(state[3:6]**2) / 2)) > 1e-12:
+            raise ValueError("The energy of the KS state is wrong")
+
+    print("KS conversions are correct")
+
+
+# A backward phase is rejected before the integration
+def test_backward_span():
+    spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+    t_span = np.array([1000.0, 0.0])
+    fm = build_force_model(t_span[::-1], perturbers=(), srp=False)
+    try:
+        propagate_ks(t_span, np.array([6778.0, 0.0, 0.0, 0.0, 7.669, 0.0, 5000.0]), fm, phase_event_set())
+    except ValueError:
+        pass
+    else:
+        raise ValueError("The backward phase is not rejected")
+
+    print("Backward KS phases are rejected")
+
+
+if __name__ == "__main__":
+
+    test_ks_round_trip()
+    test_backward_span()
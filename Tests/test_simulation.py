@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Config.spacecraft import spacecraft
+from Modules.events import phase_event_set, CRASH
+from Modules.simulation_math import propagate_phase, H_CRASH
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies, the Sun and the eclipses are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+mu = 398600.4418
+sc = spacecraft._replace(thrust=None)
+force_model = {'perturbers': (), 'srp': False}
+event_set = phase_event_set(sc=sc, h_crash=H_CRASH)
+
+
+# State at the apoapsis of an equatorial orbit with the given radii
+def apoapsis_state(r_a:float, r_p:float) -> np.ndarray:
+    return np.array([r_a, 0.0, 0.0, 0.0, np.sqrt(mu * (2 / r_a - 2 / (r_a + r_p))), 0.0, sc.mass0])
+
+
+# The fixed step engines find the apsides, atmosphere crossings and crash of DOP853, and stop at the crash
+def test_fixed_step_events():
+    cases = [(apoapsis_state(8378.0, 6678.0), 10000.0),  # Apsides and atmosphere crossings
+             (apoapsis_state(6778.0, 6378.0), 5000.0)]   # Periapsis under the ground, ends with the crash
+    for state0, t_phase in cases:
+        run = lambda engine, dt, decimation=1: propagate_phase(np.array([0.0, t_phase]), None, state0, compiled=True, sc=sc, verbose=False,
+                                                               engine=engine, dt=dt, decimation=decimation, events=event_set,
+                                                               return_events=True, force_model=force_model)
+        reference = run('DOP853', None)[4]
+        for engine, dt, tol in (('RK8', 10.0, 1e-3), ('RK4', 10.0, 1e-2), ('Verlet', 1.0, 1e-1)):
+            t_hist, _, _, _, events = run(engine, dt, decimation=7)
+            if not np.array_equal(events['kind'], reference['kind']) or not np.allclose(events['t'], reference['t'], rtol=0, atol=tol):
+                raise ValueError(f"{engine} finds other events than DOP853: {events[['t', 'kind']]} instead of {reference[['t', 'kind']]}")
+            if not np.allclose(events['state'], reference['state'], rtol=0, atol=100 * tol):
+                raise ValueError(f"The states at the events of {engine} are wrong")
+            if t_hist[-1] != (events['t'][-1] if events['kind'][-1] == CRASH else t_phase) or np.any(np.diff(t_hist) <= 0):
+                raise ValueError(f"The history of {engine} does not end at the crash or at the end of the phase")
+    if reference['kind'][-1] != CRASH:
+        raise ValueError("The crash is not found")
+
+    print("Fixed step events are correct")
+
+
+if __name__ == "__main__":
+
+    test_fixed_step_events()
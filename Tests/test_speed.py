@@ -6,22 +6,410 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import time
 import numpy as np
+import spiceypy as spice
 # from Modules.dynamics import acceleration, acceleration_new
 
-def timer_decorator(func):
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        func(*args, **kwargs)
-        end = time.time()
-        print(f"Time taken to run {func.__name__}: {end - start} seconds")
-    return wrapper
+# Per call speed of the python acceleration against the compiled one
+def benchmark_acceleration(n_calls=20000):
+    from Modules.dynamics import acceleration, acceleration_compiled, build_force_model
+
+    state = np.array([6571, 0, 0, 0, 7.8, 0, 5000], dtype=np.float64)
+    ets = np.linspace(0, 1e6, n_calls)
+    fm = build_force_model(np.array([0, 1e6]))
+    acceleration_compiled(0.0, state, fm) # Compile before timing
+
+    start = time.perf_counter()
+    for et in ets:
+        acceleration(et, state)
+    t_python = (time.perf_counter() - start) / n_calls
+
+    start = time.perf_counter()
+    for et in ets:
+        acceleration_compiled(et, state, fm)
+    t_compiled = (time.perf_counter() - start) / n_calls
+
+    print(f"acceleration: {t_python * 1e6:.2f} us per call")
+    print(f"acceleration_compiled: {t_compiled * 1e6:.2f} us per call")
+    print(f"Speedup: {t_python / t_compiled:.1f}x")
+
+
+# Atmosphere lookup: linear scan in linear_interp against the table lookup, over the full altitude range
+def benchmark_atmos_lookup(n_points=200000):
+    from numba import njit
+    from Modules.helper import linear_interp
+    from Modules.atmos import h, air, air_table, atmos_interp_batch, make_atmos_table
+
+    @njit
+    def scan_batch(x, xp, fp):
+        out = np.empty(len(x))
+        for i in range(len(x)):
+            out[i] = linear_interp(x[i], xp, fp)
+        return out
+
+    x = np.random.default_rng(0).uniform(h[0], h[-1], n_points)
+    # Same heights with a tiny perturbation so the binary search path is used
+    table_search = make_atmos_table(h + np.linspace(0, 1e-3, len(h)), air)
+    scan_batch(x[:10], h, air)
+    atmos_interp_batch(x[:10], air_table)
+    atmos_interp_batch(x[:10], table_search)
+
+    for name, func, args in (('linear_interp scan', scan_batch, (x, h, air)),
+                             ('table, uniform grid', atmos_interp_batch, (x, air_table)),
+                             ('table, binary search', atmos_interp_batch, (x, table_search))):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed / n_points * 1e9:.1f} ns per lookup")
+
+
+# Cost of the spherical harmonic field against its degree, and of the adaptive truncation at several heights
+def benchmark_gravity(n_points=100000, degrees=(2, 4, 6, 8), tol=1e-9):
+    from numba import njit
+    from Modules.gravity import build_gravity_field, body_rotation, gravity_acceleration
+
+    @njit
+    def evaluate_batch(positions, rot, field):
+        a = 0.0
+        for i in range(positions.shape[0]):
+            a += gravity_acceleration(positions[i], rot, field)[0]
+        return a
+
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(n_points, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+
+    for height in (200, 2000, 35786):
+        positions = directions * (6378.137 + height)
+        for degree in degrees:
+            for field_tol in (0.0, tol):
+                field = build_gravity_field('Earth', 0.0, degree, degree, field_tol)
+                rot = body_rotation(1e3, field)
+                evaluate_batch(positions[:10], rot, field) # Compile before timing
+                start = time.perf_counter()
+                evaluate_batch(positions, rot, field)
+                elapsed = time.perf_counter() - start
+                mode = f"adaptive, tol = {field_tol:.0e}" if field_tol else "full"
+                print(f"{height} km, degree {degree} ({mode}): {elapsed / n_points * 1e9:.1f} ns per call")
+
+
+# Cost of the third bodies: one shared ephemeris table for all of them against the pruned set of the phase
+def benchmark_third_bodies(n_calls=200000, perturbers=('Moon', 'Sun', 'Venus', 'Jupiter')):
+    from numba import njit
+    from Modules.dynamics import build_force_model, acceleration_kernel
+    from Modules.ephemeris import ephemeris_position
+    from Modules.gravity import body_rotation
+
+    @njit
+    def evaluate_batch(ets, state, fm):
+        out = np.empty(7)
+        a = 0.0
+        for et in ets:
+            acceleration_kernel(et, state, ephemeris_position(et, fm.eph), body_rotation(et, fm.gravity), fm, 1.0, out)
+            a += out[3]
+        return a
+
+    state = np.array([6571, 0, 0, 0, 7.8, 0, 5000], dtype=np.float64)
+    t_span = np.array([0, 1e6])
+    ets = np.linspace(0, 1e6, n_calls)
+    for n in range(len(perturbers) + 1):
+        fm = build_force_model(t_span, perturbers=perturbers[:n], perturbation_tol=0.0)
+        evaluate_batch(ets[:10], state, fm) # Compile before timing
+        start = time.perf_counter()
+        evaluate_batch(ets, state, fm)
+        elapsed = time.perf_counter() - start
+        print(f"{n} third bodies: {elapsed / n_calls * 1e9:.1f} ns per call")
+
+    kept = build_force_model(t_span, perturbers=perturbers, states0=state).mu_bodies.size
+    print(f"Kept after pruning for this orbit: {kept} of {len(perturbers)}")
+
+
+# Illuminated fraction of a whole trajectory at once, against the per point calls
+def benchmark_illumination(n_points=200000):
+    from Modules.srp import illumination, shadow_fraction
+
+    ets = np.linspace(0, 1e6, n_points)
+    positions = 7000 * np.column_stack((np.cos(ets * 1e-3), np.sin(ets * 1e-3), np.zeros(n_points)))
+    illumination(ets[:10], positions[:10]) # Compile and fit the Sun before timing
+
+    start = time.perf_counter()
+    nu = illumination(ets, positions)
+    t_batch = (time.perf_counter() - start) / n_points
+
+    n_calls = n_points // 100
+    start = time.perf_counter()
+    for et, position in zip(ets[:n_calls], positions[:n_calls]):
+        shadow_fraction(*position, *spice.spkezr('SUN', et, 'J2000', 'NONE', 'Earth')[0][:3], 6378.137)
+    t_spice = (time.perf_counter() - start) / n_calls
+
+    print(f"illumination: {t_batch * 1e9:.1f} ns per point, {np.mean(nu < 1) * 100:.1f} % in shadow")
+    print(f"SPICE per point: {t_spice * 1e9:.1f} ns per point")
+
+
+# Accuracy against wall time of the fixed step engines and LSODA, on a long low eccentricity phase
+def benchmark_engines(t_phase=2e5):
+    from Modules.simulation_math import propagate_phase
+
+    state0 = np.array([6871, 0, 0, 0, 7.55, 1.0, 5000], dtype=np.float64)
+    t_span = np.array([0, t_phase])
+
+    # Reference with a small step of the highest order engine
+    ref = propagate_phase(t_span, None, state0, engine='RK8', dt=5, decimation=10**9, verbose=False)
+
+    for engine, dt in (('LSODA', None), ('RK4', 10), ('RK4', 30), ('Verlet', 5), ('RK8', 30), ('RK8', 120)):
+        propagate_phase(np.array([0, 100]), None, state0, compiled=True, engine=engine, verbose=False) # Compile before timing
+        start = time.perf_counter()
+        t_hist, pos_hist, _, _ = propagate_phase(t_span, None, state0, compiled=True, engine=engine, dt=dt or 10, decimation=100, verbose=False)
+        elapsed = time.perf_counter() - start
+        error = np.linalg.norm(pos_hist[-1] - ref[1][-1])
+        print(f"{engine} (dt = {dt} s): {elapsed:.3f} s, final position error {error:.2e} km")
+
+
+# Steps, rhs calls and wall time of the compiled DOP853 engine (cartesian and KS) against LSODA, over the scenario of main.py
+def benchmark_adaptive(t_phase=1e6):
+    import scipy.integrate as spi
+    from Config.spacecraft import spacecraft
+    from Modules.dynamics import acceleration, acceleration_compiled, build_force_model
+    from Modules.integrators import dop853
+    from Modules.regularised import propagate_ks
+    from Modules.events import phase_event_set, phase_events
+    from Modules.simulation_math import _phase_rhs
+
+    state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, np.array([spacecraft.mass0])))
+    t_span = np.array([spacecraft.et0, spacecraft.et0 + t_phase])
+    fm = build_force_model(t_span)
+    event_set = phase_event_set()
+    run = lambda t1: dop853(_phase_rhs, phase_events, t_span[0], t1, state0, (fm, event_set), event_set.terminal, event_set.direction, 1e-9, 1e-9)
+    run(t_span[0] + 100) # Compile before timing
+
+    results = {}
+    for name, func in (('LSODA, python acceleration', lambda t, y: acceleration(t, y)),
+                       ('LSODA, compiled acceleration', lambda t, y: acceleration_compiled(t, y, fm))):
+        start = time.perf_counter()
+        sol = spi.solve_ivp(func, t_span, state0, method='LSODA', rtol=1e-9, atol=1e-9)
+        results[name] = (time.perf_counter() - start, len(sol.t) - 1, sol.nfev, sol.y[:3, -1], sol.t[-1])
+
+    start = time.perf_counter()
+    t_hist, y_hist, _, _, _, n_steps, _, n_rhs, _ = run(t_span[1])
+    results['DOP853, compiled'] = (time.perf_counter() - start, n_steps, n_rhs, y_hist[-1, :3], t_hist[-1])
+
+    propagate_ks(np.array([t_span[0], t_span[0] + 100]), state0, fm, event_set) # Compile before timing
+    start = time.perf_counter()
+    t_hist, states, _, n_steps, _, n_rhs = propagate_ks(t_span, state0, fm, event_set)
+    results['DOP853, compiled, KS'] = (time.perf_counter() - start, n_steps, n_rhs, states[-1, :3], t_hist[-1])
+
+    ref = results['DOP853, compiled'][3]
+    for name, (elapsed, n_steps, n_rhs, position, t_end) in results.items():
+        print(f"{name}: {elapsed:.3f} s, {n_steps} steps, {n_rhs} rhs calls, ends at {t_end - t_span[0]:.0f} s, "
+              f"{np.linalg.norm(position - ref):.2e} km from DOP853")
+
+
+# Cost of the intake components on the DOP853 engine over the scenario of main.py, and their accuracy against RK8
+def benchmark_intake(t_phase=1e6):
+    from Config.spacecraft import spacecraft
+    from Modules.simulation_math import propagate_phase
+
+    state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, np.array([spacecraft.mass0])))
+    t_span = np.array([spacecraft.et0, spacecraft.et0 + t_phase])
+    for intake in (False, True):
+        propagate_phase(np.array([spacecraft.et0, spacecraft.et0 + 100]), None, state0, engine='DOP853', verbose=False, intake=intake) # Compile before timing
+
+    start = time.perf_counter()
+    propagate_phase(t_span, None, state0, engine='DOP853', verbose=False)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    flows = propagate_phase(t_span, None, state0, engine='DOP853', verbose=False, intake=True)[-1]
+    elapsed_intake = time.perf_counter() - start
+    ref = propagate_phase(t_span, None, state0, engine='RK8', dt=5, decimation=10**9, verbose=False, intake=True)[-1]
+
+    error = abs(np.sum(flows['air_mass']) / np.sum(ref['air_mass']) - 1)
+    print(f"DOP853: {elapsed:.3f} s, with the intake {elapsed_intake:.3f} s, {np.sum(flows['air_mass']) * 1000:.3f} g of air "
+          f"captured, {error:.1e} from RK8 (dt = 5 s)")
+
+
+# One DOP853 run with the STM and the sensitivities against the 22 runs of their central differences
+def benchmark_stm(t_phase=2e4):
+    from Config.spacecraft import spacecraft
+    from Modules.simulation_math import propagate_phase
+    from Modules.variational import PARAMS
+
+    state0 = np.array([6771, 0, 0, 0, 7.6, 1.2, 5000], dtype=np.float64)
+    t_span = np.array([0, t_phase])
+    final = lambda run: np.concatenate((run[1][-1], run[2][-1], [run[3][-1]]))
+    propagate_phase(np.array([0, 100]), None, state0, engine='DOP853', verbose=False, stm=True) # Compile before timing
+
+    start = time.perf_counter()
+    _, _, _, _, stm, sens = propagate_phase(t_span, None, state0, engine='DOP853', verbose=False, stm=True)
+    elapsed_stm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fd = np.zeros((7, 7 + len(PARAMS)))
+    for j, step in enumerate([1e-3] * 3 + [1e-6] * 3 + [1.0]):
+        dx = step * np.eye(7)[j]
+        fd[:, j] = (final(propagate_phase(t_span, None, state0 + dx, engine='DOP853', verbose=False))
+                    - final(propagate_phase(t_span, None, state0 - dx, engine='DOP853', verbose=False))) / (2 * step)
+    for j, name in enumerate(PARAMS):
+        value = getattr(spacecraft, name)
+        fd[:, 7 + j] = (final(propagate_phase(t_span, None, state0, sc=spacecraft._replace(**{name: value * 1.001}), engine='DOP853', verbose=False))
+                        - final(propagate_phase(t_span, None, state0, sc=spacecraft._replace(**{name: value * 0.999}), engine='DOP853', verbose=False))) / (0.002 * value)
+    elapsed_fd = time.perf_counter() - start
+
+    error = np.max(np.abs(np.hstack((stm[-1], sens[-1])) - fd) / np.max(np.abs(fd), axis=0))
+    print(f"STM and sensitivities: {elapsed_stm:.3f} s, central differences: {elapsed_fd:.3f} s, largest difference {error:.1e}")
+
+
+# Targeting of the periapsis with a burn, cold and then warm started on dispersed periapses as in a Monte Carlo campaign
+def benchmark_targeting(t_phase=2e4, n_cases=20):
+    from Config.spacecraft import orbit_inputs
+    from Modules.targeting import Targeter, Goal
+
+    goals = [Goal('periapsis', 300.0, 0.01)]
+    Targeter(goals, ['dv'], t_phase=100, t_burn=50).evaluate(np.zeros(1)) # Compile before timing
+
+    targeter = Targeter(goals, ['dv'], t_phase=t_phase, t_burn=100)
+    cold = targeter.solve()
+    print(f"Targeting: {cold.iterations} iterations, {cold.n_evals} propagations, {cold.wall_time:.3f} s, "
+          f"dv = {cold.controls['dv'] * 1000:.3f} m/s")
+
+    rng = np.random.default_rng(0)
+    iterations = n_evals = wall_time = 0
+    for _ in range(n_cases):
+        inputs = dict(orbit_inputs, Periapsis=orbit_inputs['Periapsis'] + rng.normal(0, 5))
+        case = Targeter(goals, ['dv'], inputs, t_phase=t_phase, t_burn=100)
+        case.last = targeter.last
+        result = case.solve()
+        targeter.last = case.last
+        iterations += result.iterations
+        n_evals += result.n_evals
+        wall_time += result.wall_time
+    print(f"Warm started cases: {iterations / n_cases:.1f} iterations, {n_evals / n_cases:.1f} propagations, "
+          f"{wall_time / n_cases:.3f} s per case")
+
+
+# Covariance of the unscented transform against a Monte Carlo ensemble, with an uncertain density
+def benchmark_covariance(t_phase=2e4, n_samples=1000, sigma_density=0.2):
+    from Config.spacecraft import spacecraft
+    from Modules.covariance import propagate_covariance
+    from Modules.ensemble import propagate_ensemble
+
+    state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, [spacecraft.mass0]))
+    cov0 = np.diag([0.1, 0.1, 0.1, 1e-4, 1e-4, 1e-4, 0.0])**2
+    t_span = np.array([spacecraft.et0, spacecraft.et0 + t_phase])
+    propagate_ensemble(np.array([t_span[0], t_span[0] + 100]), state0) # Compile before timing
+
+    start = time.perf_counter()
+    propagate_ensemble(t_span, state0)
+    elapsed_one = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, mean, cov, _ = propagate_covariance(t_span, state0, cov0, sigma_density=sigma_density)
+    elapsed_ut = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(0)
+    samples = rng.multivariate_normal(state0, cov0, n_samples)
+    _, states_out, _, _ = propagate_ensemble(t_span, samples, drag_scale=np.exp(rng.normal(0, sigma_density, n_samples)))
+    elapsed_mc = time.perf_counter() - start
+
+    sigma_ut = np.sqrt(np.diag(cov[-1])[:3])
+    sigma_mc = np.std(states_out[-1, :, :3], axis=0)
+    print(f"Unscented transform: {elapsed_ut:.3f} s (one member {elapsed_one:.3f} s), {n_samples} samples: {elapsed_mc:.3f} s, "
+          f"position sigma {np.linalg.norm(sigma_ut):.3f} km against {np.linalg.norm(sigma_mc):.3f} km")
+
+
+# Thrust arcs around the apoapsis with DOP853, ending the steps at the switches of the duty cycle or crossing them
+def benchmark_steering(t_phase=3e4):
+    from Config.spacecraft import spacecraft
+    from Modules.dynamics import build_force_model
+    from Modules.simulation_math import run_engine, H_CRASH
+    from Modules.steering import steering_law
+    from Modules.events import phase_event_set
+
+    sc = spacecraft._replace(thrust=50.0, mass_flow_rate=0.02)
+    law = steering_law(duty='apoapsis', duty_width=60)
+    state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, [spacecraft.mass0]))
+    t_span = np.array([spacecraft.et0, spacecraft.et0 + t_phase])
+    fm = build_force_model(t_span, sc=sc, states0=state0, steering=law)
+    event_set = phase_event_set(sc=sc, h_crash=H_CRASH, t_span=t_span, steering=law)
+    crossing = event_set._replace(restart=np.zeros_like(event_set.restart))
+    reference = run_engine(t_span, state0, fm, event_set, rtol=1e-13, atol=1e-13)[1][-1] # Also compiles
+
+    for name, events in (('ending the steps at the switches', event_set), ('crossing the switches', crossing)):
+        start = time.perf_counter()
+        t_hist, state_hist = run_engine(t_span, state0, fm, events)[:2]
+        elapsed = time.perf_counter() - start
+        error = np.linalg.norm(state_hist[-1, :3] - reference[:3])
+        print(f"Apoapsis thrust arcs, {name}: {len(t_hist) - 1} steps, {elapsed:.3f} s, {error * 1000:.3f} m from the reference")
+
+
+# Mean element propagation against the cartesian one over a long lifetime study, without thrust
+def benchmark_mean_elements(t_phase=3e7):
+    from Config.spacecraft import spacecraft
+    from Modules.mean_elements import propagate_mean
+    from Modules.simulation_math import propagate_phase
+    from Modules.elements import states_to_coes_batch
+
+    sc = spacecraft._replace(thrust=None)
+    state0 = np.concatenate((sc.initial_position, sc.initial_velocity, np.array([sc.mass0])))
+    t_span = np.array([sc.et0, sc.et0 + t_phase])
+    propagate_mean(np.array([sc.et0, sc.et0 + 1e5]), state0, sc=sc) # Compile before timing
+    propagate_phase(np.array([sc.et0, sc.et0 + 1e3]), None, state0, sc=sc, engine='DOP853', verbose=False)
+
+    start = time.perf_counter()
+    t_mean, coes_mean, _, _ = propagate_mean(t_span, state0, sc=sc)
+    t_mean_wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    t_hist, pos_hist, vel_hist, _ = propagate_phase(t_span, None, state0, sc=sc, engine='DOP853', verbose=False)
+    t_cart_wall = time.perf_counter() - start
+    coes = states_to_coes_batch(np.concatenate((pos_hist, vel_hist), axis=1), t_hist, coes_mean[0, 7])
+
+    print(f"Mean elements: {t_mean_wall:.3f} s, {len(t_mean) - 1} steps, periapsis decay {coes_mean[0, 0] - coes_mean[-1, 0]:.3f} km")
+    print(f"Cartesian DOP853: {t_cart_wall:.3f} s, {len(t_hist) - 1} steps, periapsis decay {coes[0, 0] - coes[-1, 0]:.3f} km")
+
+
+# Run reports of DOP853 over the scenario of main.py and of LSODA with the python acceleration, and the cost of the
+# counters of the kernel against the same run without them
+def benchmark_profiling(t_phase=1e6, t_python=2e3):
+    from Config.spacecraft import spacecraft
+    from Modules.dynamics import acceleration
+    from Modules.profiling import profile_phase, report_summary
+    from Modules.simulation_math import propagate_phase
+
+    state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, np.array([spacecraft.mass0])))
+    t_span = np.array([spacecraft.et0, spacecraft.et0 + t_phase])
+    profile_phase(np.array([spacecraft.et0, spacecraft.et0 + 100]), None, state0, engine='DOP853', verbose=False) # Compile before timing
+    propagate_phase(np.array([spacecraft.et0, spacecraft.et0 + 100]), None, state0, engine='DOP853', verbose=False)
+
+    start = time.perf_counter()
+    propagate_phase(t_span, None, state0, engine='DOP853', verbose=False)
+    elapsed = time.perf_counter() - start
+    _, report = profile_phase(t_span, None, state0, engine='DOP853', verbose=False)
+    print(report_summary(report))
+    print(f"Without the probe: {elapsed:.3f} s, with it: {report.wall_time:.3f} s")
+
+    _, report = profile_phase(t_span[0] + np.array([0, t_python]), acceleration, state0, verbose=False)
+    print(report_summary(report))
 
 
 if __name__ == "__main__":
-    
-    start = time.time()
-    # Test the acceleration function
-    # acceleration(np.array([0, 0, 6471]), np.array([0, 0, 0]), 'Earth')
 
-    # end = time.time()
-    # print(f"Time taken to run acceleration: {end - start} seconds")
\ No newline at end of file
+    # Load the SPICE Kernels
+    from Modules.helper import load_kernels
+    load_kernels()
+
+    benchmark_acceleration()
+    benchmark_atmos_lookup()
+    benchmark_gravity()
+    benchmark_third_bodies()
+    benchmark_illumination()
+    benchmark_engines()
+    benchmark_adaptive()
+    benchmark_intake()
+    benchmark_stm()
+    benchmark_targeting()
+    benchmark_covariance()
+    benchmark_steering()
+    benchmark_mean_elements()
+    benchmark_profiling()
+
+    spice.kclear()
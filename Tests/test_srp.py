@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Modules.srp import shadow_angles, shadow_fraction, srp_acceleration, AU, P_SUN
+
+sun = np.array([AU, 0.0, 0.0])
+R_body = 6378.137
+
+
+# Uncovered part of the disc of the Sun (radius a) behind the disc of the body (radius b) at a separation c,
+# integrating the overlap of the two discs strip by strip
+def lit_fraction(a, b, c, n=200001):
+    x = np.linspace(-a, a, n)
+    half_sun = np.sqrt(np.maximum(a**2 - x**2, 0))
+    half_body = np.sqrt(np.maximum(b**2 - (x - c)**2, 0))
+    return 1 - np.sum(2 * np.minimum(half_sun, half_body)) * (x[1] - x[0]) / (np.pi * a**2) # Zero at both ends
+
+
+# The conical shadow through the penumbra, from sunlight to the umbra behind the body
+def test_shadow_fraction():
+    for y in np.linspace(6000, 6800, 41):
+        position = np.array([-7000.0, y, 0.0])
+        a, b, c = shadow_angles(*position, *sun, R_body)
+        nu = shadow_fraction(*position, *sun, R_body)
+        if not 0 <= nu <= 1 or abs(nu - lit_fraction(a, b, c)) > 1e-6:
+            raise ValueError("The illuminated fraction is incorrect")
+
+    if shadow_fraction(-7000.0, 0.0, 0.0, *sun, R_body) != 0 or shadow_fraction(7000.0, 0.0, 0.0, *sun, R_body) != 1:
+        raise ValueError("The umbra and the sunlight are incorrect")
+
+    # Away from the Sun with the pressure at 1 AU in sunlight
+    a = np.array(srp_acceleration(7000.0, 0.0, 0.0, *sun, 1.0, 1.0, 4.0, 1000.0))
+    if not np.allclose(a, [-P_SUN * 4.0 / 1000.0 / 1000 * (AU / (AU - 7000.0))**2, 0, 0], rtol=1e-12):
+        raise ValueError("The radiation pressure is incorrect")
+
+    print("Shadow and radiation pressure are correct")
+
+
+if __name__ == "__main__":
+
+    test_shadow_fraction()
@@ -0,0 +1,68 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Config import bodies_data as bd
+from Modules.steering import steering_law, steering_control, cos_true_anomaly, ELEMENTS
+from Modules.elements import states_to_coes_batch, coes_to_states_batch
+
+mu = bd.Earth.gravitational_parameter
+R_e = bd.Earth.radius_equator
+
+# Orbit of 300 x 3000 km, inclined, along its true anomaly
+elts = np.array([R_e + 300.0, 2700.0 / (2 * R_e + 3300.0), np.radians(50.0), np.radians(30.0), np.radians(40.0), 0.0, 0.0, mu])
+states = np.array([coes_to_states_batch(np.concatenate((elts[:5], [M], elts[6:])), 0.0)[0] for M in np.linspace(0, 2 * np.pi, 37)[:-1]])
+
+
+# Weighted distance to the target elements, in km and degrees
+def distance(state, target, weights):
+    coes = states_to_coes_batch(state[None, :6], 0.0, mu)[0]
+    elements = np.array([coes[0] - R_e, coes[9] * (1 + coes[1]) - R_e] + list(np.degrees(coes[2:5])))
+    total = 0.0
+    for j, name in enumerate(ELEMENTS):
+        if name in target:
+            error = elements[j] - target[name]
+            if j >= 2:
+                error = (error + 180) % 360 - 180
+            total += weights.get(name, 1.0) * error**2
+    return np.sqrt(total)
+
+
+# The throttle follows the schedule and the duty cycle, along or against the velocity
+def test_throttle():
+    law = steering_law('anti_tangent', schedule=[(100.0, 0.5), (200.0, 0.0)], duty='apoapsis', duty_width=120.0)
+    for state in states:
+        cos_f = cos_true_anomaly(state, mu)
+        on = cos_f <= -0.5
+        for et, expected in ((50.0, 1.0), (150.0, 0.5), (250.0, 0.0)):
+            throttle, u_x, u_y, u_z = steering_control(et, state, law, mu)
+            if throttle != (expected if on else 0.0):
+                raise ValueError("The throttle does not follow the schedule and the duty cycle")
+            if throttle > 0 and not np.allclose([u_x, u_y, u_z], -state[3:6] / np.linalg.norm(state[3:6]), rtol=1e-14):
+                raise ValueError("The thrust is not against the velocity")
+
+    print("Throttle is correct")
+
+
+# A small impulse along the Lyapunov feedback gets the orbit closer to the target everywhere on the orbit
+def test_lyapunov():
+    target = {'Apoapsis': 3500.0, 'Inclination': 51.0, 'Rigth_Ascension_node': 29.0}
+    weights = {'Inclination': 50.0, 'Rigth_Ascension_node': 50.0}
+    law = steering_law('lyapunov', target=target, weights=weights, tol=1e-3)
+    for state in states:
+        throttle, u_x, u_y, u_z = steering_control(0.0, state, law, mu)
+        kicked = state.copy()
+        kicked[3:6] += 1e-5 * np.array([u_x, u_y, u_z])
+        if throttle != 1.0 or distance(kicked, target, weights) >= distance(state, target, weights):
+            raise ValueError("The Lyapunov feedback does not approach the target")
+
+    print("Lyapunov feedback is correct")
+
+
+if __name__ == "__main__":
+
+    test_throttle()
+    test_lyapunov()
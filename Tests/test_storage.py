@@ -0,0 +1,66 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import numpy as np
+from Modules.storage import TrajectoryWriter, open_trajectory, TRAJECTORY_FILE, HEADER_SIZE
+
+mu = 398600.4418
+
+
+# Circular orbit sampled every 10 s, with a slowly decreasing mass
+def samples(t:np.ndarray) -> np.ndarray:
+    r, n = 7000.0, np.sqrt(mu / 7000.0**3)
+    return np.column_stack((r * np.cos(n * t), r * np.sin(n * t), np.zeros_like(t), -r * n * np.sin(n * t), r * n * np.cos(n * t),
+                            np.zeros_like(t), 5000.0 - 1e-3 * t))
+
+
+# Chunks appended by the writer are read back with memory mapping, decimated and with their elements
+def test_writer():
+    t = np.arange(0.0, 2500.0, 10.0)
+    with tempfile.TemporaryDirectory() as folder:
+        with TrajectoryWriter(folder, mu=mu, decimation=3, chunk_rows=20) as writer:
+            for start in range(0, len(t), 35):
+                writer.append(t[start:start + 35], samples(t[start:start + 35]))
+
+        t_hist, pos_hist, vel_hist, mass_hist, coes = open_trajectory(folder)
+        if not isinstance(t_hist.base, np.memmap):
+            raise ValueError("The trajectory is not memory mapped")
+        if not np.array_equal(t_hist, t[::3]) or not np.array_equal(np.column_stack((pos_hist, vel_hist, mass_hist)), samples(t[::3])):
+            raise ValueError("The rows read back are not the ones written")
+        if coes.shape != (len(t_hist), 11) or not np.allclose(coes[:, 0], 7000.0, rtol=1e-9):
+            raise ValueError("The orbital elements are wrong")
+
+    print("Trajectory writer is correct")
+
+
+# A write interrupted before its header update leaves a file with the rows of the previous chunks
+def test_interrupted_write():
+    t = np.arange(0.0, 1000.0, 10.0)
+    with tempfile.TemporaryDirectory() as folder:
+        writer = TrajectoryWriter(folder, chunk_rows=40)
+        for start in range(0, len(t), 50):
+            writer.append(t[start:start + 50], samples(t[start:start + 50]))
+        n_rows = writer._trajectory.n_rows
+        # The process dies while the next chunk is written, after half of its bytes
+        writer._trajectory.file.seek(0, os.SEEK_END)
+        writer._trajectory.file.write(np.ones(12).tobytes()[:92])
+        writer._trajectory.file.flush()
+
+        t_hist = open_trajectory(folder)[0]
+        if n_rows != len(t) or len(t_hist) != n_rows or not np.array_equal(t_hist, t[:n_rows]):
+            raise ValueError("The header does not count the rows of the complete chunks")
+        if os.path.getsize(os.path.join(folder, TRAJECTORY_FILE)) <= HEADER_SIZE + n_rows * 8 * 8:
+            raise ValueError("The interrupted chunk was not written")
+        writer._trajectory.file.close()
+
+    print("Interrupted writes are correct")
+
+
+if __name__ == "__main__":
+
+    test_writer()
+    test_interrupted_write()
@@ -0,0 +1,51 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Config.spacecraft import spacecraft, orbit_inputs
+from Modules.events import phase_event_set
+from Modules.simulation_math import H_CRASH
+from Modules.targeting import Targeter, Goal
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies, the Sun and the eclipses are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+sc = spacecraft._replace(thrust=None)
+force_model = {'perturbers': (), 'srp': False}
+goals = [Goal('periapsis', 300.0, 0.01)]
+
+
+# A burn near the apoapsis raises the periapsis to its goal with both methods, from the nominal controls every time
+def test_solve():
+    make = lambda: Targeter(goals, ['dv'], orbit_inputs, sc, t_phase=3000.0, t_burn=100.0, force_model=force_model,
+                            events=phase_event_set(sc=sc, h_crash=H_CRASH))
+    targeter = make()
+    lm = targeter.solve(method='lm')
+    newton = make().solve(method='newton')
+    if not lm.converged or not newton.converged or abs(lm.values[0] - 300.0) > 0.01:
+        raise ValueError("The targeter does not reach the periapsis")
+    if abs(lm.controls['dv'] - newton.controls['dv']) > 1e-5 or lm.controls['dv'] <= 0:
+        raise ValueError("Levenberg-Marquardt and Newton find different burns")
+
+    # The Jacobian matches a central difference of the goal
+    values, jac = targeter.evaluate(np.array([lm.controls['dv']]))
+    step = 1e-5
+    fd = (targeter.evaluate(np.array([lm.controls['dv'] + step]))[0] - targeter.evaluate(np.array([lm.controls['dv'] - step]))[0]) / (2 * step)
+    if not np.allclose(jac[:, 0], fd, rtol=1e-4):
+        raise ValueError("The Jacobian of the goal is wrong")
+
+    # A new targeter starts again from the nominal controls and finds the same solution
+    if make().solve(method='lm').controls != lm.controls:
+        raise ValueError("The solve is not reproducible")
+
+    print("Targeting is correct")
+
+
+if __name__ == "__main__":
+
+    test_solve()
@@ -0,0 +1,62 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from Modules.trajectory import Trajectory, evaluate_trajectory, resample_trajectory
+
+mu = 398600.4418
+a, e = 7500.0, 0.1
+n = np.sqrt(mu / a**3)
+
+
+# States and their derivatives on a Kepler orbit in the xy plane, with a constant mass flow
+def kepler(t:np.ndarray) -> tuple:
+    M = n * t
+    E = M.copy()
+    for _ in range(30):
+        E -= (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+    dE = n / (1 - e * np.cos(E))
+    b = a * np.sqrt(1 - e**2)
+    position = np.column_stack((a * (np.cos(E) - e), b * np.sin(E), np.zeros_like(t)))
+    velocity = np.column_stack((-a * np.sin(E) * dE, b * np.cos(E) * dE, np.zeros_like(t)))
+    states = np.column_stack((position, velocity, 5000.0 - 1e-3 * t))
+    r = np.linalg.norm(position, axis=1)[:, None]
+    derivs = np.column_stack((velocity, -mu * position / r**3, np.full(len(t), -1e-3)))
+
+    return states, derivs
+
+
+# The Hermite interpolation of a Kepler arc sampled every 120 s stays within 1 cm and 0.5 mm/s of the orbit and goes through the nodes
+def test_resample():
+    t = np.arange(0.0, 2 * np.pi / n, 120.0)
+    states, derivs = kepler(t)
+    trajectory = Trajectory(t=t, states=states, derivs=derivs)
+
+    t_grid, resampled = resample_trajectory(trajectory, 7.0)
+    exact = kepler(t_grid)[0]
+    if t_grid[0] != t[0] or t_grid[-1] != t[-1] or np.any(np.diff(t_grid) <= 0):
+        raise ValueError("The grid does not cover the trajectory")
+    if np.max(np.abs(resampled[:, :3] - exact[:, :3])) > 1e-5 or np.max(np.abs(resampled[:, 3:6] - exact[:, 3:6])) > 5e-7:
+        raise ValueError("The interpolation error of the quintic Hermite is too large")
+    if np.max(np.abs(resampled[:, 6] - exact[:, 6])) > 1e-9:
+        raise ValueError("The interpolation of the mass is wrong")
+
+    # The nodes are given back, the velocities up to the rounding of h * v / h
+    at_nodes = evaluate_trajectory(t, trajectory)
+    if not np.array_equal(at_nodes[:, :3], states[:, :3]) or not np.array_equal(at_nodes[:, 6], states[:, 6]):
+        raise ValueError("The nodes are not reproduced")
+    if not np.allclose(at_nodes[:, 3:6], states[:, 3:6], rtol=1e-15, atol=1e-15):
+        raise ValueError("The velocities of the nodes are not reproduced")
+
+    if not np.all(np.isnan(evaluate_trajectory(np.array([t[0] - 1.0, t[-1] + 1.0]), trajectory))):
+        raise ValueError("The epochs outside of the trajectory are not nan")
+
+    print("Trajectory interpolation is correct")
+
+
+if __name__ == "__main__":
+
+    test_resample()
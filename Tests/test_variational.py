@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import spiceypy as spice
+from Modules.dynamics import build_force_model, acceleration_kernel
+from Modules.gravity import body_rotation
+from Modules.variational import acceleration_jacobian, PARAMS
+from Modules.helper import ROOT
+
+# The body fixed frames only need the planetary constants kernel, the third bodies and the Sun are left out
+spice.furnsh(os.path.join(ROOT, 'Data', 'Spice', 'PCK', 'pck00011.tpc.txt'))
+
+# States in the atmosphere, one of them thrusting near the pole, and one above it
+states = np.array([[6671.0, 120.0, 800.0, -0.3, 7.6, 1.2, 4800.0],
+                   [-300.0, 200.0, -6750.0, 7.4, 1.0, 0.2, 4500.0],
+                   [20000.0, 3000.0, 9000.0, -1.0, 3.8, 1.0, 4900.0]])
+
+
+# The Jacobian matches central differences of acceleration_kernel, for the state and for the parameters
+def test_acceleration_jacobian():
+    fm = build_force_model(np.array([0.0, 1e5]), perturbers=(), srp=False)
+    steps = np.array([1e-3, 1e-3, 1e-3, 1e-4, 1e-4, 1e-4, 1e-2])
+    pos_bodies = np.zeros(0)
+    rot = body_rotation(3e4, fm.gravity)
+    out_p = np.empty(7)
+    out_m = np.empty(7)
+
+    for state in states:
+        jac = acceleration_jacobian(3e4, state, pos_bodies, rot, fm, 1.0)
+        fd = np.zeros_like(jac)
+        for j in range(7):
+            acceleration_kernel(3e4, state + steps[j] * np.eye(7)[j], pos_bodies, rot, fm, 1.0, out_p)
+            acceleration_kernel(3e4, state - steps[j] * np.eye(7)[j], pos_bodies, rot, fm, 1.0, out_m)
+            fd[:, j] = (out_p[3:6] - out_m[3:6]) / (2 * steps[j])
+        for j, name in enumerate(PARAMS[:3]): # The mass flow only acts on the mass
+            value = getattr(fm, name)
+            acceleration_kernel(3e4, state, pos_bodies, rot, fm._replace(**{name: value * 1.01}), 1.0, out_p)
+            acceleration_kernel(3e4, state, pos_bodies, rot, fm._replace(**{name: value * 0.99}), 1.0, out_m)
+            fd[:, 7 + j] = (out_p[3:6] - out_m[3:6]) / (0.02 * value)
+
+        if np.any(np.abs(jac - fd) > 1e-5 * np.max(np.abs(fd), axis=0) + 1e-20):
+            raise ValueError("The Jacobian does not match the finite differences of the acceleration")
+
+    print("Acceleration Jacobian is correct")
+
+
+if __name__ == "__main__":
+
+    test_acceleration_jacobian()
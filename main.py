@@ -15,13 +15,15 @@ from Modules.simulation_math import propagate_phase
 from Modules.dynamics import acceleration
 from Results.visualization import plot_orbit_plotly, plot_atmos_data, plot_coes
 from Config.spacecraft import spacecraft, mu
-from Modules.helper import sc_heigth, states_to_coes
+from Modules.helper import sc_heigth, load_kernels
+from Modules.elements import states_to_coes_batch
+from Modules.storage import TrajectoryWriter, open_trajectory, propagate_streaming
 
 
 if __name__ == "__main__":
 
     # Load the SPICE Kernels
-    spice.furnsh(r"C:\Users\lucas\Desktop\Code Adventures\MARST\MARST\Data\Spice\Solar_sytem_kernel.tm")
+    load_kernels()
 
     # Test loading the gravitational parameter of the Earth
     radii_earth = spice.bodvrd('EARTH', 'RADII', 3)[1][0]
@@ -33,14 +35,21 @@ if __name__ == "__main__":
     et = spacecraft.et0
     t_phase = 1e6 # 1e6 seconds is 11.57 days
     t_span = np.array([et, et + t_phase])
+    engine = 'LSODA' # 'LSODA' (solve_ivp), 'DOP853' or 'KS' (compiled adaptive) or 'RK4', 'Verlet', 'RK8' (compiled fixed step)
+    stream_to = None # Directory to stream the trajectory to for long runs, the histories are then memory mapped
     state0 = np.concatenate((spacecraft.initial_position, spacecraft.initial_velocity, np.array([spacecraft.mass0])))
 
     # Run the simulation
-    t_hist, pos_hist, vel_hist, mass_hist = propagate_phase(t_span, acceleration, state0)
+    if stream_to is None:
+        t_hist, pos_hist, vel_hist, mass_hist = propagate_phase(t_span, acceleration, state0, engine=engine)
 
-    # Convert data to coes
-    state = np.concatenate((pos_hist, vel_hist), axis=1)
-    coes = states_to_coes(state, t_hist, mu)
+        # Convert data to coes
+        state = np.concatenate((pos_hist, vel_hist), axis=1)
+        coes = states_to_coes_batch(state, t_hist, mu)
+    else:
+        with TrajectoryWriter(stream_to, mu=mu) as writer:
+            propagate_streaming(t_span, state0, writer, engine=engine if engine != 'LSODA' else 'DOP853')
+        t_hist, pos_hist, vel_hist, mass_hist, coes = open_trajectory(stream_to)
 
     # Clear the kernel pool
     spice.kclear()